@@ -0,0 +1,126 @@
+import argparse
+import importlib
+import itertools
+import json
+import platform
+import z3
+import ConstraintModel as cm
+
+########################################################################################################################
+# This file embeds a benchmark of the encodings of the constraint models (see ConstraintModel.py): every benchmark (a
+# model with its parameters) is built and checked with the schedule matrix, with every combination of the counting
+# (SUM, PREFIX_SUM) and the cardinality (ARITHMETIC, PSEUDO_BOOLEAN, SEQUENTIAL_COUNTER) encodings, and with the
+# interval encoding of the schedule (which does not use the counting and cardinality encodings). The build and solve
+# times are reported per encoding, with the speedup of the check against the original encoding (MATRIX, SUM,
+# ARITHMETIC). All the encodings of a benchmark should give the same result: a benchmark for which they do not is
+# reported. The benchmarks with long observation windows are only run with the interval encoding.
+#
+# Usage (from this directory):
+#     python Benchmark.py --output benchmark.json
+#     python Benchmark.py --only same_period_same_budget_large --cardinality pseudo_boolean sequential_counter
+#     python Benchmark.py --schedule-encoding interval
+########################################################################################################################
+
+# The benchmarks: the model (file name), the parameters of its build_model and optionally the schedule encodings it is
+# run with (all by default). The acceptance test of the default parameters of SamePeriodSameBudget does not accept the
+# task set, so other parameters are used for it. A period of one time point has no transitions to count in the
+# atomicity of a task, which is a corner case of the cardinality encodings.
+# With the interval encoding, max_runs bounds the number of periods of a task in the observation window. The acceptance
+# test of SameBudgetDifferentPeriod only accepts periods of at least nr_tasks * clix_bound, so max_runs =
+# observation_window // (nr_tasks * clix_bound) keeps all the accepted task sets (for the sufficiency query).
+BENCHMARKS = [
+    {"name": "same_period_same_budget", "model": "SamePeriodSameBudget",
+     "parameters": {"nr_tasks": 4, "default_period": 28, "clix_bound": 7}},
+    {"name": "same_period_same_budget_large", "model": "SamePeriodSameBudget",
+     "parameters": {"nr_tasks": 6, "default_period": 60, "clix_bound": 10}},
+    {"name": "same_period_same_budget_period_1", "model": "SamePeriodSameBudget",
+     "parameters": {"nr_tasks": 1, "default_period": 1, "clix_bound": 1}},
+    {"name": "same_period_different_budget", "model": "SamePeriodDifferentBudget", "parameters": {}},
+    {"name": "same_budget_different_period", "model": "SameBudgetDifferentPeriod", "parameters": {}},
+    {"name": "same_budget_different_period_window_40", "model": "SameBudgetDifferentPeriod",
+     "parameters": {"observation_window": 40, "clix_bound": 4}},
+    {"name": "different_budget_different_period", "model": "DifferentBudgetDifferentPeriod", "parameters": {}},
+    {"name": "same_period_different_budget_window_200", "model": "SamePeriodDifferentBudget",
+     "parameters": {"nr_tasks": 5, "default_period": 200}, "schedule_encodings": [cm.INTERVAL]},
+    {"name": "same_budget_different_period_window_240", "model": "SameBudgetDifferentPeriod",
+     "parameters": {"nr_tasks": 3, "observation_window": 240, "clix_bound": 20, "max_runs": 4},
+     "schedule_encodings": [cm.INTERVAL]},
+]
+
+# The encoding against which the speedups are computed
+REFERENCE_ENCODING = (cm.MATRIX, cm.SUM, cm.ARITHMETIC)
+# Default timeout of a check (in seconds)
+DEFAULT_TIMEOUT = 600
+
+
+# Build and check the given benchmark with the given encoding, and return the result, the build time and check time
+def run_benchmark(benchmark, query, schedule_encoding, counting, cardinality, timeout):
+    model_module = importlib.import_module(benchmark["model"])
+    model = model_module.build_model(query=query, counting=counting, cardinality=cardinality,
+                                     schedule_encoding=schedule_encoding, **benchmark["parameters"])
+    result = model.check(timeout=int(timeout * 1000))
+    return {"benchmark": benchmark["name"], "model": benchmark["model"], "parameters": model.parameters,
+            "query": query, "schedule_encoding": schedule_encoding, "counting": counting, "cardinality": cardinality,
+            "result": str(result), "build_time": model.build_time, "check_time": model.check_time}
+
+
+# Return the encodings (schedule encoding, counting, cardinality) to run: the counting and the cardinality encodings
+# are only combined with the schedule matrix
+def get_encodings(schedule_encodings, countings, cardinalities):
+    encodings = []
+    if cm.MATRIX in schedule_encodings:
+        encodings += [(cm.MATRIX, counting, cardinality)
+                      for (counting, cardinality) in itertools.product(countings, cardinalities)]
+    if cm.INTERVAL in schedule_encodings:
+        encodings.append((cm.INTERVAL, cm.SUM, cm.ARITHMETIC))
+    return encodings
+
+
+# Run the given benchmarks with the given encodings, print a line per run and return the results
+def run_benchmarks(benchmarks, query, schedule_encodings, countings, cardinalities, timeout):
+    results = []
+    for benchmark in benchmarks:
+        reference_time = None
+        benchmark_results = []
+        encodings = get_encodings([schedule_encoding for schedule_encoding in schedule_encodings
+                                   if schedule_encoding in benchmark.get("schedule_encodings", cm.SCHEDULE_ENCODINGS)],
+                                  countings, cardinalities)
+        for (schedule_encoding, counting, cardinality) in encodings:
+            result = run_benchmark(benchmark, query, schedule_encoding, counting, cardinality, timeout)
+            if (schedule_encoding, counting, cardinality) == REFERENCE_ENCODING:
+                reference_time = result["check_time"]
+            benchmark_results.append(result)
+        for result in benchmark_results:
+            if reference_time is not None and result["result"] != "unknown":
+                result["speedup"] = reference_time / max(result["check_time"], 1e-6)
+            print("%-40s %-8s %-10s %-18s %-7s build %8.2fs  check %8.2fs  %s" %
+                  (result["benchmark"], result["schedule_encoding"], result["counting"], result["cardinality"],
+                   result["result"], result["build_time"], result["check_time"],
+                   "x%.1f" % result["speedup"] if "speedup" in result else ""))
+        outcomes = set(result["result"] for result in benchmark_results) - {"unknown"}
+        if len(outcomes) > 1:
+            print("The encodings give different results for " + benchmark["name"] + ": " + str(sorted(outcomes)))
+        results += benchmark_results
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of the encodings of the constraint models")
+    parser.add_argument("--output", help="save the results to this JSON file")
+    parser.add_argument("--only", nargs="+", help="only run the benchmarks with these names")
+    parser.add_argument("--query", default=cm.SUFFICIENCY, choices=cm.QUERIES)
+    parser.add_argument("--schedule-encoding", nargs="+", default=cm.SCHEDULE_ENCODINGS,
+                        choices=cm.SCHEDULE_ENCODINGS)
+    parser.add_argument("--counting", nargs="+", default=cm.COUNTINGS, choices=cm.COUNTINGS)
+    parser.add_argument("--cardinality", nargs="+", default=cm.CARDINALITIES, choices=cm.CARDINALITIES)
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="timeout of a check in seconds")
+    args = parser.parse_args()
+
+    selected = [benchmark for benchmark in BENCHMARKS if args.only is None or benchmark["name"] in args.only]
+    benchmark_results = run_benchmarks(selected, args.query, args.schedule_encoding, args.counting, args.cardinality,
+                                       args.timeout)
+    if args.output is not None:
+        output_file = open(args.output, "w")
+        json.dump({"python": platform.python_version(), "z3": z3.get_version_string(), "timeout": args.timeout,
+                   "results": benchmark_results}, output_file, indent=2)
+        output_file.close()
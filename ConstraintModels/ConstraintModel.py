@@ -0,0 +1,435 @@
+from abc import ABCMeta, abstractmethod
+from z3 import *
+import time
+
+########################################################################################################################
+# This file embeds what the constraint models have in common: the schedule matrix, the queries that can be asked about
+# the acceptance test of a model, and the solving of a query with its timing and statistics.
+# Every model (SamePeriodSameBudget.py, SamePeriodDifferentBudget.py, SameBudgetDifferentPeriod.py and
+# DifferentBudgetDifferentPeriod.py) builds its formula from its parameters in a subclass of ConstraintModel. The
+# build_model function of a model returns it, so the models can be built for other parameters from a script, e.g. for a
+# scaling study:
+#   model = SameBudgetDifferentPeriod.build_model(nr_tasks=3, observation_window=24, clix_bound=2)
+#   model.check(SUFFICIENCY)        unsat: the acceptance test is sufficient
+#   model.check(NECESSITY)          the formula is built once and reused for the other queries
+#   print(model.build_time, model.check_time, model.statistics())
+# Running a model file itself still checks the model for the parameters at the top of the file.
+########################################################################################################################
+
+# The queries about the acceptance test (only one of them is checked at a time):
+# - SUFFICIENCY: it should not be possible to have a situation that satisfies the acceptance test and misses deadlines.
+#   If unsat, the acceptance test is sufficient; if sat, the model is a counterexample.
+# - NECESSITY: a system that does not satisfy the acceptance test, but meets all its deadlines. If unsat, a system is
+#   only schedulable if it is accepted, so a test that is both sufficient and necessary is exact.
+# - EXISTENCE: a system that satisfies the acceptance test and meets all its deadlines. If sat, the model is a valid
+#   schedule, which shows that the acceptance test is not far too restrictive.
+SUFFICIENCY = "sufficiency"
+NECESSITY = "necessity"
+EXISTENCE = "existence"
+QUERIES = [SUFFICIENCY, NECESSITY, EXISTENCE]
+
+# The encodings of the number of cycles a task has run in a window of time points:
+# - SUM: a sum over all the time points of the observation window, with a term per time point that checks whether it
+#   is in the window and the task runs at it. It is built again for every window, so the formula grows with the square
+#   of the observation window for every constraint that counts per time point.
+# - PREFIX_SUM: the number of cycles every task has run before each time point is defined once (a prefix sum over its
+#   row of the schedule matrix), and the count of a window is the difference of the prefix sums at its end and begin.
+SUM = "sum"
+PREFIX_SUM = "prefix_sum"
+COUNTINGS = [SUM, PREFIX_SUM]
+
+# The encodings of the comparison of a number of Booleans that are true (e.g. the cycles a task has run, or the
+# transitions in its run) with a constant bound:
+# - ARITHMETIC: a sum of If(b, 1, 0) terms, compared in linear integer arithmetic (see COUNTINGS)
+# - PSEUDO_BOOLEAN: the native cardinality constraints of z3 (AtMost, AtLeast, PbEq), solved by its pseudo-Boolean
+#   solver
+# - SEQUENTIAL_COUNTER: a purely Boolean unary counter: after every Boolean, an auxiliary Boolean per value (up to the
+#   bound) holds whether at least that many of the Booleans so far are true. Counters over the same Booleans (e.g. over
+#   the prefixes of a row of the schedule matrix) are shared.
+# Comparisons with a bound that is a variable (e.g. a variable clix length) are always arithmetic, comparisons with a
+# constant bound are encoded as the cardinality of the model, whatever the counting of the model is.
+ARITHMETIC = "arithmetic"
+PSEUDO_BOOLEAN = "pseudo_boolean"
+SEQUENTIAL_COUNTER = "sequential_counter"
+CARDINALITIES = [ARITHMETIC, PSEUDO_BOOLEAN, SEQUENTIAL_COUNTER]
+
+# The encodings of the schedule:
+# - MATRIX: the Boolean schedule matrix, with a cell per task and time point (see build of every model)
+# - INTERVAL: every job (the run of a task in one of its periods) has a start time variable and runs its clix length
+#   from it without interruption, so the runs are atomic by construction. The constraints are between pairs of jobs:
+#   they do not overlap, the processor does not idle while a released job waits (checked at the releases and at the
+#   ends of the jobs), and a job that starts has the nearest deadline of the released jobs of the other tasks that wait
+#   (EDF). A job meets its deadline if it ends before it. The formula grows with the square of the number of jobs
+#   instead of with the square of the observation window, so long observation windows can be checked.
+#   The counting and the cardinality encodings only concern the matrix; constraints that are added on the schedule
+#   matrix (model.X) have no effect on the interval encoding.
+# Up to the first deadline miss, both encodings allow the same schedules, so every query has the same result.
+MATRIX = "matrix"
+INTERVAL = "interval"
+SCHEDULE_ENCODINGS = [MATRIX, INTERVAL]
+
+
+# A job of a task in the interval encoding. Its start is a variable; its release, deadline and length (the clix length)
+# are numbers or expressions of the parameters of the model. With variable periods, the number of jobs of a task is not
+# known in advance: a job is only active if it is released in the observation window.
+class Job:
+    def __init__(self, taskNr, jobNr, release, deadline, length, active=True):
+        self.taskNr = taskNr
+        self.jobNr = jobNr
+        self.start = Int("start_%s_%s" % (taskNr+1, jobNr+1))
+        self.release = release
+        self.deadline = deadline
+        self.length = length
+        self.active = active
+        self.end = self.start + length
+
+    def get_end(self):
+        return self.end
+
+
+class ConstraintModel(metaclass=ABCMeta):
+    def __init__(self, name, parameters, nr_tasks, observation_window, query=SUFFICIENCY, counting=SUM,
+                 cardinality=ARITHMETIC, schedule_encoding=MATRIX):
+        if query not in QUERIES:
+            raise ValueError("Unknown query: " + str(query))
+        if counting not in COUNTINGS:
+            raise ValueError("Unknown counting: " + str(counting))
+        if cardinality not in CARDINALITIES:
+            raise ValueError("Unknown cardinality: " + str(cardinality))
+        if schedule_encoding not in SCHEDULE_ENCODINGS:
+            raise ValueError("Unknown schedule encoding: " + str(schedule_encoding))
+        self.name = name
+        self.parameters = parameters
+        self.nr_tasks = nr_tasks
+        self.observation_window = observation_window
+        # The query that is checked by default, the encoding of the number of cycles a task has run (see COUNTINGS),
+        # the encoding of the comparisons of counts with constant bounds (see CARDINALITIES) and the encoding of the
+        # schedule (see SCHEDULE_ENCODINGS)
+        self.query = query
+        self.counting = counting
+        self.cardinality = cardinality
+        self.schedule_encoding = schedule_encoding
+
+        # Based on https://ericpony.github.io/z3py-tutorial/guide-examples.htm
+        # Matrix with the tasks on the rows (nr_tasks) and the timepoints on the columns (observation_window)
+        self.X = [[Bool("x_%s_%s" % (i+1, j+1)) for j in range(observation_window)]
+                  for i in range(nr_tasks)]
+
+        # The definitions of the auxiliary variables of the encoding (e.g. the prefix sums), which are added first
+        self.definitions = []
+        # The prefix sums of the schedule matrix, created when they are first used (see create_prefix_sums)
+        self.cycles_ran = None
+        # The sequential counters that were built, by the Booleans they count and their bound (see SEQUENTIAL_COUNTER)
+        self.counters = dict()
+        # The jobs of the interval encoding
+        self.jobs = []
+        # The constraints on the system (in the order in which they are added to the solver), the acceptance test, the
+        # scheduling goal (all tasks meet their deadlines) and its negation (some task misses its deadline).
+        # They are filled in by the model (see build).
+        self.constraints = []
+        self.acc_test = BoolVal(True)
+        self.sched_goal = BoolVal(True)
+        self.neg_sched_goal = BoolVal(False)
+
+        # The solver, the query, the result and the model (if sat) of the last check
+        self.solver = None
+        self.checked_query = None
+        self.result = None
+        self.model = None
+        # Time to build the formula and time of the last check (in seconds)
+        self.build_time = 0.0
+        self.check_time = None
+
+        start = time.perf_counter()
+        if schedule_encoding == INTERVAL:
+            self.build_intervals()
+        else:
+            self.build()
+        self.build_time = time.perf_counter() - start
+
+    # Build the constraints, the acceptance test and the scheduling goal of the model (with the schedule matrix)
+    @abstractmethod
+    def build(self):
+        pass
+
+    # The parts of a model that do not depend on the encoding of the schedule
+
+    # Create the variables of the parameters of the model (periods, clix lengths)
+    def create_variables(self):
+        pass
+
+    # Return the constraints on the parameters of the model
+    def get_parameter_constraints(self):
+        return []
+
+    # Return the acceptance test of the model
+    @abstractmethod
+    def get_acceptance_test(self):
+        pass
+
+    # Return the jobs of the tasks in the observation window (see Job)
+    @abstractmethod
+    def get_jobs(self):
+        pass
+
+    # Build the constraints, the scheduling goal and its negation of the interval encoding (see INTERVAL)
+    def build_intervals(self):
+        self.create_variables()
+        self.jobs = self.get_jobs()
+        jobs = self.jobs
+        window = self.observation_window
+
+        # A job can only start after its release
+        release_c = [Implies(a.active, a.start >= a.release) for a in jobs]
+
+        # Only one job can run at the same moment
+        no_overlap_c = [Implies(And(a.active, b.active), Or(a.get_end() <= b.start, b.get_end() <= a.start))
+                        for (k, a) in enumerate(jobs) for b in jobs[k + 1:]]
+
+        # ---EDF Constraints---
+        # The processor only idles if no released job waits. It can only become idle at the release of a job (if no job
+        # runs then) or at the end of a job (if no job starts then), so it is checked at these time points.
+        def is_waiting(b, time):
+            return And(b.active, b.release <= time, time < b.start)
+
+        # (A job that is released after the release of b cannot run at it, which is left out if the releases are
+        # numbers)
+        no_idling_at_release_c = [
+            Implies(And(b.active, b.release < b.start, b.release < window),
+                    Or([And(a.active, a.start <= b.release, b.release < a.get_end()) for a in jobs
+                        if a is not b and (a.release <= b.release) is not False]))
+            for b in jobs]
+        no_idling_at_end_c = [
+            Implies(And(a.active, a.get_end() < window, Or([is_waiting(b, a.get_end()) for b in jobs if b is not a])),
+                    Or([And(b.active, b.start == a.get_end()) for b in jobs if b is not a]))
+            for a in jobs]
+
+        # The job that starts, is the one with the earliest deadline of the waiting jobs (of the other tasks).
+        # Pairs of which the deadlines are numbers in the right order need no constraint.
+        earliest_deadline_first_c = [Implies(And(a.active, a.start < window - 1, is_waiting(b, a.start)),
+                                             a.deadline <= b.deadline)
+                                     for a in jobs for b in jobs
+                                     if a.taskNr != b.taskNr and (a.deadline <= b.deadline) is not True]
+
+        self.constraints = (release_c + no_overlap_c + no_idling_at_release_c + no_idling_at_end_c
+                            + self.get_parameter_constraints() + earliest_deadline_first_c)
+        self.acc_test = self.get_acceptance_test()
+        # To meet its requirements, every job should end before its deadline
+        self.sched_goal = And([Implies(a.active, a.get_end() <= a.deadline) for a in jobs])
+        self.neg_sched_goal = Or([And(a.active, a.get_end() > a.deadline) for a in jobs])
+
+    # Add extra constraints to the model, e.g. to fix some of the periods or clix lengths
+    def add(self, *constraints):
+        for constraint in constraints:
+            if isinstance(constraint, list):
+                self.constraints.extend(constraint)
+            else:
+                self.constraints.append(constraint)
+
+    # Return the formula of the given query (see QUERIES)
+    def get_query(self, query):
+        if query == SUFFICIENCY:
+            return And(self.acc_test, self.neg_sched_goal)
+        if query == NECESSITY:
+            return And(Not(self.acc_test), self.sched_goal)
+        if query == EXISTENCE:
+            return And(self.acc_test, self.sched_goal)
+        raise ValueError("Unknown query: " + str(query))
+
+    # Check the given query (by default the query of the model) and return the result (sat, unsat or unknown, also when
+    # the optional timeout in milliseconds has passed).
+    # Every check gets a fresh solver with the formula that was built, so a model can be checked for several queries.
+    def check(self, query=None, timeout=None):
+        query = self.query if query is None else query
+        solver = Solver()
+        if timeout is not None:
+            solver.set("timeout", timeout)
+        solver.add(self.definitions)
+        solver.add(self.constraints)
+        solver.add(self.get_query(query))
+        start = time.perf_counter()
+        result = solver.check()
+        self.check_time = time.perf_counter() - start
+        self.solver = solver
+        self.checked_query = query
+        self.result = result
+        self.model = solver.model() if result == sat else None
+        return result
+
+    # Return the statistics of the solver of the last check
+    def statistics(self):
+        if self.solver is None:
+            raise ValueError("The model has not been checked yet")
+        return self.solver.statistics()
+
+    # Return the parameters, the timing and the result of the last check, with the statistics of the solver, as a dict
+    def get_statistics(self):
+        statistics = {"model": self.name, "parameters": self.parameters, "schedule_encoding": self.schedule_encoding,
+                      "counting": self.counting, "cardinality": self.cardinality, "query": self.checked_query,
+                      "result": None if self.result is None else str(self.result), "build_time": self.build_time,
+                      "check_time": self.check_time}
+        if self.solver is not None:
+            solver_statistics = self.solver.statistics()
+            statistics["solver"] = {key: solver_statistics.get_key_value(key) for key in solver_statistics.keys()}
+        return statistics
+
+    # Getters (the models with variable periods or clix lengths override them)
+
+    # Return the period of the given task
+    def get_period(self, taskNr):
+        return self.observation_window
+
+    # Return the clix length of the given task
+    @abstractmethod
+    def get_clix_length(self, taskNr):
+        pass
+
+    # Return whether the periods/clix lengths are variables of the model
+    def has_variable_periods(self):
+        return False
+
+    def has_variable_clix_lengths(self):
+        return False
+
+    # Return if some task is running at the given time
+    def some_task_is_running(self, sched, time):
+        return Or([sched[i][time] for i in range(self.nr_tasks)])
+
+    # Create the prefix sums of the schedule matrix: cycles_ran[i](j) is the number of cycles task i has run before time
+    # point j (0 <= j <= observation_window)
+    def create_prefix_sums(self):
+        self.cycles_ran = [Function("cycles_ran_%s" % (i+1), IntSort(), IntSort()) for i in range(self.nr_tasks)]
+        for i in range(self.nr_tasks):
+            self.definitions.append(self.cycles_ran[i](0) == 0)
+            self.definitions += [self.cycles_ran[i](j + 1) == self.cycles_ran[i](j) + If(self.X[i][j], 1, 0)
+                                 for j in range(self.observation_window)]
+
+    # Return whether the number of cycles ran in the given schedule is counted with the prefix sums
+    def uses_prefix_sums(self, sched):
+        return self.counting == PREFIX_SUM and sched is self.X
+
+    # Return the number of cycles the task has run before the given time point (a number or an expression), with the
+    # prefix sums. Time points outside of the observation window are clamped to it.
+    def cycles_ran_before(self, taskNr, time):
+        if self.cycles_ran is None:
+            self.create_prefix_sums()
+        if is_expr(time):
+            time = If(time < 0, 0, If(time > self.observation_window, self.observation_window, time))
+        else:
+            time = min(max(time, 0), self.observation_window)
+        return self.cycles_ran[taskNr](time)
+
+    # Return whether a count compared with the given bound is encoded with cardinality constraints (see CARDINALITIES)
+    def uses_cardinality(self, bound):
+        return self.cardinality != ARITHMETIC and not is_expr(bound)
+
+    # Return whether at most/at least/exactly the given number (a constant) of the given Booleans are true, encoded as
+    # the cardinality of the model (PSEUDO_BOOLEAN or SEQUENTIAL_COUNTER)
+    def at_most(self, booleans, bound):
+        if bound < 0:
+            return BoolVal(False)
+        if bound >= len(booleans):
+            return BoolVal(True)
+        if self.cardinality == PSEUDO_BOOLEAN:
+            return AtMost(*(booleans + [bound]))
+        return Not(self.get_sequential_counter(booleans, bound + 1)[bound])
+
+    def at_least(self, booleans, bound):
+        if bound <= 0:
+            return BoolVal(True)
+        if bound > len(booleans):
+            return BoolVal(False)
+        if self.cardinality == PSEUDO_BOOLEAN:
+            return AtLeast(*(booleans + [bound]))
+        return self.get_sequential_counter(booleans, bound)[bound - 1]
+
+    def exactly(self, booleans, value):
+        if value < 0 or value > len(booleans):
+            return BoolVal(False)
+        if len(booleans) == 0:
+            return BoolVal(value == 0)
+        if self.cardinality == PSEUDO_BOOLEAN:
+            return PbEq([(boolean, 1) for boolean in booleans], value)
+        return And(self.at_least(booleans, value), self.at_most(booleans, value))
+
+    # Return the outputs of the sequential counter over the given Booleans, up to the given bound: the k-th output
+    # (k starting at 0) holds whether at least k + 1 of the Booleans are true. The counter is built one Boolean after
+    # the other, and every prefix of the Booleans that was counted before (with the same bound) is reused.
+    def get_sequential_counter(self, booleans, bound):
+        # A counter is identified by its bound, the counter of the Booleans before the last one and the last Boolean
+        nr_previous = -1
+        outputs = [BoolVal(False)] * bound
+        for boolean in booleans:
+            boolean = boolean if is_expr(boolean) else BoolVal(boolean)
+            key = (bound, nr_previous, boolean.get_id())
+            if key not in self.counters:
+                nr_counter = len(self.counters)
+                new_outputs = [Bool("counter_%s_%s" % (nr_counter, k)) for k in range(bound)]
+                self.definitions += [new_outputs[k] == Or(outputs[k], And(outputs[k - 1] if k > 0 else True, boolean))
+                                     for k in range(bound)]
+                self.counters[key] = (nr_counter, new_outputs)
+            (nr_previous, outputs) = self.counters[key]
+        return outputs
+
+    # Return the value of the given expression in the model of the last check (if sat)
+    def evaluate(self, expression):
+        if self.model is None:
+            raise ValueError("The last check did not give a model")
+        if not is_expr(expression):
+            return expression
+        value = self.model.evaluate(expression, model_completion=True)
+        return is_true(value) if is_bool(value) else value.as_long()
+
+    # Return the schedule in the model of the last check, as a matrix of booleans (tasks on the rows)
+    def get_schedule(self):
+        if self.schedule_encoding == INTERVAL:
+            schedule = [[False] * self.observation_window for i in range(self.nr_tasks)]
+            for job in self.jobs:
+                if self.evaluate(job.active):
+                    start = self.evaluate(job.start)
+                    for j in range(max(start, 0), min(start + self.evaluate(job.length), self.observation_window)):
+                        schedule[job.taskNr][j] = True
+            return schedule
+        return [[self.evaluate(self.X[i][j]) for j in range(self.observation_window)] for i in range(self.nr_tasks)]
+
+    # Return the periods/clix lengths in the model of the last check
+    def get_periods(self):
+        return [self.evaluate(self.get_period(i)) for i in range(self.nr_tasks)]
+
+    def get_clix_lengths(self):
+        return [self.evaluate(self.get_clix_length(i)) for i in range(self.nr_tasks)]
+
+    # Print the schedule in a more readable way
+    def print_schedule(self, sched_matrix, periods):
+        numbers = ""
+        print("-------------SCHEDULE----------------------------------")
+        for j in range(self.observation_window):
+            if j < 10:
+                numbers += "   " + str(j) + "   "
+            else:
+                numbers += "  " + str(j) + "   "
+        print(numbers)
+        for i in range(self.nr_tasks):
+            matrix_row = ""
+            for j in range(self.observation_window):
+                if sched_matrix[i][j]:
+                    matrix_row += " True  "
+                else:
+                    matrix_row += " False "
+                if j % periods[i] == (periods[i] - 1):
+                    matrix_row = matrix_row[:-1]
+                    matrix_row += "|"
+            print(matrix_row)
+        print("--------------------------------------------------------")
+
+    # Print the result of the last check: the model (if sat) and the statistics of the solver
+    def print_result(self):
+        print(self.result)
+        if self.result == sat:
+            periods = self.get_periods()
+            if self.has_variable_periods():
+                print("Periods: " + str(periods))
+            if self.has_variable_clix_lengths():
+                print("Clix-length: " + str(self.get_clix_lengths()))
+            self.print_schedule(self.get_schedule(), periods)
+        print(self.statistics())
@@ -0,0 +1,147 @@
+import argparse
+import importlib
+import itertools
+import multiprocessing
+import time
+import ConstraintModel as cm
+
+########################################################################################################################
+# This file embeds the enumeration of the periods of the models with a period per task (SameBudgetDifferentPeriod and
+# DifferentBudgetDifferentPeriod). The periods of these models are variables that have to divide the observation window,
+# which makes the arithmetic on them (the begin of a period, the number of runs) non-linear. The periods can only take
+# the divisors of the observation window, so the query is split into one subproblem per assignment of the periods, in
+# which the periods are fixed numbers and all the arithmetic on them is done while building the model.
+# The tasks of these models only differ by their parameters, so the periods are only enumerated in non-decreasing order
+# (an assignment and its permutations give the same result).
+# The subproblems are checked in a pool of processes. A query holds (sat) as soon as one subproblem holds: then the
+# remaining subproblems are not checked anymore. It does not hold (unsat) if none of the subproblems holds.
+# For the interval encoding, the assignments with more periods than max_runs in the observation window are left out
+# (see SameBudgetDifferentPeriod.get_parameter_constraints).
+#
+# Usage (from this directory):
+#     python PeriodEnumeration.py --model SameBudgetDifferentPeriod --parameters observation_window=40 clix_bound=4
+#     python PeriodEnumeration.py --model DifferentBudgetDifferentPeriod --processes 4 --query existence
+########################################################################################################################
+
+# The models with a period per task, by file name
+MODELS = ["SameBudgetDifferentPeriod", "DifferentBudgetDifferentPeriod"]
+
+
+# Return the divisors of the given number, in increasing order
+def get_divisors(number):
+    return [divisor for divisor in range(1, number + 1) if number % divisor == 0]
+
+
+# Return the non-decreasing assignments of divisors of the observation window to the periods of the tasks
+def get_period_assignments(nr_tasks, observation_window, max_runs=None, schedule_encoding=cm.MATRIX):
+    divisors = get_divisors(observation_window)
+    if schedule_encoding == cm.INTERVAL and max_runs is not None:
+        divisors = [divisor for divisor in divisors if observation_window <= max_runs * divisor]
+    return list(itertools.combinations_with_replacement(divisors, nr_tasks))
+
+
+# Build and check the model with the given periods. The arguments are one tuple, so that it can be run in the pool:
+# only the names and the numbers go to the processes, each process builds its own z3 model.
+# Return the result and the timings, with the periods, the clix lengths and the schedule of the model if it is sat.
+def check_period_assignment(arguments):
+    (model_name, parameters, periods, query, counting, cardinality, schedule_encoding, timeout) = arguments
+    model_module = importlib.import_module(model_name)
+    parameters = dict(parameters)
+    # No more runs are needed than the task with the shortest period has
+    observation_window = parameters.get("observation_window", model_module.OBSERVATION_WINDOW)
+    max_runs = observation_window // periods[0]
+    if parameters.get("max_runs") is not None:
+        max_runs = min(max_runs, parameters["max_runs"])
+    parameters["max_runs"] = max_runs
+    model = model_module.build_model(periods=periods, query=query, counting=counting, cardinality=cardinality,
+                                     schedule_encoding=schedule_encoding, **parameters)
+    result = model.check(timeout=None if timeout is None else int(timeout * 1000))
+    outcome = {"periods": periods, "result": str(result), "build_time": model.build_time,
+               "check_time": model.check_time}
+    if result == cm.sat:
+        outcome["clix_lengths"] = model.get_clix_lengths()
+        outcome["schedule"] = model.get_schedule()
+    return outcome
+
+
+# Check the query on the given model for every assignment of the periods, in a pool of the given number of processes
+# (the number of cpus by default), with the given encodings and timeout (in seconds) per subproblem.
+# Return the result of the query, the outcome of the subproblem that holds (if any), and the timings.
+def check_period_assignments(model_name, parameters=None, query=cm.SUFFICIENCY, counting=cm.SUM,
+                             cardinality=cm.ARITHMETIC, schedule_encoding=cm.MATRIX, processes=None, timeout=None):
+    parameters = dict() if parameters is None else parameters
+    model_module = importlib.import_module(model_name)
+    nr_tasks = parameters.get("nr_tasks", model_module.NR_TASKS)
+    observation_window = parameters.get("observation_window", model_module.OBSERVATION_WINDOW)
+    assignments = get_period_assignments(nr_tasks, observation_window, parameters.get("max_runs"), schedule_encoding)
+    arguments = [(model_name, parameters, periods, query, counting, cardinality, schedule_encoding, timeout)
+                 for periods in assignments]
+
+    start = time.perf_counter()
+    outcomes = []
+    holding = None
+    pool = multiprocessing.Pool(processes)
+    try:
+        for outcome in pool.imap_unordered(check_period_assignment, arguments):
+            outcomes.append(outcome)
+            if outcome["result"] == str(cm.sat):
+                holding = outcome
+                break
+    finally:
+        pool.terminate()
+        pool.join()
+    wall_time = time.perf_counter() - start
+
+    if holding is not None:
+        result = str(cm.sat)
+    elif any(outcome["result"] == str(cm.unknown) for outcome in outcomes):
+        result = str(cm.unknown)
+    else:
+        result = str(cm.unsat)
+    return {"model": model_name, "parameters": parameters, "query": query, "counting": counting,
+            "cardinality": cardinality, "schedule_encoding": schedule_encoding, "result": result, "holding": holding,
+            "nr_assignments": len(assignments), "nr_checked": len(outcomes), "wall_time": wall_time,
+            "build_time": sum(outcome["build_time"] for outcome in outcomes),
+            "check_time": sum(outcome["check_time"] for outcome in outcomes)}
+
+
+# Print the result of check_period_assignments, with the periods, clix lengths and schedule of the subproblem that holds
+def print_period_assignments_result(result):
+    print(result["result"])
+    holding = result["holding"]
+    if holding is not None:
+        print("Periods: " + str(list(holding["periods"])))
+        print("Clix-length: " + str(holding["clix_lengths"]))
+        for row in holding["schedule"]:
+            print(" ".join("X" if cell else "." for cell in row))
+    print("Checked %s of %s period assignments in %.2fs (build %.2fs, check %.2fs in total)" %
+          (result["nr_checked"], result["nr_assignments"], result["wall_time"], result["build_time"],
+           result["check_time"]))
+
+
+# Parse the parameters of the model from arguments of the form name=number
+def parse_parameters(arguments):
+    parameters = dict()
+    for argument in arguments:
+        (name, value) = argument.split("=")
+        parameters[name] = int(value)
+    return parameters
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check a query of a model with a period per task, per assignment of "
+                                                 "the periods")
+    parser.add_argument("--model", default=MODELS[0], choices=MODELS)
+    parser.add_argument("--parameters", nargs="*", default=[],
+                        help="parameters of build_model of the model, e.g. observation_window=40")
+    parser.add_argument("--query", default=cm.SUFFICIENCY, choices=cm.QUERIES)
+    parser.add_argument("--counting", default=cm.SUM, choices=cm.COUNTINGS)
+    parser.add_argument("--cardinality", default=cm.ARITHMETIC, choices=cm.CARDINALITIES)
+    parser.add_argument("--schedule-encoding", default=cm.MATRIX, choices=cm.SCHEDULE_ENCODINGS)
+    parser.add_argument("--processes", type=int, help="number of processes (the number of cpus by default)")
+    parser.add_argument("--timeout", type=float, help="timeout of a subproblem in seconds")
+    args = parser.parse_args()
+
+    print_period_assignments_result(
+        check_period_assignments(args.model, parse_parameters(args.parameters), args.query, args.counting,
+                                 args.cardinality, args.schedule_encoding, args.processes, args.timeout))
@@ -1,4 +1,5 @@
 from z3 import *
+import ConstraintModel as cm
 
 # This configuration builds on top of the simplest configuration (see SamePeriodSameBudgetSameRelease.py).
 # The release is assumed to be at 0 and the budget will be fixed too (and the same for all tasks)
@@ -8,263 +9,322 @@ CLIX_BOUND = 3
 NR_TASKS = 3
 OBSERVATION_WINDOW = 20
 MAX_RUNS = OBSERVATION_WINDOW # this constant is needed to make the model solvable, to make the for-loops usable...
-                # It should be at least OBS_WINDOW/CLIX_BOUND
+                # It should be at least OBS_WINDOW/CLIX_BOUND (build_model takes OBSERVATION_WINDOW by default)
 #RELEASE by default at timepoint 0
-
-# --------------Additional rules ---------------------------
-
-# List with the clix-length for the tasks
-period_length = [Int("period_%s" % (i+1)) for i in range(NR_TASKS)]
-
-
-# The period has to be bigger than 0 and cannot be greater than the OBSERVATION_WINDOW.
-# It furthermore has to be a divisor of the OBSERVATION_WINDOW.
-period_c = [And(period_length[i] > 0, period_length[i] <= OBSERVATION_WINDOW,
-                OBSERVATION_WINDOW % period_length[i] == 0)
-            for i in range(NR_TASKS)]
-
-
-# Return the period of the given task
-def get_period(taskNr):
-    return period_length[taskNr]
-
-
-# Return whether the timepoint is in between begin and end, including the begin and end-point.
-def in_between(time, begin, end):
-    return And(begin <= time, time <= end)
-
-
-# PeriodNr starts at 0 and ends at (OBSERVATION_WINDOW/period_length) - 1
-def get_begin_of_period(taskNr, periodNr):
-    return periodNr * get_period(taskNr)
-
-
-def get_begin_of_period_given_timepoint(taskNr, time):
-    return (Sum([If(get_begin_of_period(taskNr, periodNr) <= time, 1, 0) for periodNr in range(MAX_RUNS)])
-            - 1) * get_period(taskNr)
-
-
-# Return the number of cycles the task has run in between the two time points
-def nr_cycles_ran_in_between_timepoints(sched, taskNr, begin, end):
-    return \
-        Sum([If(
-            And(in_between(j, begin, end - 1), sched[taskNr][j]) #end - 1 because in-between includes the endpoints
-            , 1, 0)
-            for j in range(OBSERVATION_WINDOW)])
-
-
-# Return whether the task has run less than one clix within it's period
-def task_will_run_not_longer_than_one_clix_per_period(sched, taskNr, periodNr):
-    return nr_cycles_ran_in_between_timepoints(sched, taskNr,
-                                               get_begin_of_period(taskNr, periodNr),
-                                               get_begin_of_period(taskNr, periodNr + 1)) \
-           <= CLIX_BOUND
-
-
-# Return whether the task has run at least a complete clix this period
-def task_has_fully_run_this_period(sched, taskNr, periodNr):
-    return nr_cycles_ran_in_between_timepoints(sched, taskNr,
-                                               get_begin_of_period(taskNr, periodNr),
-                                               get_begin_of_period(taskNr, periodNr + 1)) \
-           >= CLIX_BOUND
-
-
-def get_nr_of_runs(taskNr):
-    return OBSERVATION_WINDOW/get_period(taskNr)
-
-
-# NrOfPeriods is the number of periods this task has to run within the observation window (see get_nr_of_runs(...))
-# periodNr will range from 0 to NrOfPeriods - 1
-def task_has_run_fully_all_periods(sched, taskNr, NrOfPeriods):
-    return And([Or(task_has_fully_run_this_period(sched, taskNr, periodNr), periodNr >= NrOfPeriods)
-                for periodNr in range(MAX_RUNS)])
-
-# --------------Adapted code---------------------------------------------------------------------------------
-# The differences are located at the points where first the DEFAULT_PERIOD parameter was used...
-# In most cases, this was where an iteration over all the time points was needed (there OBSERVATION_WINDOW is used instead)
-# In some cases, for the completion of a task however, the task period (get_period(taskNr)) has to be taken into account
-# Because a task with a short period can run multiple times in the OBSERVATION_WINDOW time.
-
-# Print the schedule in a more readable way
-def print_schedule(sched_matrix, periods):
-    numbers = ""
-    print("-------------SCHEDULE----------------------------------")
-    for j in range(OBSERVATION_WINDOW):
-        if j < 10:
-            numbers += "   " + str(j) + "   "
+# The periods can also be fixed (a number per task) instead of variables: then all the arithmetic on the periods is done
+# while building the model, which is linear and much easier to solve (see PeriodEnumeration.py)
+
+
+# The model of tasks with the same clix length (CLIX_BOUND) and a period per task, which divides the observation window
+class SameBudgetDifferentPeriod(cm.ConstraintModel):
+    def __init__(self, nr_tasks, observation_window, clix_bound, max_runs, periods, query, counting, cardinality,
+                 schedule_encoding):
+        self.clix_bound = clix_bound
+        self.max_runs = max_runs
+        self.periods = periods
+        parameters = {"nr_tasks": nr_tasks, "observation_window": observation_window, "clix_bound": clix_bound,
+                      "max_runs": max_runs, "periods": periods}
+        cm.ConstraintModel.__init__(self, "SameBudgetDifferentPeriod", parameters, nr_tasks, observation_window, query,
+                                    counting, cardinality, schedule_encoding)
+
+    def get_clix_length(self, taskNr):
+        return self.clix_bound
+
+    # --------------Additional rules ---------------------------
+
+    # Create the variables of the model: the period-length for the tasks (or the fixed periods)
+    def create_variables(self):
+        if self.periods is None:
+            self.period_length = [Int("period_%s" % (i+1)) for i in range(self.nr_tasks)]
         else:
-            numbers += "  " + str(j) + "   "
-    print(numbers)
-    for i in range(NR_TASKS):
-        matrix_row = ""
-        for j in range(OBSERVATION_WINDOW):
-            if sched_matrix[i][j]:
-                matrix_row += " True  "
-            else:
-                matrix_row += " False "
-            if j % periods[i].as_long() == (periods[i].as_long() - 1):
-                matrix_row = matrix_row[:-1]
-                matrix_row += "|"
-        print(matrix_row)
-    print("--------------------------------------------------------")
-
-
-# Based on https://ericpony.github.io/z3py-tutorial/guide-examples.htm
-# Matrix with the tasks on the rows (NR_TASKS) and the timepoints on the columns (OBSERVATION_WINDOW)
-X = [[Bool("x_%s_%s" % (i+1, j+1)) for j in range(OBSERVATION_WINDOW)]
-     for i in range(NR_TASKS)]
-
-
-# Return if some task is running at the given time
-def some_task_is_running(sched, time):
-    return Or([sched[i][time] for i in range(NR_TASKS)])
-
-
-# All tasks have finished their periodic run
-# has run longer than the default clix length, between the begin of period and time
-def finished_periodic_run(sched, time, taskNr):
-    return nr_cycles_ran_in_between_timepoints(sched, taskNr,
-                                               get_begin_of_period_given_timepoint(taskNr, time),
-                                               time) \
-           >= CLIX_BOUND
-
-
-# Return if all tasks have done all their work (so all the necessary runs) before the given time
-# The task needs to have finished its run within the current period.
-def all_tasks_finished_their_run(sched, time):
-    return And([finished_periodic_run(sched, time, i) for i in range(NR_TASKS)])
-
-
-# Return if the task-run was non-interrupted (2 transitions, one start and end)
-# or doesn't run at all (0 transitions)
-def atomicity_of_one_run(sched, taskNr, periodNr):
-    current_period_begin = get_begin_of_period(taskNr, periodNr)
-    period = get_period(taskNr)
-    nr_transitions = Sum([If(
-        in_between(j, current_period_begin, current_period_begin + period - 2),
-        # Because j + 1 == current_period_begin+period - 1 should be last point
-        Sum([If(Xor(sched[taskNr][j], sched[taskNr][j + 1]), 1, 0),  # There is a transition
-             If(And(j == current_period_begin, sched[taskNr][j]), 1, 0),  # the  task starts at begin of timeframe
-             If(And(j + 1 == current_period_begin + period - 1, sched[taskNr][j + 1]), 1, 0)]),
-             # the task ends at end of timeframe
-        0)
-        for j in range(OBSERVATION_WINDOW - 1)])  # OBS_WINDOW - 1 because the j + 1 will point till the next time point
-    return Or(nr_transitions == 2, nr_transitions == 0)
-
-
-# All runs have to be atomic
-def atomicity_of_task(sched, taskNr):
-    return And([Or(atomicity_of_one_run(sched, taskNr, periodNr), periodNr >= get_nr_of_runs(taskNr))
-                for periodNr in range(MAX_RUNS)])
-
-# FOR EARLIEST DEADLINE
-
-
-# Return whether the task that starts at this time point is the task with the nearest deadline.
-def starting_task_has_nearest_deadline(sched, time):
-    # If the task has started now, then its deadline should be the nearest one.
-    # Task has started clix:
-    #       * is running now + is only running first cycle
-    # If this is the case, the task should be the one with the smallest period
-    # All other ready tasks should have higher period
-    return And([
-        Implies(
-            And(sched[i][time],
-                nr_cycles_ran_in_between_timepoints(sched, i,
-                                                    get_begin_of_period_given_timepoint(i, time), time + 1) == 1),
-            is_ready_with_nearest_deadline(sched, time, i))
-        for i in range(NR_TASKS)])
-
-
-# Return the following deadline for the given task compared to the time point.
-# This is equal to the begin of the next period.
-def get_deadline_given_time_point(time, taskNr):
-    return get_begin_of_period_given_timepoint(taskNr, time) + period_length[taskNr]
-
-
-# Return whether the given task is the ready task with the nearest deadline.
-def is_ready_with_nearest_deadline(sched, time, taskNr):
-    # Either the other tasks have not the nearest deadline, or they ran already within their period.
-    return And([Or(get_deadline_given_time_point(time, taskNr) <= get_deadline_given_time_point(time, j),
-                   finished_periodic_run(sched, time, j))
-                for j in range(NR_TASKS)])
-
-
-# Constraints
-# Each cell is true or false: is already implied by the cells being of type bool
-
-# Only one task can run at the same moment (in the same column, only one true-value)
-no_overlap_c = [Sum([If(X[i][j], 1, 0) for i in range(NR_TASKS)]) <= 1 for j in range(OBSERVATION_WINDOW)]
-
-# A task can only start after release: is already done by having some finite number of time points starting at 0
-
-# A task should run for maximal a certain amount of time ( <= CLIX_BOUND)
-run_time_c = [And([Or(task_will_run_not_longer_than_one_clix_per_period(X, i, periodNr), periodNr >= get_nr_of_runs(i))
-                   for periodNr in range(MAX_RUNS)])
-              for i in range(NR_TASKS)]
-#
-# To meet its requirements, a task should at least run the clix_length (scheduling goal, >= clix_length)
-sched_goal_c = [task_has_run_fully_all_periods(X, i, get_nr_of_runs(i)) for i in range(NR_TASKS)]
-# The negation of the scheduling goal, has some task missed its deadline?
-neg_sched_goal = Or([Not(task_has_run_fully_all_periods(X, i, get_nr_of_runs(i))) for i in range(NR_TASKS)])
-
-# Atomicity (no preemption possible)
-atomicity_c = [atomicity_of_task(X, i) for i in range(NR_TASKS)]
-
-# ---EDF Constraints---
-# There will be at each moment one task running, or all tasks have finished running
-# So for each time point j: either some task is running, or all tasks have currently finished their periodic run.
-no_idling_when_tasks_ready_c = [Or(some_task_is_running(X, j), all_tasks_finished_their_run(X, j))
-                                for j in range(OBSERVATION_WINDOW)]
-
-# The task running, will be that with the earliest deadline:
-earliest_deadline_first_c = [starting_task_has_nearest_deadline(X, j) for j in range(OBSERVATION_WINDOW - 1)]
-
-# ---Acceptance test---
-# The following acceptance test is not sufficient. It only checks if everything would fit inside the observation
-# window, but does not take care of different periodicities.
-# acc_test = Sum([get_nr_of_runs(i) * CLIX_BOUND for i in range(NR_TASKS)]) <= OBSERVATION_WINDOW
-# Sufficient acceptance test (but very restrictive). It ensures that each period is at least big enough to contain
-# one execution of each task. This is sufficient.
-acc_test = And([NR_TASKS * CLIX_BOUND <= period_length[i] for i in range(NR_TASKS)])
-
-# Add all constraints to the solver
-s = Solver()
-s.add(no_overlap_c)
-s.add(run_time_c)
-s.add(atomicity_c)
-s.add(no_idling_when_tasks_ready_c)
-
-s.add(period_c)
-s.add(earliest_deadline_first_c)
-
-# ---Check if the acceptance test is sufficient---
-# There are different phrasings:
-# - The acceptance test implies schedulability
-# s.add(Implies(acc_test, And(sched_goal_c)))
-# - It should not be possible to have a situation that satisfies the acc_test and misses deadlines
-s.add(And(acc_test, neg_sched_goal))
-# - Or in this simple case, you can also manually check the acceptance test and then check if some
-# bad schedule can be found
-# s.add(neg_sched_goal)
-
-# Check if there are at least some schedulable task sets that satisfy the acceptance test
-# To be sure that the acceptance test is not far too restrictive
-# s.add(And(sched_goal_c), acc_test)
-
-# Checking if the acceptance test is necessary: if this gives unsat then a system is only schedulable if accepted
-# If a test is both necessary and sufficient, then it is exact.
-# s.add(Not(acc_test), And(sched_goal_c))
-
-# print(s.assertions())
-value = s.check()
-print(value)
-if value == sat:
-    m = s.model()
-    schedule = [[m.evaluate(X[i][j]) for j in range(OBSERVATION_WINDOW)] for i in range(NR_TASKS)]
-    periods = [m.evaluate(period_length[i]) for i in range(NR_TASKS)]
-    print("Periods: " + str(periods))
-    print_schedule(schedule, periods)
-
-print(s.statistics())
-
+            self.period_length = list(self.periods)
+        # The begin of the period of a task at a time point, built once per task and time point
+        self.begins_of_period = dict()
+
+    # The period has to be bigger than 0 and cannot be greater than the OBSERVATION_WINDOW.
+    # It furthermore has to be a divisor of the OBSERVATION_WINDOW.
+    # In the interval encoding, a task has max_runs jobs, so it cannot have more periods in the OBSERVATION_WINDOW.
+    def get_parameter_constraints(self):
+        window = self.observation_window
+        period_c = [And(self.period_length[i] > 0, self.period_length[i] <= window, window % self.period_length[i] == 0)
+                    for i in range(self.nr_tasks)]
+        if self.schedule_encoding == cm.INTERVAL:
+            period_c += [window <= self.max_runs * self.period_length[i] for i in range(self.nr_tasks)]
+        return period_c
+
+    # ---Acceptance test---
+    def get_acceptance_test(self):
+        # The following acceptance test is not sufficient. It only checks if everything would fit inside the observation
+        # window, but does not take care of different periodicities.
+        # acc_test = Sum([self.get_nr_of_runs(i) * self.clix_bound for i in range(self.nr_tasks)]) <= window
+        # Sufficient acceptance test (but very restrictive). It ensures that each period is at least big enough to
+        # contain one execution of each task. This is sufficient.
+        return And([self.nr_tasks * self.clix_bound <= self.period_length[i] for i in range(self.nr_tasks)])
+
+    # Return the period of the given task
+    def get_period(self, taskNr):
+        return self.period_length[taskNr]
+
+    def has_variable_periods(self):
+        return True
+
+    # The jobs of the interval encoding: a job per period of the task, which is only active if the period begins in the
+    # OBSERVATION_WINDOW
+    # (with a fixed period, only the jobs in the OBSERVATION_WINDOW are created)
+    def get_jobs(self):
+        return [cm.Job(i, periodNr, self.get_begin_of_period(i, periodNr), self.get_begin_of_period(i, periodNr + 1),
+                       self.get_clix_length(i), periodNr * self.get_period(i) < self.observation_window)
+                for i in range(self.nr_tasks) for periodNr in self.get_run_numbers(self.get_nr_of_runs(i))]
+
+    # Return whether the timepoint is in between begin and end, including the begin and end-point.
+    def in_between(self, time, begin, end):
+        if not is_expr(begin) and not is_expr(end):
+            return begin <= time <= end
+        return And(begin <= time, time <= end)
+
+    # PeriodNr starts at 0 and ends at (OBSERVATION_WINDOW/period_length) - 1
+    def get_begin_of_period(self, taskNr, periodNr):
+        return periodNr * self.get_period(taskNr)
+
+    def get_begin_of_period_given_timepoint(self, taskNr, time):
+        period = self.get_period(taskNr)
+        if not is_expr(period):
+            return min(time // period, self.max_runs - 1) * period
+        if (taskNr, time) not in self.begins_of_period:
+            self.begins_of_period[(taskNr, time)] = \
+                (Sum([If(self.get_begin_of_period(taskNr, periodNr) <= time, 1, 0)
+                      for periodNr in range(self.max_runs)]) - 1) * period
+        return self.begins_of_period[(taskNr, time)]
+
+    # Return the number of cycles the task has run in between the two time points (begin <= end)
+    def nr_cycles_ran_in_between_timepoints(self, sched, taskNr, begin, end):
+        if self.uses_prefix_sums(sched):
+            return self.cycles_ran_before(taskNr, end) - self.cycles_ran_before(taskNr, begin)
+        if not is_expr(begin) and not is_expr(end):
+            return Sum([If(sched[taskNr][j], 1, 0) for j in range(max(begin, 0), min(end, self.observation_window))])
+        return \
+            Sum([If(
+                # end - 1 because in-between includes the endpoints
+                And(self.in_between(j, begin, end - 1), sched[taskNr][j])
+                , 1, 0)
+                for j in range(self.observation_window)])
+
+    # Return the Booleans that hold whether the task runs at each time point in between the two time points, as counted
+    # by nr_cycles_ran_in_between_timepoints (for the cardinality constraints)
+    def get_cycles_in_between(self, sched, taskNr, begin, end):
+        if not is_expr(begin) and not is_expr(end):
+            return sched[taskNr][max(begin, 0):max(end, 0)]
+        return [And(self.in_between(j, begin, end - 1), sched[taskNr][j]) for j in range(self.observation_window)]
+
+    # Return whether the task has run less than one clix within it's period
+    def task_will_run_not_longer_than_one_clix_per_period(self, sched, taskNr, periodNr):
+        if self.uses_cardinality(self.get_clix_length(taskNr)):
+            return self.at_most(self.get_cycles_in_between(sched, taskNr, self.get_begin_of_period(taskNr, periodNr),
+                                                           self.get_begin_of_period(taskNr, periodNr + 1)),
+                                self.get_clix_length(taskNr))
+        return self.nr_cycles_ran_in_between_timepoints(sched, taskNr,
+                                                        self.get_begin_of_period(taskNr, periodNr),
+                                                        self.get_begin_of_period(taskNr, periodNr + 1)) \
+               <= self.get_clix_length(taskNr)
+
+    # Return whether the task has run at least a complete clix this period
+    def task_has_fully_run_this_period(self, sched, taskNr, periodNr):
+        if self.uses_cardinality(self.get_clix_length(taskNr)):
+            return self.at_least(self.get_cycles_in_between(sched, taskNr, self.get_begin_of_period(taskNr, periodNr),
+                                                            self.get_begin_of_period(taskNr, periodNr + 1)),
+                                 self.get_clix_length(taskNr))
+        return self.nr_cycles_ran_in_between_timepoints(sched, taskNr,
+                                                        self.get_begin_of_period(taskNr, periodNr),
+                                                        self.get_begin_of_period(taskNr, periodNr + 1)) \
+               >= self.get_clix_length(taskNr)
+
+    def get_nr_of_runs(self, taskNr):
+        if not is_expr(self.get_period(taskNr)):
+            return self.observation_window // self.get_period(taskNr)
+        return self.observation_window/self.get_period(taskNr)
+
+    # Return the numbers of the periods of a task with the given number of runs (see get_nr_of_runs(...)) for which the
+    # rules are built: all max_runs of them, or with a fixed period only those in the observation window
+    def get_run_numbers(self, NrOfPeriods):
+        if is_expr(NrOfPeriods):
+            return range(self.max_runs)
+        return range(min(self.max_runs, NrOfPeriods))
+
+    # Return whether the rule holds for the given period, if this period is in the observation window
+    # (with a fixed period, get_run_numbers only gives the periods in the window)
+    def holds_in_period(self, rule, periodNr, NrOfPeriods):
+        if is_expr(NrOfPeriods):
+            return Or(rule, periodNr >= NrOfPeriods)
+        return rule
+
+    # NrOfPeriods is the number of periods this task has to run within the observation window (see get_nr_of_runs(...))
+    # periodNr will range from 0 to NrOfPeriods - 1
+    def task_has_run_fully_all_periods(self, sched, taskNr, NrOfPeriods):
+        return And([self.holds_in_period(self.task_has_fully_run_this_period(sched, taskNr, periodNr), periodNr,
+                                         NrOfPeriods)
+                    for periodNr in self.get_run_numbers(NrOfPeriods)])
+
+    # --------------Adapted code---------------------------------------------------------------------------------
+    # The differences are located at the points where first the DEFAULT_PERIOD parameter was used...
+    # In most cases, this was where an iteration over all the time points was needed (there OBSERVATION_WINDOW is used
+    # instead). In some cases, for the completion of a task however, the task period (get_period(taskNr)) has to be
+    # taken into account, because a task with a short period can run multiple times in the OBSERVATION_WINDOW time.
+
+    # All tasks have finished their periodic run
+    # has run longer than the default clix length, between the begin of period and time
+    def finished_periodic_run(self, sched, time, taskNr):
+        if self.uses_cardinality(self.get_clix_length(taskNr)):
+            begin = self.get_begin_of_period_given_timepoint(taskNr, time)
+            return self.at_least(self.get_cycles_in_between(sched, taskNr, begin, time), self.get_clix_length(taskNr))
+        return self.nr_cycles_ran_in_between_timepoints(sched, taskNr,
+                                                        self.get_begin_of_period_given_timepoint(taskNr, time),
+                                                        time) \
+               >= self.get_clix_length(taskNr)
+
+    # Return if all tasks have done all their work (so all the necessary runs) before the given time
+    # The task needs to have finished its run within the current period.
+    def all_tasks_finished_their_run(self, sched, time):
+        return And([self.finished_periodic_run(sched, time, i) for i in range(self.nr_tasks)])
+
+    # Return if the task-run was non-interrupted (2 transitions, one start and end)
+    # or doesn't run at all (0 transitions)
+    def atomicity_of_one_run(self, sched, taskNr, periodNr):
+        current_period_begin = self.get_begin_of_period(taskNr, periodNr)
+        period = self.get_period(taskNr)
+        # With a fixed period, only the time points of the run are visited
+        if is_expr(period):
+            time_points = range(self.observation_window - 1)
+        else:
+            time_points = range(current_period_begin,
+                                min(current_period_begin + period - 1, self.observation_window - 1))
+        if self.uses_cardinality(2):
+            transitions = []
+            for j in time_points:
+                in_run = self.in_between(j, current_period_begin, current_period_begin + period - 2)
+                transitions += [And(in_run, Xor(sched[taskNr][j], sched[taskNr][j + 1])),
+                                And(in_run, j == current_period_begin, sched[taskNr][j]),
+                                And(in_run, j + 1 == current_period_begin + period - 1, sched[taskNr][j + 1])]
+            return Or(self.exactly(transitions, 2), self.exactly(transitions, 0))
+        nr_transitions = Sum([If(
+            self.in_between(j, current_period_begin, current_period_begin + period - 2),
+            # Because j + 1 == current_period_begin+period - 1 should be last point
+            Sum([If(Xor(sched[taskNr][j], sched[taskNr][j + 1]), 1, 0),  # There is a transition
+                 If(And(j == current_period_begin, sched[taskNr][j]), 1, 0),  # the  task starts at begin of timeframe
+                 If(And(j + 1 == current_period_begin + period - 1, sched[taskNr][j + 1]), 1, 0)]),
+                 # the task ends at end of timeframe
+            0)
+            for j in time_points])  # OBS_WINDOW - 1 because the j + 1 will point till the next time point
+        return Or(nr_transitions == 2, nr_transitions == 0)
+
+    # All runs have to be atomic
+    def atomicity_of_task(self, sched, taskNr):
+        NrOfPeriods = self.get_nr_of_runs(taskNr)
+        return And([self.holds_in_period(self.atomicity_of_one_run(sched, taskNr, periodNr), periodNr, NrOfPeriods)
+                    for periodNr in self.get_run_numbers(NrOfPeriods)])
+
+    # FOR EARLIEST DEADLINE
+
+    # Return whether the task that starts at this time point is the task with the nearest deadline.
+    def starting_task_has_nearest_deadline(self, sched, time):
+        # If the task has started now, then its deadline should be the nearest one.
+        # Task has started clix:
+        #       * is running now + is only running first cycle
+        # If this is the case, the task should be the one with the smallest period
+        # All other ready tasks should have higher period
+        return And([
+            Implies(
+                And(sched[i][time], self.has_run_one_cycle(sched, i, time)),
+                self.is_ready_with_nearest_deadline(sched, time, i))
+            for i in range(self.nr_tasks)])
+
+    # Return whether the task has run exactly one cycle in its current period, up to and including the time point
+    def has_run_one_cycle(self, sched, taskNr, time):
+        begin = self.get_begin_of_period_given_timepoint(taskNr, time)
+        if self.uses_cardinality(1):
+            return self.exactly(self.get_cycles_in_between(sched, taskNr, begin, time + 1), 1)
+        return self.nr_cycles_ran_in_between_timepoints(sched, taskNr, begin, time + 1) == 1
+
+    # Return the following deadline for the given task compared to the time point.
+    # This is equal to the begin of the next period.
+    def get_deadline_given_time_point(self, time, taskNr):
+        return self.get_begin_of_period_given_timepoint(taskNr, time) + self.get_period(taskNr)
+
+    # Return whether the given task is the ready task with the nearest deadline.
+    def is_ready_with_nearest_deadline(self, sched, time, taskNr):
+        # Either the other tasks have not the nearest deadline, or they ran already within their period.
+        # (With fixed periods the deadlines are numbers, and only the tasks with a nearer deadline are left.)
+        has_not_nearest_deadline = [self.get_deadline_given_time_point(time, taskNr)
+                                    <= self.get_deadline_given_time_point(time, j) for j in range(self.nr_tasks)]
+        return And([Or(has_not_nearest_deadline[j], self.finished_periodic_run(sched, time, j))
+                    for j in range(self.nr_tasks) if has_not_nearest_deadline[j] is not True])
+
+    def build(self):
+        X = self.X
+        window = self.observation_window
+        tasks = range(self.nr_tasks)
+
+        self.create_variables()
+
+        # Constraints
+        # Each cell is true or false: is already implied by the cells being of type bool
+
+        # Only one task can run at the same moment (in the same column, only one true-value)
+        if self.uses_cardinality(1):
+            no_overlap_c = [self.at_most([X[i][j] for i in tasks], 1) for j in range(window)]
+        else:
+            no_overlap_c = [Sum([If(X[i][j], 1, 0) for i in tasks]) <= 1 for j in range(window)]
+
+        # A task can only start after release: is already done by having some finite number of time points starting at 0
+
+        # A task should run for maximal a certain amount of time ( <= CLIX_BOUND)
+        run_time_c = [And([self.holds_in_period(self.task_will_run_not_longer_than_one_clix_per_period(X, i, periodNr),
+                                                periodNr, self.get_nr_of_runs(i))
+                           for periodNr in self.get_run_numbers(self.get_nr_of_runs(i))])
+                      for i in tasks]
+
+        # To meet its requirements, a task should at least run the clix_length (scheduling goal, >= clix_length)
+        sched_goal_c = [self.task_has_run_fully_all_periods(X, i, self.get_nr_of_runs(i)) for i in tasks]
+        # The negation of the scheduling goal, has some task missed its deadline?
+        neg_sched_goal = Or([Not(self.task_has_run_fully_all_periods(X, i, self.get_nr_of_runs(i))) for i in tasks])
+
+        # Atomicity (no preemption possible)
+        atomicity_c = [self.atomicity_of_task(X, i) for i in tasks]
+
+        # ---EDF Constraints---
+        # There will be at each moment one task running, or all tasks have finished running
+        # So for each time point j: either some task is running, or all tasks have currently finished their periodic
+        # run.
+        no_idling_when_tasks_ready_c = [Or(self.some_task_is_running(X, j), self.all_tasks_finished_their_run(X, j))
+                                        for j in range(window)]
+
+        # The task running, will be that with the earliest deadline:
+        earliest_deadline_first_c = [self.starting_task_has_nearest_deadline(X, j) for j in range(window - 1)]
+
+        self.constraints = (no_overlap_c + run_time_c + atomicity_c + no_idling_when_tasks_ready_c
+                            + self.get_parameter_constraints() + earliest_deadline_first_c)
+        self.acc_test = self.get_acceptance_test()
+        self.sched_goal = And(sched_goal_c)
+        self.neg_sched_goal = neg_sched_goal
+
+
+# Return the model for the given parameters, checked by default for the given query, with the given encodings of the
+# number of cycles a task has run, of the comparisons of counts and of the schedule (see ConstraintModel.py).
+# max_runs is OBSERVATION_WINDOW by default. The periods are variables, unless a period per task is given.
+def build_model(nr_tasks=NR_TASKS, observation_window=OBSERVATION_WINDOW, clix_bound=CLIX_BOUND, max_runs=None,
+                periods=None, query=cm.SUFFICIENCY, counting=cm.SUM, cardinality=cm.ARITHMETIC,
+                schedule_encoding=cm.MATRIX):
+    max_runs = observation_window if max_runs is None else max_runs
+    return SameBudgetDifferentPeriod(nr_tasks, observation_window, clix_bound, max_runs, periods, query, counting,
+                                     cardinality, schedule_encoding)
+
+
+if __name__ == "__main__":
+    # ---Check if the acceptance test is sufficient---
+    # It should not be possible to have a situation that satisfies the acc_test and misses deadlines (cm.SUFFICIENCY).
+    # Check if there are at least some schedulable task sets that satisfy the acceptance test, to be sure that the
+    # acceptance test is not far too restrictive: build_model(query=cm.EXISTENCE)
+    # Checking if the acceptance test is necessary: if cm.NECESSITY gives unsat then a system is only schedulable if
+    # accepted. If a test is both necessary and sufficient, then it is exact.
+    model = build_model(max_runs=MAX_RUNS)
+    model.check()
+    model.print_result()
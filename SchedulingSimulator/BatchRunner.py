@@ -0,0 +1,162 @@
+import copy
+import itertools
+import json
+from concurrent.futures import ProcessPoolExecutor
+import MCU as mcu
+import SimulationContext as sc
+
+########################################################################################################################
+# This file makes it possible to run a batch of simulations (e.g. a list of scenarios, or a sweep over the parameters
+# of a scenario) in a pool of worker processes. Every simulation runs in its own simulation context and only a compact
+# summary of each run (deadline misses, budget overruns, interrupts, utilisation) is sent back.
+#
+# A run is described by a dict:
+#   - "name": a name to recognise the run in the summaries
+#   - "scenario": the list of task data of the scenario (same format as in "testScript.json")
+#   - "nr_time_points": the number of cycles that will be simulated
+#   - "parameters": the parameters that were applied to the scenario (see apply_parameters), only for reporting
+#   - "max_clix_duration"/"wcet_scheduler": the MCU and scheduler parameters (None for the defaults)
+#   - "admission_test": whether the tasks have to pass the acceptance test of the scheduler
+########################################################################################################################
+
+# The parameters of a task that can be changed in a sweep, given as "<pid>.<parameter>"
+TASK_PARAMETERS = ["budget", "period", "release_time", "clix"]
+# The parameters of the MCU and the scheduler that can be changed in a sweep
+SYSTEM_PARAMETERS = ["max_clix_duration", "wcet_scheduler", "nr_time_points", "admission_test"]
+
+
+# Return the task data of the given scenario in the test script file
+def load_scenario(test_script, file_name='testScript.json'):
+    file = open(file_name)
+    list_task_data = json.load(file)[test_script]
+    file.close()
+    return list_task_data
+
+
+# Return a new run description for the given scenario
+def new_run(name, scenario, nr_time_points, max_clix_duration=None, wcet_scheduler=None, parameters=None,
+            admission_test=True):
+    return {"name": name, "scenario": scenario, "nr_time_points": nr_time_points,
+            "max_clix_duration": max_clix_duration, "wcet_scheduler": wcet_scheduler,
+            "admission_test": admission_test, "parameters": dict() if parameters is None else parameters}
+
+
+# Return a list of runs, one for each of the given scenario names (from the test script file)
+def make_scenario_runs(test_scripts, nr_time_points, file_name='testScript.json'):
+    return [new_run(test_script, load_scenario(test_script, file_name), nr_time_points)
+            for test_script in test_scripts]
+
+
+# Return a list of runs: one run for every combination of the values in the parameter grid.
+# The grid maps a parameter on the list of values it should take. The parameter is either a system parameter
+# (see SYSTEM_PARAMETERS) or a task parameter "<pid>.<parameter>" (see TASK_PARAMETERS), e.g.
+#   {"enc1.budget": [100, 150, 200], "enc2.period": [300, 600], "wcet_scheduler": [10, 20]}
+# "<pid>.clix" sets the duration of all the clix instructions in the program of the task.
+def make_parameter_grid(name, scenario, nr_time_points, grid):
+    parameter_names = list(grid)
+    runs = []
+    for values in itertools.product(*[grid[parameter] for parameter in parameter_names]):
+        parameters = dict(zip(parameter_names, values))
+        runs.append(new_run(name, apply_parameters(scenario, parameters),
+                            parameters.get("nr_time_points", nr_time_points),
+                            parameters.get("max_clix_duration"), parameters.get("wcet_scheduler"), parameters,
+                            parameters.get("admission_test", True)))
+    return runs
+
+
+# Return a copy of the scenario in which the task parameters are changed to the given values
+def apply_parameters(scenario, parameters):
+    scenario = copy.deepcopy(scenario)
+    tasks_by_pid = {task_data["pid"]: task_data for task_data in scenario}
+    for (parameter, value) in parameters.items():
+        if parameter in SYSTEM_PARAMETERS:
+            continue
+        (pid, task_parameter) = parameter.rsplit(".", 1)
+        if pid not in tasks_by_pid or task_parameter not in TASK_PARAMETERS:
+            raise ValueError("Unknown parameter: " + parameter)
+        task_data = tasks_by_pid[pid]
+        if task_parameter == "clix":
+            if "program" not in task_data:
+                raise ValueError("Task " + pid + " has no program with clix instructions")
+            for instruction in task_data["program"]:
+                if instruction["type"] == "clix":
+                    instruction["param"] = value
+        else:
+            task_data[task_parameter] = value
+    return scenario
+
+
+# Run the simulation of the given run description and return its summary. This is the function that is executed by
+# the worker processes. If extrapolate is True, the steady state of the simulation is extrapolated (see SteadyState.py).
+def run_simulation(run, event_driven=True, extrapolate=False):
+    # The debug output of the simulator is not traced for batch runs (default trace level)
+    context = sc.new_simulation_context(run["max_clix_duration"], run["wcet_scheduler"],
+                                        admission_test=run.get("admission_test", True))
+    try:
+        mcu.simulate(run["scenario"], run["nr_time_points"], event_driven=event_driven, context=context,
+                     extrapolate=extrapolate)
+        error = None
+    except Exception as exception:
+        error = type(exception).__name__ + ": " + str(exception)
+    summary = summarize(context)
+    summary["name"] = run["name"]
+    summary["parameters"] = run["parameters"]
+    summary["error"] = error
+    return summary
+
+
+# Return a compact summary of the simulation in the given context
+def summarize(context):
+    nr_time_points = context.max_nr_time_points
+    trace_store = context.trace_store
+    busy_cycles = 0
+    scheduler_cycles = 0
+    # The last segment has no finish time if the simulation stopped because of an error
+    for (task_id, start, finish) in zip(trace_store.segment_task, trace_store.segment_start,
+                                        trace_store.segment_finish):
+        if trace_store.is_scheduler_task(task_id):
+            scheduler_cycles += finish - start
+        else:
+            busy_cycles += finish - start
+    return {"nr_time_points": nr_time_points,
+            "rejected_tasks": context.nr_rejected_tasks,
+            "finished_jobs": context.nr_finished_jobs,
+            "deadline_misses": context.nr_deadline_misses,
+            "budget_overruns": context.nr_budget_overruns,
+            "interrupts": context.nr_handled_interrupts,
+            "scheduler_invocations": context.nr_scheduler_invocations,
+            "context_switches": context.nr_context_switches,
+            "hardware_violations": context.nr_hardware_violations,
+            "clix_sections": context.nr_clix_sections,
+            "idle_cycles": context.nr_idle_cycles,
+            "utilisation": busy_cycles / nr_time_points if nr_time_points > 0 else 0,
+            "scheduler_utilisation": scheduler_cycles / nr_time_points if nr_time_points > 0 else 0}
+
+
+# Run all the given runs in a pool of worker processes and return their summaries (in the same order as the runs).
+# By default, as many workers as there are CPUs are used.
+def run_batch(runs, max_workers=None, event_driven=True, chunksize=1, extrapolate=False):
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(run_simulation, runs, itertools.repeat(event_driven), itertools.repeat(extrapolate),
+                                 chunksize=chunksize))
+
+
+# Save the summaries to a JSON file
+def save_summaries(summaries, file_name):
+    file = open(file_name, "w")
+    json.dump(summaries, file, indent=2)
+    file.close()
+
+
+if __name__ == "__main__":
+    # Example: sweep over the budget of one task and the WCET of the scheduler
+    TASK_SCENARIO = 'simple_periodic_jobs_with_clix'
+    MAX_NR_TIME_POINTS = 100000
+    PARAMETER_GRID = {"enc2.budget": [100, 150, 200, 250],
+                      "wcet_scheduler": [10, 20, 40]}
+
+    batch = make_parameter_grid(TASK_SCENARIO, load_scenario(TASK_SCENARIO), MAX_NR_TIME_POINTS, PARAMETER_GRID)
+    results = run_batch(batch)
+    for result in results:
+        print(result)
+    save_summaries(results, 'batch_summaries.json')
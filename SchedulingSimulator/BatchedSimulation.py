@@ -0,0 +1,410 @@
+import sys
+import time
+import numpy as np
+import MCU as mcu
+import ConcreteProcess as cp
+import EDF_Policy_Periodic as pol
+import Scheduler as s
+import Task as e
+
+########################################################################################################################
+# This file embeds a batched simulator for schedulability experiments: many independent task sets are simulated
+# together, in lockstep, with the state of all of them in NumPy arrays (one row per task set, one column per task).
+# Every step advances every task set to its next event (release, interrupt, end of a run of the scheduler or of a job),
+# with vectorised EDF selection over the rows, so the cost of a step is shared by all the task sets.
+#
+# The simulated MCU and scheduler are the same as in MCU.py and Scheduler.py, cycle for cycle: the scheduler runs for
+# its WCET with the interrupts masked, the budget and sleep timers expire at the same ticks, a pending interrupt is
+# handled when the interrupts are enabled again, and EDF breaks ties on the pid. The counters of every task set are thus
+# exactly those of MCU.simulate on that task set alone (see get_summaries, which has the format of
+# BatchRunner.summarize).
+#
+# Only purely periodic task sets without clix sections are supported: every task has the dummy program of its budget
+# (Task.generate_dummy_program) or a program with calculations only, and the pids in a task set are distinct. The
+# policy is EDF (EDF_Policy_Periodic.py); the acceptance test of the policy is applied as in the simulator.
+#
+# Usage (from this directory), to compare with the simulator on generated task sets and to measure the throughput:
+#     python BatchedSimulation.py 1000
+########################################################################################################################
+
+# The running task of a task set, if it is not one of its tasks (those are given by their column)
+IDLE = -1
+SCHEDULER = -2
+# The states of a task
+NOT_RELEASED = 0
+READY = 1
+SLEEPING = 2
+ABSENT = 3
+# A time that is never reached (no timer, no release)
+NEVER = np.iinfo(np.int64).max // 4
+# The counters of a task set, as in the simulation context
+COUNTERS = ["rejected_tasks", "finished_jobs", "deadline_misses", "budget_overruns", "interrupts",
+            "scheduler_invocations", "context_switches", "idle_cycles", "busy_cycles", "scheduler_cycles"]
+# The arrays with the state of the task sets, one row per task set
+STATE_ARRAYS = ["period", "budget", "program_length", "rank", "release_time", "state", "deadline",
+                "end_of_previous_period", "remaining_budget", "remaining_program", "sleep_expiry", "time_point",
+                "next_release", "running", "scheduler_remaining", "has_run_scheduler", "interrupt_mask",
+                "interrupt_present", "first_task", "budget_expiry", "nr_ready", "next_sleep_expiry", "ready_key",
+                "set_index"]
+
+
+class BatchedSimulation:
+    def __init__(self, task_sets, nr_time_points, max_clix_duration=None, wcet_scheduler=None, admission_test=True):
+        self.nr_time_points = nr_time_points
+        self.max_clix_duration = mcu.MAX_CLIX_DURATION if max_clix_duration is None else max_clix_duration
+        self.wcet_scheduler = s.WCET_SCHEDULER if wcet_scheduler is None else wcet_scheduler
+        self.admission_test = admission_test
+        nr_sets = len(task_sets)
+        nr_tasks = max([len(task_set) for task_set in task_sets], default=0)
+        self.nr_tasks = nr_tasks
+
+        # The parameters and the state of the tasks, one row per task set
+        shape = (nr_sets, nr_tasks)
+        self.period = np.ones(shape, dtype=np.int64)
+        self.budget = np.zeros(shape, dtype=np.int64)
+        self.program_length = np.ones(shape, dtype=np.int64)
+        # Position of the pid among the pids of the task set (EDF breaks ties on the pid)
+        self.rank = np.zeros(shape, dtype=np.int64)
+        self.release_time = np.full(shape, NEVER, dtype=np.int64)
+        self.state = np.full(shape, ABSENT, dtype=np.int8)
+        self.deadline = np.zeros(shape, dtype=np.int64)
+        self.end_of_previous_period = np.zeros(shape, dtype=np.int64)
+        self.remaining_budget = np.zeros(shape, dtype=np.int64)
+        self.remaining_program = np.zeros(shape, dtype=np.int64)
+        self.sleep_expiry = np.full(shape, NEVER, dtype=np.int64)
+
+        # The state of the MCU and the scheduler of every task set. The clock of a task set ticks once per cycle, so its
+        # tick at the start of a cycle is the time point of that cycle.
+        self.time_point = np.zeros(nr_sets, dtype=np.int64)
+        self.next_release = np.full(nr_sets, NEVER, dtype=np.int64)
+        self.running = np.full(nr_sets, IDLE, dtype=np.int64)
+        self.scheduler_remaining = np.zeros(nr_sets, dtype=np.int64)
+        self.has_run_scheduler = np.zeros(nr_sets, dtype=bool)
+        self.interrupt_mask = np.zeros(nr_sets, dtype=bool)
+        self.interrupt_present = np.zeros(nr_sets, dtype=bool)
+        self.first_task = np.full(nr_sets, -1, dtype=np.int64)
+        self.budget_expiry = np.full(nr_sets, NEVER, dtype=np.int64)
+        # (kept up to date, so that a step does not have to look at all the tasks)
+        self.nr_ready = np.zeros(nr_sets, dtype=np.int64)
+        self.next_sleep_expiry = np.full(nr_sets, NEVER, dtype=np.int64)
+        # The key of the tasks in the ready queue for EDF (deadline, then pid), NEVER for the other tasks
+        self.ready_key = np.full(shape, NEVER, dtype=np.int64)
+        self.counters = {counter: np.zeros(nr_sets, dtype=np.int64) for counter in COUNTERS}
+        # The task set of every row (the rows of the finished task sets are dropped, see compact) and the counters of
+        # the finished task sets
+        self.set_index = np.arange(nr_sets)
+        self.results = {counter: np.zeros(nr_sets, dtype=np.int64) for counter in COUNTERS}
+        self.nr_steps = 0
+
+        for (index, task_set) in enumerate(task_sets):
+            self.load_task_set(index, task_set)
+        self.next_release = self.get_next_release(np.arange(nr_sets))
+        self.nr_ready = np.count_nonzero(self.state == READY, axis=1).astype(np.int64)
+        self.ready_key = np.where(self.state == READY, self.get_key(self.deadline, self.rank), NEVER)
+
+    # Fill in the row of the given task set, and apply the acceptance test to its tasks in the order of their release
+    def load_task_set(self, index, task_set):
+        pids = [task_data["pid"] for task_data in task_set]
+        if len(set(pids)) != len(pids):
+            raise ValueError("The pids in a task set must be distinct: " + str(pids))
+        tasks = [e.new_task(task_data) for task_data in task_set]
+        for (column, task) in enumerate(tasks):
+            program = task.process.program
+            if any(opcode != cp.CALCULATION_OPCODE for (opcode, length, parameter) in program) or len(program) != 1 \
+                    or program[0][1] < 1:
+                raise ValueError("Only programs with calculations are supported by the batched simulation: "
+                                 + task.get_name())
+            self.period[index, column] = task.get_period()
+            self.budget[index, column] = task.get_budget()
+            self.program_length[index, column] = program[0][1]
+            self.rank[index, column] = sorted(pids).index(task.get_name())
+            self.deadline[index, column] = task.get_deadline()
+            self.end_of_previous_period[index, column] = task.get_end_of_previous_period()
+            self.remaining_budget[index, column] = task.get_budget()
+            self.remaining_program[index, column] = program[0][1]
+
+        # The tasks are released in the order of their release time (and of the task set for the same release time),
+        # those that are released before the start or after the end of the simulation are never submitted.
+        admission_state = s.new_admission_state(self.wcet_scheduler, self.max_clix_duration)
+        accepted_tasks = []
+        for column in sorted(range(len(tasks)), key=lambda column: task_set[column]["release_time"]):
+            release_time = task_set[column]["release_time"]
+            if release_time < -1 or release_time >= self.nr_time_points:
+                continue
+            task = tasks[column]
+            if self.admission_test and not pol.is_schedulable(task, accepted_tasks, release_time + 1,
+                                                              admission_state):
+                self.counters["rejected_tasks"][index] += 1
+                continue
+            accepted_tasks.append(task)
+            self.release_time[index, column] = release_time
+            self.state[index, column] = READY if release_time == -1 else NOT_RELEASED
+
+    # Simulate all the task sets up to the end and return the simulation
+    def run(self):
+        all_sets = np.arange(len(self.time_point))
+        # As MCU.init_MCU: the scheduler has already run before the first cycle
+        self.run_scheduler(all_sets, np.zeros(len(all_sets), dtype=bool))
+        self.interrupt_mask[:] = False
+        self.running[:] = self.first_task
+        while True:
+            active = self.time_point < self.nr_time_points
+            nr_active = np.count_nonzero(active)
+            # The finished task sets are dropped from the state once they are the majority
+            if nr_active <= len(active) // 2:
+                self.compact(active)
+            if nr_active == 0:
+                return self
+            self.step()
+            self.nr_steps += 1
+
+    # Advance every task set to its next event: the start of its current cycle (as MCU.run_cycle), followed by the
+    # cycles in which nothing happens but the running of the running task, up to and including the cycle in which
+    # something happens (a timer expires, the running task or the scheduler finishes). The task sets that have reached
+    # the end of the simulation do not advance.
+    def step(self):
+        time_point = self.time_point
+        active = time_point < self.nr_time_points
+
+        # Release the tasks of which the release time has come
+        released_rows = np.nonzero(self.next_release == time_point)[0]
+        if len(released_rows) > 0:
+            states = self.state[released_rows]
+            released = (states == NOT_RELEASED) & (self.release_time[released_rows] == time_point[released_rows, None])
+            states[released] = READY
+            self.state[released_rows] = states
+            self.ready_key[released_rows] = np.where(released, self.get_key(self.deadline[released_rows],
+                                                                            self.rank[released_rows]),
+                                                     self.ready_key[released_rows])
+            self.nr_ready[released_rows] += released.sum(axis=1)
+            self.next_release[released_rows] = self.get_next_release(released_rows)
+
+        # The scheduler has finished: the task that it selected starts running. Otherwise a pending interrupt (if the
+        # interrupts are enabled) or waiting jobs on an idle MCU make the scheduler run.
+        has_run_scheduler = self.has_run_scheduler
+        interrupted = ~has_run_scheduler & self.interrupt_present & ~self.interrupt_mask & active
+        invoked = interrupted | (~has_run_scheduler & (self.running == IDLE) & (self.nr_ready > 0) & active)
+
+        started_rows = np.nonzero(has_run_scheduler & active)[0]
+        self.interrupt_mask[started_rows] = False
+        self.has_run_scheduler[started_rows] = False
+        self.running[started_rows] = self.first_task[started_rows]
+        self.counters["context_switches"][started_rows] += self.first_task[started_rows] >= 0
+
+        invoked_rows = np.nonzero(invoked)[0]
+        if len(invoked_rows) > 0:
+            self.run_scheduler(invoked_rows, interrupted[invoked_rows])
+            interrupted_rows = np.nonzero(interrupted)[0]
+            self.interrupt_present[interrupted_rows] = False
+            self.counters["interrupts"][interrupted_rows] += 1
+            self.running[invoked_rows] = SCHEDULER
+            self.counters["context_switches"][invoked_rows] += 1
+
+        # The number of cycles up to the next event, at most up to the next release and the end of the simulation (so
+        # none for the task sets that have reached it)
+        running = self.running
+        nr_cycles = np.minimum(self.nr_time_points, self.next_release) - time_point
+        scheduler_running = running == SCHEDULER
+        nr_cycles = np.where(scheduler_running, np.minimum(nr_cycles, np.maximum(self.scheduler_remaining, 1)),
+                             nr_cycles)
+        task_rows = np.nonzero(running >= 0)[0]
+        running_tasks = running[task_rows]
+        remaining_program = self.remaining_program[task_rows, running_tasks]
+        nr_cycles[task_rows] = np.minimum(nr_cycles[task_rows], remaining_program)
+        # A timer that expires generates an interrupt, which is handled in the next cycle if the interrupts are enabled.
+        # An idle MCU with waiting jobs invokes the scheduler in the next cycle.
+        interrupt_present = self.interrupt_present
+        next_expiry = np.minimum(self.budget_expiry, self.next_sleep_expiry)
+        nr_cycles = np.where(interrupt_present, nr_cycles,
+                             np.minimum(nr_cycles, np.maximum(next_expiry - time_point, 1)))
+        idle = running == IDLE
+        nr_cycles[((idle & (self.nr_ready > 0)) | (interrupt_present & ~self.interrupt_mask)) & active] = 1
+
+        # Run the cycles (the clock ticks at the start of every cycle, before the task runs)
+        end = time_point + nr_cycles
+        self.interrupt_present = interrupt_present | (next_expiry <= end)
+        self.time_point = end
+        self.counters["idle_cycles"] += np.where(idle, nr_cycles, 0)
+
+        scheduler_cycles = np.where(scheduler_running, nr_cycles, 0)
+        self.counters["scheduler_cycles"] += scheduler_cycles
+        self.scheduler_remaining -= scheduler_cycles
+        finished_rows = np.nonzero(scheduler_running & (self.scheduler_remaining <= 0) & (nr_cycles > 0))[0]
+        self.has_run_scheduler[finished_rows] = True
+        self.running[finished_rows] = IDLE
+
+        task_cycles = nr_cycles[task_rows]
+        self.counters["busy_cycles"][task_rows] += task_cycles
+        self.remaining_budget[task_rows, running_tasks] -= task_cycles
+        self.remaining_program[task_rows, running_tasks] = remaining_program - task_cycles
+        finished = (remaining_program == task_cycles) & (task_cycles > 0)
+        if finished.any():
+            finished_rows = task_rows[finished]
+            finished_tasks = running_tasks[finished]
+            finish_time = end[finished_rows] - 1
+            self.counters["finished_jobs"][finished_rows] += 1
+            self.counters["deadline_misses"][finished_rows] += \
+                finish_time + 1 > self.deadline[finished_rows, finished_tasks]
+            self.terminate_execution(finished_rows, finished_tasks, finish_time, finish_time + 1)
+            self.running[finished_rows] = IDLE
+
+    # Run the scheduler in the given task sets (as Scheduler.run_scheduler), handling the pending interrupt in those
+    # that are interrupted
+    def run_scheduler(self, rows, interrupted):
+        time_point = self.time_point[rows]
+        self.counters["scheduler_invocations"][rows] += 1
+        self.interrupt_mask[rows] = True
+        self.scheduler_remaining[rows] = self.wcet_scheduler
+
+        # Handle the timers that have expired: sleeping tasks are woken up, the task of a budget timer is stopped
+        # (the expired timers are taken before the stopped task gets its sleep timer)
+        if interrupted.any():
+            interrupted_rows = rows[interrupted]
+            interrupt_time = time_point[interrupted]
+            waking = self.next_sleep_expiry[interrupted_rows] <= interrupt_time
+            if waking.any():
+                self.wake_up(interrupted_rows[waking], interrupt_time[waking])
+            over_budget = self.budget_expiry[interrupted_rows] <= interrupt_time
+            if over_budget.any():
+                over_budget_rows = interrupted_rows[over_budget]
+                self.counters["budget_overruns"][over_budget_rows] += 1
+                self.terminate_execution(over_budget_rows, self.first_task[over_budget_rows],
+                                         interrupt_time[over_budget], interrupt_time[over_budget])
+
+        # The budget timer of the previous task is removed, and the task with the earliest deadline (and the smallest
+        # pid) among the tasks whose period has begun is scheduled, with a new budget timer
+        self.budget_expiry[rows] = NEVER
+        if self.nr_tasks == 0:
+            self.first_task[rows] = -1
+            return
+        first_tasks = np.argmin(self.ready_key[rows], axis=1)
+        scheduled = self.ready_key[rows, first_tasks] < NEVER
+        # A task that is released in this cycle is in the ready queue, but its period has not begun yet
+        not_begun = scheduled & (self.end_of_previous_period[rows, first_tasks] > time_point)
+        if not_begun.any():
+            not_begun_rows = rows[not_begun]
+            eligible = self.end_of_previous_period[not_begun_rows] <= time_point[not_begun, None]
+            keys = np.where(eligible, self.ready_key[not_begun_rows], NEVER)
+            first_tasks[not_begun] = np.argmin(keys, axis=1)
+            scheduled[not_begun] = keys[np.arange(len(not_begun_rows)), first_tasks[not_begun]] < NEVER
+        self.first_task[rows] = np.where(scheduled, first_tasks, -1)
+        # (as Scheduler.add_budget_timer, the scheduler is assumed to have run before time point 0)
+        delay = np.where(time_point == 0, 0, self.wcet_scheduler)
+        scheduled_rows = rows[scheduled]
+        self.budget_expiry[scheduled_rows] = (time_point + delay + 1)[scheduled] \
+            + self.remaining_budget[scheduled_rows, first_tasks[scheduled]]
+
+    # Wake up the tasks of which the sleep timer has expired at the given time points (as Scheduler.handle_timer)
+    def wake_up(self, rows, time_point):
+        sleep_expiry = self.sleep_expiry[rows]
+        woken = sleep_expiry <= time_point[:, None]
+        (woken_rows, woken_tasks) = np.nonzero(woken)
+        woken_rows = rows[woken_rows]
+        self.state[woken_rows, woken_tasks] = READY
+        self.ready_key[woken_rows, woken_tasks] = self.get_key(self.deadline[woken_rows, woken_tasks],
+                                                               self.rank[woken_rows, woken_tasks])
+        sleep_expiry[woken] = NEVER
+        self.sleep_expiry[rows] = sleep_expiry
+        self.next_sleep_expiry[rows] = sleep_expiry.min(axis=1, initial=NEVER)
+        self.nr_ready[rows] += woken.sum(axis=1)
+
+    # Terminate the current job of the given tasks at the given time points (as Scheduler.terminate_execution, the clock
+    # is at the given ticks): the task is initialised for its next period and sleeps until it begins
+    def terminate_execution(self, rows, tasks, current_time, current_tick):
+        end_of_previous_period = self.deadline[rows, tasks]
+        self.end_of_previous_period[rows, tasks] = end_of_previous_period
+        self.deadline[rows, tasks] = end_of_previous_period + self.period[rows, tasks]
+        self.remaining_budget[rows, tasks] = self.budget[rows, tasks]
+        self.remaining_program[rows, tasks] = self.program_length[rows, tasks]
+        self.budget_expiry[rows] = NEVER
+        self.interrupt_mask[rows] = False
+        sleep_expiry = current_tick + end_of_previous_period - current_time
+        self.sleep_expiry[rows, tasks] = sleep_expiry
+        self.next_sleep_expiry[rows] = np.minimum(self.next_sleep_expiry[rows], sleep_expiry)
+        self.state[rows, tasks] = SLEEPING
+        self.ready_key[rows, tasks] = NEVER
+        self.nr_ready[rows] -= 1
+
+    # Return the keys of tasks with the given deadlines and ranks for EDF
+    def get_key(self, deadline, rank):
+        return deadline * self.nr_tasks + rank
+
+    # Return for every given task set the first time at which one of its tasks has to be released
+    def get_next_release(self, rows):
+        release_times = np.where(self.state[rows] == NOT_RELEASED, self.release_time[rows], NEVER)
+        return release_times.min(axis=1, initial=NEVER)
+
+    # Keep only the rows of the task sets for which keep is True, the counters of the others are moved to the results
+    def compact(self, keep):
+        dropped = ~keep
+        for (counter, values) in self.counters.items():
+            self.results[counter][self.set_index[dropped]] = values[dropped]
+            self.counters[counter] = values[keep]
+        for name in STATE_ARRAYS:
+            setattr(self, name, getattr(self, name)[keep])
+
+    # Return the counters of all the task sets (after the simulation), as arrays
+    def get_counters(self):
+        return dict(self.results)
+
+    # Return the summary of every task set, in the format of BatchRunner.summarize
+    def get_summaries(self):
+        nr_time_points = self.nr_time_points
+        summaries = []
+        for index in range(len(self.results["finished_jobs"])):
+            counters = {counter: int(values[index]) for (counter, values) in self.results.items()}
+            summaries.append({"nr_time_points": nr_time_points,
+                              "rejected_tasks": counters["rejected_tasks"],
+                              "finished_jobs": counters["finished_jobs"],
+                              "deadline_misses": counters["deadline_misses"],
+                              "budget_overruns": counters["budget_overruns"],
+                              "interrupts": counters["interrupts"],
+                              "scheduler_invocations": counters["scheduler_invocations"],
+                              "context_switches": counters["context_switches"],
+                              "hardware_violations": 0,
+                              "clix_sections": 0,
+                              "idle_cycles": counters["idle_cycles"],
+                              "utilisation": counters["busy_cycles"] / nr_time_points if nr_time_points > 0 else 0,
+                              "scheduler_utilisation":
+                                  counters["scheduler_cycles"] / nr_time_points if nr_time_points > 0 else 0})
+        return summaries
+
+
+# Return a new batched simulation of the given task sets (lists of task data, in the format of the test scripts), with
+# the parameters of a simulation context
+def new_batched_simulation(task_sets, nr_time_points, max_clix_duration=None, wcet_scheduler=None,
+                           admission_test=True):
+    return BatchedSimulation(task_sets, nr_time_points, max_clix_duration, wcet_scheduler, admission_test)
+
+
+# Simulate the given task sets and return their summaries (see BatchedSimulation.get_summaries)
+def simulate_batch(task_sets, nr_time_points, max_clix_duration=None, wcet_scheduler=None, admission_test=True):
+    return new_batched_simulation(task_sets, nr_time_points, max_clix_duration, wcet_scheduler,
+                                  admission_test).run().get_summaries()
+
+
+if __name__ == "__main__":
+    import BatchRunner as br
+    import TaskSetGenerator as tsg
+
+    NR_TASK_SETS = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    MAX_NR_TIME_POINTS = 100000
+    NR_COMPARED = 20
+    TASK_SETS = tsg.generate_task_sets(NR_TASK_SETS, seed=2022, nr_tasks=5, utilisation=0.8, min_period=100,
+                                       max_period=2000)
+
+    start = time.perf_counter()
+    batched = simulate_batch(TASK_SETS, MAX_NR_TIME_POINTS)
+    batched_time = time.perf_counter() - start
+    start = time.perf_counter()
+    individual = [br.run_simulation(br.new_run(str(index), task_set, MAX_NR_TIME_POINTS))
+                  for (index, task_set) in enumerate(TASK_SETS[:NR_COMPARED])]
+    individual_time = time.perf_counter() - start
+
+    for (index, summary) in enumerate(individual):
+        for field in ["name", "parameters", "error"]:
+            del summary[field]
+        if summary != batched[index]:
+            print("Task set " + str(index) + " differs: " + str(summary) + " != " + str(batched[index]))
+    print("batched:    " + str(round(NR_TASK_SETS / batched_time, 1)) + " task sets/s")
+    print("individual: " + str(round(len(individual) / individual_time, 1)) + " task sets/s")
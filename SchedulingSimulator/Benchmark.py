@@ -0,0 +1,234 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import BatchRunner as br
+import MCU as mcu
+import SimulationContext as sc
+import TaskSetGenerator as gen
+
+########################################################################################################################
+# This file embeds a benchmark suite for the simulator. It runs a set of representative scenarios (few or many tasks,
+# short or long horizons, with or without clix sections, cycle per cycle or event driven) and reports for each of them:
+#   - the number of simulated cycles per second and scheduler invocations per second
+#   - the time per phase: setting up the scenario, simulating, and building the timeline data
+#   - the peak memory (of the Python allocations) during the simulation
+# It also measures the startup time: the time to import the simulator in a fresh Python process, and which of the heavy
+# libraries (visualisation, NumPy) are loaded by that import.
+# The results are saved as JSON and can be compared against a saved baseline: a benchmark that became slower (or uses
+# more memory) by more than the threshold is reported as a regression.
+#
+# Usage (from this directory):
+#     python Benchmark.py --output benchmark.json
+#     python Benchmark.py --baseline benchmark.json --threshold 0.1
+########################################################################################################################
+
+# The benchmarks: the scenario is either the name of a test script scenario or the parameters of generated task sets
+# (see TaskSetGenerator.generate_task_set).
+BENCHMARKS = [
+    {"name": "few_tasks_short_no_clix", "nr_time_points": 20000, "event_driven": False,
+     "generate": {"nr_tasks": 3, "utilisation": 0.7, "min_period": 1000, "max_period": 10000}},
+    {"name": "few_tasks_long_no_clix", "nr_time_points": 2000000, "event_driven": True,
+     "generate": {"nr_tasks": 3, "utilisation": 0.7, "min_period": 1000, "max_period": 10000}},
+    {"name": "many_tasks_short_no_clix", "nr_time_points": 20000, "event_driven": False,
+     "generate": {"nr_tasks": 50, "utilisation": 0.7, "min_period": 20000, "max_period": 200000}},
+    {"name": "many_tasks_long_no_clix", "nr_time_points": 2000000, "event_driven": True,
+     "generate": {"nr_tasks": 50, "utilisation": 0.7, "min_period": 20000, "max_period": 200000}},
+    {"name": "few_tasks_short_heavy_clix", "nr_time_points": 20000, "event_driven": False,
+     "generate": {"nr_tasks": 5, "utilisation": 0.7, "min_period": 1000, "max_period": 10000,
+                  "clix_pattern": "periodic", "clix_interval": 20, "clix_duration": (5, 15)}},
+    {"name": "many_tasks_long_heavy_clix", "nr_time_points": 1000000, "event_driven": True,
+     "generate": {"nr_tasks": 50, "utilisation": 0.7, "min_period": 20000, "max_period": 200000,
+                  "clix_pattern": "periodic", "clix_interval": 20, "clix_duration": (5, 15)}},
+    {"name": "test_script_with_clix", "nr_time_points": 100000, "event_driven": False,
+     "test_script": "simple_periodic_jobs_with_clix"},
+]
+
+# The modules of which the startup time is measured: the simulator itself and the batch runner (workers of a sweep)
+STARTUP_MODULES = ["MCU", "BatchRunner"]
+# The heavy libraries that should only be loaded when they are needed
+HEAVY_LIBRARIES = ["plotly", "pandas", "numpy"]
+
+# Seed of the generated task sets (the benchmarks must always run the same scenarios)
+SEED = 2022
+# Default relative slowdown above which a benchmark is reported as a regression
+DEFAULT_THRESHOLD = 0.1
+
+
+# Return the task data of the scenario of the given benchmark
+def get_scenario(benchmark):
+    if "test_script" in benchmark:
+        return br.load_scenario(benchmark["test_script"])
+    return gen.generate_task_sets(1, SEED, **benchmark["generate"])[0]
+
+
+# Run the given benchmark once and return the measurements
+def run_benchmark_once(benchmark, nr_time_points, measure_memory):
+    start = time.perf_counter()
+    scenario = get_scenario(benchmark)
+    # All tasks are simulated, also the ones that the acceptance test would reject, so the workload does not change
+    context = sc.new_simulation_context(admission_test=False)
+    setup_time = time.perf_counter() - start
+
+    if measure_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    mcu.simulate(scenario, nr_time_points, event_driven=benchmark["event_driven"], context=context)
+    simulate_time = time.perf_counter() - start
+    peak_memory = None
+    if measure_memory:
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    start = time.perf_counter()
+    mcu.get_timeline_columns(context.trace_store)
+    timeline_time = time.perf_counter() - start
+
+    return {"phases": {"setup": setup_time, "simulate": simulate_time, "timeline": timeline_time},
+            "peak_memory": peak_memory,
+            "scheduler_invocations": context.nr_scheduler_invocations,
+            "segments": context.trace_store.nr_of_segments()}
+
+
+# Run the given benchmark and return its result. The timings are the best of the given number of repeats; the peak
+# memory is measured in a separate run (tracing the memory slows down the simulation).
+def run_benchmark(benchmark, repeat=3, scale=1.0):
+    nr_time_points = max(1, int(benchmark["nr_time_points"] * scale))
+    runs = [run_benchmark_once(benchmark, nr_time_points, False) for index in range(repeat)]
+    phases = {phase: min(run["phases"][phase] for run in runs) for phase in runs[0]["phases"]}
+    memory_run = run_benchmark_once(benchmark, nr_time_points, True)
+    return {"nr_time_points": nr_time_points,
+            "event_driven": benchmark["event_driven"],
+            "phases": phases,
+            "cycles_per_second": nr_time_points / phases["simulate"],
+            "scheduler_invocations": runs[0]["scheduler_invocations"],
+            "scheduler_invocations_per_second": runs[0]["scheduler_invocations"] / phases["simulate"],
+            "segments": runs[0]["segments"],
+            "peak_memory": memory_run["peak_memory"]}
+
+
+# Return the startup time of the given module: the time to import it in a fresh Python process (best of the given
+# number of repeats), and the heavy libraries that are loaded by the import
+def measure_startup(module, repeat=5):
+    code = ("import json, sys, time\n"
+            "start = time.perf_counter()\n"
+            "import " + module + "\n"
+            "import_time = time.perf_counter() - start\n"
+            "print(json.dumps([import_time, [name for name in " + repr(HEAVY_LIBRARIES) + " if name in sys.modules]]))")
+    directory = os.path.dirname(os.path.abspath(__file__))
+    import_times = []
+    for index in range(repeat):
+        output = subprocess.run([sys.executable, "-c", code], cwd=directory, capture_output=True, text=True,
+                                check=True).stdout
+        (import_time, loaded_libraries) = json.loads(output)
+        import_times.append(import_time)
+    return {"import_time": min(import_times), "loaded_libraries": loaded_libraries}
+
+
+# Run the given benchmarks (by default all of them) and return the results, together with information about the machine.
+# With a scale below 1 the horizons are shortened (for a quick check).
+def run_suite(benchmarks=None, repeat=3, scale=1.0, verbose=True):
+    benchmarks = BENCHMARKS if benchmarks is None else benchmarks
+    startup = dict()
+    for module in STARTUP_MODULES:
+        startup[module] = measure_startup(module, max(repeat, 5))
+        if verbose:
+            print(format_startup(module, startup[module]))
+    results = dict()
+    for benchmark in benchmarks:
+        results[benchmark["name"]] = run_benchmark(benchmark, repeat, scale)
+        if verbose:
+            print(format_result(benchmark["name"], results[benchmark["name"]]))
+    return {"python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "repeat": repeat,
+            "scale": scale,
+            "startup": startup,
+            "results": results}
+
+
+# Return a readable line for the result of a benchmark
+def format_result(name, result):
+    return name.ljust(30) + " {:>12,.0f} cycles/s {:>10,.0f} sched/s {:>8.3f} s {:>10,.0f} kB".format(
+        result["cycles_per_second"], result["scheduler_invocations_per_second"], result["phases"]["simulate"],
+        result["peak_memory"] / 1000)
+
+
+# Return a readable line for the startup time of a module
+def format_startup(module, startup):
+    return ("import " + module).ljust(30) + " {:>8.3f} s  loads: {}".format(
+        startup["import_time"], ", ".join(startup["loaded_libraries"]) or "-")
+
+
+# Compare the results against a baseline (both as returned by run_suite) and return the regressions: a list of
+# (benchmark, metric, baseline value, new value) for every metric that became worse by more than the threshold.
+# Only benchmarks with the same horizon are compared.
+def compare_to_baseline(suite, baseline, threshold=DEFAULT_THRESHOLD):
+    regressions = []
+    # (baselines without startup measurements are only compared on the benchmarks, and the import time, which is
+    # noisy, gets an extra margin of 10 ms)
+    for (module, startup) in suite.get("startup", dict()).items():
+        old = baseline.get("startup", dict()).get(module)
+        if old is not None and startup["import_time"] > old["import_time"] * (1 + threshold) + 0.01:
+            regressions.append(("import " + module, "import_time", old["import_time"], startup["import_time"]))
+    for (name, result) in suite["results"].items():
+        if name not in baseline["results"]:
+            continue
+        old = baseline["results"][name]
+        if old["nr_time_points"] != result["nr_time_points"]:
+            continue
+        # Higher is better
+        for metric in ["cycles_per_second", "scheduler_invocations_per_second"]:
+            if old[metric] > 0 and result[metric] < old[metric] * (1 - threshold):
+                regressions.append((name, metric, old[metric], result[metric]))
+        # Lower is better
+        for phase in result["phases"]:
+            # (very short phases are too noisy to compare)
+            if old["phases"][phase] > 0.01 and result["phases"][phase] > old["phases"][phase] * (1 + threshold):
+                regressions.append((name, "phases." + phase, old["phases"][phase], result["phases"][phase]))
+        if old["peak_memory"] is not None and result["peak_memory"] > old["peak_memory"] * (1 + threshold):
+            regressions.append((name, "peak_memory", old["peak_memory"], result["peak_memory"]))
+    return regressions
+
+
+def save_suite(suite, file_name):
+    file = open(file_name, "w")
+    json.dump(suite, file, indent=2)
+    file.close()
+
+
+def load_suite(file_name):
+    file = open(file_name)
+    suite = json.load(file)
+    file.close()
+    return suite
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark suite of the simulator")
+    parser.add_argument("--output", help="save the results to this JSON file")
+    parser.add_argument("--baseline", help="compare the results against this JSON file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="relative slowdown that is reported as a regression (default 0.1)")
+    parser.add_argument("--repeat", type=int, default=3, help="number of timed runs per benchmark (best is kept)")
+    parser.add_argument("--scale", type=float, default=1.0, help="factor on the horizons (e.g. 0.1 for a quick run)")
+    parser.add_argument("--only", nargs="*", help="only run the benchmarks with these names")
+    arguments = parser.parse_args()
+
+    selected = BENCHMARKS if arguments.only is None else [benchmark for benchmark in BENCHMARKS
+                                                          if benchmark["name"] in arguments.only]
+    benchmark_suite = run_suite(selected, arguments.repeat, arguments.scale)
+    if arguments.output is not None:
+        save_suite(benchmark_suite, arguments.output)
+    if arguments.baseline is not None:
+        found = compare_to_baseline(benchmark_suite, load_suite(arguments.baseline), arguments.threshold)
+        for (benchmark_name, metric_name, old_value, new_value) in found:
+            print("REGRESSION: " + benchmark_name + " " + metric_name + ": " + str(old_value) + " -> " + str(new_value))
+        if len(found) > 0:
+            sys.exit(1)
+        print("No regressions (threshold " + str(arguments.threshold) + ")")
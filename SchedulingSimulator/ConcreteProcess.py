@@ -1,4 +1,6 @@
 import MCU as mcu
+import SimulationContext as sc
+import Trace as tr
 
 # This class is a representation of a concrete process. This class thus just simulates the run through the lines
 # of the program. A program can consist of a sequence of computing cycles and clix()-operations (bounded atomicity).
@@ -9,19 +11,24 @@ import MCU as mcu
 CLIX_OPERATION = "clix"
 CALCULATION_OPERATION = "calc"
 
+# Opcodes of the operations in a compiled program
+CALCULATION_OPCODE = 0
+CLIX_OPCODE = 1
+OPCODES = {CALCULATION_OPERATION: CALCULATION_OPCODE, CLIX_OPERATION: CLIX_OPCODE}
+# Names of the opcodes (for debugging)
+OPCODE_NAMES = [CALCULATION_OPERATION.upper(), CLIX_OPERATION.upper()]
+
 
 # A concrete process could be a process or a thread.
 class ConcreteProcess:
 
     def __init__(self, instruction_sequence):
-        # This variable registers a JSON consisting of the sequence of instructions in the program
-        # These instructions are ordered and numbered ("0", "1" etc). Each instruction has a type, a length and
-        # optionally some additional parameters.
-        self.instruction_sequence = instruction_sequence
+        # The compiled program: a tuple of (opcode, length, parameter) instructions (see compile_program)
+        self.program = compile_program(instruction_sequence)
         # Indicates the index of the current running instruction. The instructions are numbered starting from 0.
         self.programCounter = -1
-        # The current instruction that is executing. Instructions can take multiple cycles, this makes it possible to
-        # represent long programs in a concise manner.
+        # The opcode of the current instruction that is executing. Instructions can take multiple cycles, this makes it
+        # possible to represent long programs in a concise manner.
         self.currentInstruction = None
         # The time that the instruction still has to run
         self.remainingCyclesForInstruction = 0
@@ -58,22 +65,37 @@ class ConcreteProcess:
 
         # If the instruction has finished, the next instruction can be loaded
         if self.remainingCyclesForInstruction == 0:
-            if self.programCounter < len(self.instruction_sequence) - 1:
+            if self.programCounter < len(self.program) - 1:
                 self.programCounter += 1
                 self.load_new_instruction()
             else:
                 self.finished = True
 
+    # Run the given number of cycles of this program at once (a whole computation phase costs one step). This may only
+    # be used within one instruction, so the instruction is not allowed to finish or to have an effect
+    # (see get_nr_of_cycles_before_next_instruction).
+    # Return the number of cycles that can still be run at once afterwards.
+    def run_for_cycles(self, nr_cycles):
+        if self.has_finished() or not self.has_started() or nr_cycles >= self.remainingCyclesForInstruction:
+            raise ValueError
+
+        self.remainingCyclesForInstruction -= nr_cycles
+        return self.remainingCyclesForInstruction - 1
+
+    # Return the number of cycles that this program can run, before the current instruction finishes or has an effect.
+    # Because adjacent calculations are coalesced when compiling, this is the rest of the whole computation phase.
+    def get_nr_of_cycles_before_next_instruction(self):
+        if self.has_finished() or not self.has_started() or self.currentInstruction == CLIX_OPCODE:
+            return 0
+        return self.remainingCyclesForInstruction - 1
+
     # Load the next instruction (program counter)
     def load_new_instruction(self):
-        self.currentInstruction = self.instruction_sequence[self.programCounter]["type"]
+        (self.currentInstruction, length, self.potentialInstructionParameter) = self.program[self.programCounter]
         # (For Debugging purposes)
-        print("*** " + str(self.programCounter) + ": " + self.currentInstruction.upper())
-        self.potentialInstructionParameter = self.instruction_sequence[self.programCounter]["param"]
-        if self.currentInstruction == CLIX_OPERATION:
-            self.remainingCyclesForInstruction = 1
-        else:
-            self.remainingCyclesForInstruction = self.instruction_sequence[self.programCounter]["length"]
+        if sc.active_context.trace_level >= tr.INSTRUCTIONS:
+            tr.emit(tr.INSTRUCTIONS, "*** " + str(self.programCounter) + ": " + OPCODE_NAMES[self.currentInstruction])
+        self.remainingCyclesForInstruction = length
 
     # Return if this ConcreteProcess has finished.
     def has_finished(self):
@@ -83,14 +105,53 @@ class ConcreteProcess:
     def has_started(self):
         return self.started
 
+    # Make the current instruction (a calculation) take the given number of cycles longer. Only the current run of the
+    # program is changed, the next run starts from the original program again.
+    def stretch_current_instruction(self, nr_cycles):
+        if self.has_finished() or not self.has_started() or self.currentInstruction != CALCULATION_OPCODE:
+            raise ValueError("Only a calculation that is being executed can be stretched")
+        self.remainingCyclesForInstruction += nr_cycles
+
+    # Return the state of the execution of the program (see SteadyState.py)
+    def get_state(self):
+        return (self.programCounter, self.currentInstruction, self.remainingCyclesForInstruction, self.finished,
+                self.started, self.potentialInstructionParameter)
+
+    # Return the longest duration (parameter) of the clix instructions in the program, 0 if it has none
+    def get_max_clix_duration(self):
+        return max([param for (opcode, length, param) in self.program if opcode == CLIX_OPCODE], default=0)
+
     # Perform the effect of the current instruction, if it has one. Clix instructions for example, will result in a
     # clix call to the hardware (and thus the start of a bounded region of atomicity).
     # NOTE: if new powerful instructions are needed, then this method should be adapted to support their effects
     def perform_effect_of_instruction(self):
-        if self.currentInstruction == CLIX_OPERATION:
+        if self.currentInstruction == CLIX_OPCODE:
             mcu.clix_system_call(self.potentialInstructionParameter)
 
 
+# Compile the given program (a list of instructions, or a dict of instructions numbered "0", "1", etc.) once into a
+# tuple of (opcode, length, parameter) instructions. A clix instruction always takes one cycle. Adjacent calculations
+# are coalesced into one instruction, as they have no effect, so a long computation phase is one instruction.
+def compile_program(instruction_sequence):
+    # (The scheduler task has no program)
+    if instruction_sequence is None:
+        return ()
+    if isinstance(instruction_sequence, dict):
+        instruction_sequence = [instruction_sequence[key] for key in sorted(instruction_sequence, key=int)]
+    program = []
+    for instruction in instruction_sequence:
+        if instruction["type"] not in OPCODES:
+            raise ValueError("Unknown instruction type: " + str(instruction["type"]))
+        opcode = OPCODES[instruction["type"]]
+        if opcode == CLIX_OPCODE:
+            program.append((CLIX_OPCODE, 1, instruction["param"]))
+        elif len(program) > 0 and program[-1][0] == CALCULATION_OPCODE:
+            program[-1] = (CALCULATION_OPCODE, program[-1][1] + instruction["length"], None)
+        else:
+            program.append((CALCULATION_OPCODE, instruction["length"], instruction["param"]))
+    return tuple(program)
+
+
 # Return a new concrete process instance, based on the given program (instruction sequence)
 def new_concrete_process(program):
     return ConcreteProcess(program)
@@ -1,3 +1,6 @@
+import bisect
+import heapq
+
 # EDF policy for periodic tasks
 # No support is currently provided for aperiodic/sporadic tasks
 
@@ -5,11 +8,304 @@
 # file into the scheduler and it should work.
 
 # Acceptance test: check if system is still schedulable if a new task is added to it.
-# NOTE: for a real system, this acceptance test should be not just returning True!
-def is_schedulable(new_task, other_tasks, current_time):
+# The test is a processor-demand analysis of the periodic tasks (deadline = end of the period) under EDF, with the
+# clix sections as non-preemptive regions and with the overhead of the scheduler. For every interval [0, t) that starts
+# at a synchronous release of all tasks, the demand h(t) must fit in the interval: h(t) <= t, with
+#   h(t) = sum over the tasks of (t // T) * (C + 2 * W)      the jobs with a deadline in the interval
+#          + n * W                                          the release of the jobs that have no deadline in it
+#          + B(t)                                           blocking by a task with a later deadline
+# where T is the period, C the budget and W the duration of a run of the scheduler: its WCET, but at least one cycle (a
+# run with a WCET of 0 still takes a cycle, see Scheduler.add_budget_timer). Every job is charged two runs of the
+# scheduler: one for its release (sleep timer interrupt) and one when it finishes or runs out of budget. The blocking
+# B(t) is the longest non-preemptive region of the tasks with a period above t: a clix section with parameter d masks
+# the interrupts for d + 1 cycles, and a run of the scheduler cannot be interrupted either.
+# Since h(t) <= U * t + n * W + B(0) (U the utilisation including the overhead), the condition always holds from
+# L = (n * W + B(0)) / (1 - U) on. If L is not beyond the shortest period the set is schedulable without looking at the
+# deadlines, otherwise the deadlines below L are checked with Quick Processor-demand Analysis (QPA, Zhang and Burns),
+# which walks back from L and skips all deadlines where the demand leaves enough slack. As the blocking decreases with
+# t, a skip never goes below a period where the blocking increases, and the walk only stops early when no deadline
+# below t has a larger blocking. AdmissionState.can_admit_exhaustive checks every deadline below L instead, as a
+# reference.
+# The test is sufficient (a rejected set may still be schedulable), and is done on the cached state of the admitted
+# tasks (see AdmissionState), so admitting one task does not analyse the whole set again.
+# NOTE: the jobs are assumed to be released by the scheduler (at the end of the previous period). A task that is
+# submitted while another task is running only gets its first job when the scheduler runs next, which is not covered by
+# the test.
+def is_schedulable(new_task, other_tasks, current_time, admission_state=None):
+    if not new_task.is_periodic():
+        # NOTE: for aperiodic tasks a similar approach as periodic tasks should be followed
+        raise ValueError
+    if admission_state is None:
+        admission_state = new_admission_state()
+    admission_state.synchronise(other_tasks)
+    if not admission_state.can_admit(new_task):
+        return False
+    admission_state.add(new_task)
     return True
 
 
+# The state of the acceptance test: the admitted tasks, summarized per distinct period as the demand of one job and the
+# longest blocking, together with the utilisation. Admitting a task updates this summary, so the test of the next task
+# starts from it.
+class AdmissionState:
+    def __init__(self, wcet_scheduler=0, max_clix_duration=None):
+        # The WCET of the scheduler (charged twice per job) and the upper bound on the duration of a clix section
+        self.wcet_scheduler = wcet_scheduler
+        # The duration of a run of the scheduler: a run takes at least one cycle, also with a WCET of 0 (see the
+        # test-script admission_test_scheduler_without_wcet, of which only the first task can be admitted)
+        self.scheduler_run = max(wcet_scheduler, 1)
+        self.max_clix_duration = max_clix_duration
+        # The admitted tasks
+        self.tasks = set()
+        # The sorted distinct periods, the demand of one job of each period (summed over the tasks with this period)
+        # and the longest blocking of each period
+        self.periods = []
+        self.demand_per_period = dict()
+        self.blocking_per_period = dict()
+        # Utilisation of the admitted tasks, including the overhead of the scheduler
+        self.utilisation = 0.0
+        # Longest blocking of all admitted tasks
+        self.max_blocking = 0
+
+    # Make sure the state describes the given tasks (the scheduler may have removed tasks since the last test)
+    def synchronise(self, tasks):
+        tasks = set(tasks)
+        if tasks != self.tasks:
+            self.clear()
+            for task in tasks:
+                self.add(task)
+
+    def clear(self):
+        self.tasks = set()
+        self.periods = []
+        self.demand_per_period = dict()
+        self.blocking_per_period = dict()
+        self.utilisation = 0.0
+        self.max_blocking = 0
+
+    # Add the given task to the admitted tasks (without testing it)
+    def add(self, task):
+        period = task.get_period()
+        demand = self.get_job_demand(task)
+        blocking = self.get_blocking(task)
+        self.tasks.add(task)
+        if period not in self.demand_per_period:
+            bisect.insort(self.periods, period)
+            self.demand_per_period[period] = 0
+            self.blocking_per_period[period] = 0
+        self.demand_per_period[period] += demand
+        self.blocking_per_period[period] = max(self.blocking_per_period[period], blocking)
+        self.utilisation += demand / period
+        self.max_blocking = max(self.max_blocking, blocking)
+
+    # Return if the admitted tasks together with the given task are schedulable
+    def can_admit(self, task):
+        (new_task, release_demand, bound) = self.get_test_parameters(task)
+        if bound is None:
+            return False
+        shortest_period = min(new_task[0], self.periods[0]) if len(self.periods) > 0 else new_task[0]
+        if bound <= shortest_period:
+            return True
+
+        # QPA over the deadlines below the bound
+        t = self.get_last_deadline_before(bound + 1, new_task)
+        while True:
+            (demand, blocking_change) = self.get_demand(t, new_task)
+            demand += release_demand
+            if demand > t:
+                return False
+            # The deadlines below t have at most this demand, except those below a period where the blocking increases
+            if demand <= shortest_period and blocking_change <= shortest_period:
+                return True
+            if max(demand, blocking_change) < t:
+                t = max(demand, blocking_change)
+            else:
+                t = self.get_last_deadline_before(t, new_task)
+
+    # Return if the admitted tasks together with the given task are schedulable, by checking h(t) <= t at every deadline
+    # below the bound. This gives the same result as can_admit (which skips deadlines), in time linear in the number of
+    # deadlines: it serves as the reference to check the QPA walk against.
+    def can_admit_exhaustive(self, task):
+        (new_task, release_demand, bound) = self.get_test_parameters(task)
+        if bound is None:
+            return False
+        t = self.get_last_deadline_before(bound + 1, new_task)
+        while t > 0:
+            if self.get_demand(t, new_task)[0] + release_demand > t:
+                return False
+            t = self.get_last_deadline_before(t, new_task)
+        return True
+
+    # Return the given task as (period, job demand, blocking), the demand of the releases of the jobs without deadline
+    # in the interval, and the bound from which the demand always fits (None if the utilisation is not below 1)
+    def get_test_parameters(self, task):
+        new_task = (task.get_period(), self.get_job_demand(task), self.get_blocking(task))
+        utilisation = self.utilisation + new_task[1] / new_task[0]
+        release_demand = (len(self.tasks) + 1) * self.scheduler_run
+        if utilisation >= 1:
+            return new_task, release_demand, None
+        # The demand always fits from this bound on (with a margin for the rounding of the utilisation)
+        bound = int((release_demand + max(self.max_blocking, new_task[2])) / (1 - utilisation) * (1 + 1e-9)) + 1
+        return new_task, release_demand, bound
+
+    # Return the demand h(t) (without the releases of the jobs without deadline in the interval) of the admitted tasks
+    # and the new task, given as (period, job demand, blocking). Also return the largest period at most t below which
+    # the blocking is larger (0 if there is none): the demand can only be larger than h(t) below this period.
+    def get_demand(self, t, new_task):
+        (period, demand, blocking) = new_task
+        total = (t // period) * demand
+        blocking_in_interval = 0 if period <= t else blocking
+        periods = self.periods
+        demand_per_period = self.demand_per_period
+        blocking_per_period = self.blocking_per_period
+        nr_periods_in_interval = bisect.bisect_right(periods, t)
+        for index in range(nr_periods_in_interval):
+            other_period = periods[index]
+            total += (t // other_period) * demand_per_period[other_period]
+        for index in range(nr_periods_in_interval, len(periods)):
+            blocking_in_interval = max(blocking_in_interval, blocking_per_period[periods[index]])
+
+        blocking_change = period if period <= t and blocking > blocking_in_interval else 0
+        for index in range(nr_periods_in_interval - 1, -1, -1):
+            if periods[index] <= blocking_change:
+                break
+            if blocking_per_period[periods[index]] > blocking_in_interval:
+                blocking_change = periods[index]
+                break
+        return total + blocking_in_interval, blocking_change
+
+    # Return the last deadline before t of the admitted tasks and the new task (the deadlines are the multiples of the
+    # periods)
+    def get_last_deadline_before(self, t, new_task):
+        period = new_task[0]
+        last_deadline = ((t - 1) // period) * period
+        for index in range(bisect.bisect_left(self.periods, t)):
+            other_period = self.periods[index]
+            last_deadline = max(last_deadline, ((t - 1) // other_period) * other_period)
+        return last_deadline
+
+    # Return the demand of one job of the given task: its budget and two runs of the scheduler
+    def get_job_demand(self, task):
+        return task.get_budget() + 2 * self.scheduler_run
+
+    # Return how long the given task can block a job of another task: its longest clix section (the clix instruction
+    # and the cycles after it), or a run of the scheduler after one of its jobs
+    def get_blocking(self, task):
+        clix_duration = task.get_max_clix_duration()
+        if self.max_clix_duration is not None:
+            clix_duration = min(clix_duration, self.max_clix_duration)
+        return max(clix_duration + 1, self.scheduler_run)
+
+
+# Return a new (empty) state of the acceptance test, for the given WCET of the scheduler and maximal clix duration
+def new_admission_state(wcet_scheduler=0, max_clix_duration=None):
+    return AdmissionState(wcet_scheduler, max_clix_duration)
+
+
+# The ready queue for periodic tasks. The tasks that can already run are kept in a min-heap on (deadline, tid), the
+# tasks of which the new period has not yet begun are kept in a second min-heap on the end of their previous period.
+# Tasks are moved from the second heap to the first one when their period begins, so that finding the task with the
+# earliest deadline that can already run does not require a scan of the whole queue.
+# The heaps use lazy deletion: a removed task is only forgotten in the entries and skipped once it reaches the top.
+class PeriodicReadyQueue:
+    def __init__(self):
+        # Heap with (deadline, tid, sequence number, task) entries of the tasks that can already run
+        self.ready_heap = []
+        # Heap with (end of previous period, sequence number, task) entries of the tasks that cannot run yet
+        self.waiting_heap = []
+        # The current heap entry of every task in the queue, by sequence number
+        self.entries = dict()
+        # Sequence number for the next entry, to keep the ordering of the heap entries total
+        self.next_sequence_number = 0
+
+    # Add the given task to the queue. It is assumed to be eligible once its previous period has ended.
+    def add(self, task):
+        if task in self.entries:
+            raise ValueError
+        self.push_waiting(task)
+
+    # Remove the given task from the queue (raises a ValueError if it is not present, like a list)
+    def remove(self, task):
+        if task not in self.entries:
+            raise ValueError
+        del self.entries[task]
+
+    # Return the task with the earliest deadline that can already run at the given time, or None if there is no such
+    # task. The task is not removed from the queue.
+    def get_first_that_can_run(self, current_time):
+        # Move the tasks of which the new period has begun to the ready heap
+        while len(self.waiting_heap) > 0 and self.waiting_heap[0][0] <= current_time:
+            (end_of_previous_period, sequence_number, task) = heapq.heappop(self.waiting_heap)
+            if self.entries.get(task) != sequence_number:
+                continue
+            if end_of_previous_period != task.get_end_of_previous_period():
+                # The period of the task has changed since it was added
+                self.push_waiting(task)
+            else:
+                self.push_ready(task)
+
+        while len(self.ready_heap) > 0:
+            (deadline, tid, sequence_number, task) = self.ready_heap[0]
+            if self.entries.get(task) != sequence_number:
+                heapq.heappop(self.ready_heap)
+            elif deadline != task.get_deadline() or not task.can_already_run(current_time):
+                # The period of the task has changed since it became ready
+                heapq.heappop(self.ready_heap)
+                if task.can_already_run(current_time):
+                    self.push_ready(task)
+                else:
+                    self.push_waiting(task)
+            else:
+                return task
+        return None
+
+    # Move the keys of the heaps the given number of cycles forward, together with the times of the tasks (the heaps
+    # stay ordered)
+    def shift_time(self, nr_cycles):
+        self.ready_heap[:] = [(deadline + nr_cycles, tid, sequence_number, task)
+                              for (deadline, tid, sequence_number, task) in self.ready_heap]
+        self.waiting_heap[:] = [(end_of_previous_period + nr_cycles, sequence_number, task)
+                                for (end_of_previous_period, sequence_number, task) in self.waiting_heap]
+
+    # HELPER METHODS
+    def push_waiting(self, task):
+        sequence_number = self.new_sequence_number(task)
+        heapq.heappush(self.waiting_heap, (task.get_end_of_previous_period(), sequence_number, task))
+
+    def push_ready(self, task):
+        sequence_number = self.new_sequence_number(task)
+        heapq.heappush(self.ready_heap, (task.get_deadline(), task.get_name(), sequence_number, task))
+
+    def new_sequence_number(self, task):
+        sequence_number = self.next_sequence_number
+        self.next_sequence_number += 1
+        self.entries[task] = sequence_number
+        return sequence_number
+
+    # The queue can be used as a collection of tasks
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(list(self.entries))
+
+    def __contains__(self, task):
+        return task in self.entries
+
+    def __add__(self, other):
+        return list(self.entries) + list(other)
+
+
+# Return a new (empty) ready queue for periodic tasks.
+def new_periodic_ready_queue():
+    return PeriodicReadyQueue()
+
+
+# Move the times in the ready queues the given number of cycles forward (the times of the tasks are moved separately).
+def shift_ready_queues(nr_cycles, periodic_ready_queue, aperiodic_ready_queue):
+    periodic_ready_queue.shift_time(nr_cycles)
+
+
 # Add the new task to the ready queues. Depending on the policy the task will be set more at the begin
 # or the end of the queues.
 def add_task_to_queue(new_task, periodic_ready_queue, aperiodic_ready_queue):
@@ -17,24 +313,12 @@ def add_task_to_queue(new_task, periodic_ready_queue, aperiodic_ready_queue):
         # NOTE: for aperiodic tasks a similar approach as periodic tasks should be followed
         raise ValueError
     else:
-        d_task = new_task.get_deadline()
-        # Put the task at the right place depending on the deadlines.
-        for i in range(len(periodic_ready_queue)):
-            if d_task < periodic_ready_queue[i].get_deadline():
-                periodic_ready_queue.insert(i, new_task)
-                return
-        periodic_ready_queue.append(new_task)
+        periodic_ready_queue.add(new_task)
 
 
 # Get the next task to be scheduled. This method for the moment only uses the periodic queue.
-# The EDF policy is used to determine which one is the next task. It is assumed that the queues are only
-# manipulated through the policy interface and thus that the tasks are in order of increasing deadline.
+# The EDF policy is used to determine which one is the next task: among the tasks of which the period has begun, the
+# one with the earliest deadline is chosen (ties are broken on the name of the task).
 def get_next_scheduled(periodic_ready_queue, aperiodic_ready_queue, current_time):
-    for i in range(len(periodic_ready_queue)):
-        first = periodic_ready_queue[0]
-        periodic_ready_queue.remove(first)
-        add_task_to_queue(first, periodic_ready_queue, aperiodic_ready_queue)
-        if first.can_already_run(current_time):
-            return first
     # Return None if for the moment no periodic job can run
-    return None
+    return periodic_ready_queue.get_first_that_can_run(current_time)
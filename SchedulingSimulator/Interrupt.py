@@ -1,8 +1,6 @@
 # FLAGS and FIELDS concerning interrupts
-# Registering if an interrupt is pending
-interrupt_present_flag = False
-# Registering the last pending interrupt
-pending_interrupt = None
+# The flag registering if an interrupt is pending and the last pending interrupt are part of the simulation context
+# (see SimulationContext.py).
 
 
 # This class represents interrupts. For now these interrupts are only used as timer interrupts.
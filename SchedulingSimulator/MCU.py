@@ -1,16 +1,18 @@
 import Task as e
 import Scheduler as s
-import plotly.express as px
-import plotly
-import pandas as pd
+import heapq
 import json
+import time
 import Timer as tim
 import Interrupt as i
+import SimulationContext as sc
+import Trace as tr
+import TraceStore as ts
 
 ########################################################################################################################
 # This file embeds the details concerning the MCU. It simulates cycle per cycle and runs idle if no task is
-# ready to run. The simulator will output/print for each cycle which task is running, and some details about that task.
-# If a task has finished running, or went over it's budget, then this will also be printed in the corresponding MCU
+# ready to run. The simulator can output/print for each cycle which task is running, and some details about that task.
+# If a task has finished running, or went over it's budget, then this can also be printed in the corresponding MCU
 # cycle.
 # The simulator takes only scheduler important details into account and so doesn't simulate the functionality of
 # the tasks involved. Only some coarse description of the task functionality is used to make the simulation.
@@ -36,52 +38,48 @@ import Interrupt as i
 # The first cycle is between the 0th and 1th time_point
 
 #####
-# SIMULATION PARAMETERS (will be set at the beginning of the simulation)
-# -Number of cycles that will be simulated
-MAX_NR_TIME_POINTS = -1
-# -Tasks that will be released at later times (in the given scenario)
-tasks_to_release = []
+# SIMULATION PARAMETERS
+# The number of cycles that will be simulated and the tasks that will be released at later times (in the given
+# scenario) are set at the beginning of the simulation, in the simulation context (see SimulationContext.py).
 #####
 
 #####
 # MCU PARAMETERS
 # --------------
-# Upper bound on the duration of a clix section (static upper bound)
+# Upper bound on the duration of a clix section (static upper bound, default for a simulation context)
 MAX_CLIX_DURATION = 1000
 #
 # MCU STATE
 # ---------
-# The task that is currently running
-running_task = None
-# The scheduler is a special task. This boolean denotes if the scheduler has finished its job.
-has_run_scheduler = False
-# Counter that counts how many cycles are left in the current clix()-section
-clix_counter = 0
-# Variable registering if currently a clix()-section is performed (to know if the clix counter has to be decremented)
-performing_clix = False
+# The state of the MCU is part of the simulation context: the task that is currently running, whether the scheduler
+# (a special task) has finished its job, the number of cycles left in the current clix()-section and whether a
+# clix()-section is currently performed (to know if the clix counter has to be decremented).
 ####
 
 
 # Initialize the MCU and some helper variables
 def init_MCU(test_script, nr_time_points):
-    global running_task
-    global MAX_NR_TIME_POINTS
-
-    MAX_NR_TIME_POINTS = nr_time_points
+    ctx = sc.active_context
+    ctx.max_nr_time_points = nr_time_points
 
     # The scheduler will have a deadline equal to the max simulation time. This is needed to prevent the
     # visualization to flag it as a task that went beyond deadline.
-    s.init_scheduler(MAX_NR_TIME_POINTS + s.WCET_SCHEDULER + 1)
+    s.init_scheduler(nr_time_points + ctx.wcet_scheduler + 1)
 
-    # open file and read test script from it
-    file = open('testScript.json')
-    list_task_data = json.load(file)[test_script]
-    file.close()
+    # open file and read test script from it (the test script can also directly be given as a list of task data)
+    if isinstance(test_script, str):
+        file = open('testScript.json')
+        list_task_data = json.load(file)[test_script]
+        file.close()
+    else:
+        list_task_data = test_script
 
     # Make tasks-object by using the data from the file
+    # (tasks with the same release time are released in the order of the test script)
     for task_data in list_task_data:
         newtask = e.new_task(task_data)
-        tasks_to_release.append((task_data["release_time"], newtask))
+        heapq.heappush(ctx.tasks_to_release, (task_data["release_time"], ctx.next_release_number, newtask))
+        ctx.next_release_number += 1
 
     # Submit tasks that already run in our system (for simulation)
     load_new_task(-1)
@@ -89,163 +87,382 @@ def init_MCU(test_script, nr_time_points):
     # Run the scheduler with the init time 0, to initialise the starting state of the CPU
     s.run_scheduler(0, None)
     # Set interrupt mask to false, because scheduler has finished running
-    s.interrupt_mask = False
+    ctx.interrupt_mask = False
     # Start running the scheduled task
-    running_task = s.get_current_scheduled()
+    ctx.running_task = s.get_current_scheduled()
 
 
 # Return if the MCU is idle
 def MCU_is_idle():
     # If running_task is None, means that no jobs are in the ready queue and thus the MCU is idle
-    return running_task is None
+    return sc.active_context.running_task is None
 
 
 # Reset the interrupt state (after servicing an interrupt...)
 def reset_interrupt_state():
-    i.interrupt_present_flag = False
-    i.pending_interrupt = None
+    ctx = sc.active_context
+    ctx.interrupt_present_flag = False
+    ctx.pending_interrupt = None
 
 
 # Check if there are new tasks that are released and need to be submitted to the scheduler.
 # NOTE: to be completely precise, this should be done using a special interrupt. For simplicity this has been left out.
 # But it would be an even better reflection of reality if the scheduler would be invoked when new task is released.
+# The tasks that still have to be released are kept in a min-heap ordered by release time, so only the releases that are
+# due are touched. A task of which the release time has already passed (e.g. before the start of the simulation) is
+# never released.
 def load_new_task(current_time):
-    global tasks_to_release
-    released = []
-    for task_with_release in tasks_to_release:
-        (rel_time, task) = task_with_release
+    ctx = sc.active_context
+    tasks_to_release = ctx.tasks_to_release
+    while len(tasks_to_release) > 0 and tasks_to_release[0][0] <= current_time:
+        (rel_time, sequence_number, task) = heapq.heappop(tasks_to_release)
         if rel_time == current_time:
             # Submit the new secure modules to the scheduler (scheduler will check if they can be accepted)
-            if not s.submit_new_task(task, current_time):
-                print("****Task: " + task.get_name() + " IS NOT ACCEPTED!****")
-            # Task has been released, so can be removed from the list
-            released.append(task_with_release)
-        # Else: the Task will be released at a later time
-    # Remove all the released tasks from the list
-    # From: https://stackoverflow.com/questions/36268749/remove-multiple-items-from-a-python-list-in-just-one-statement
-    tasks_to_release = [elem for elem in tasks_to_release if elem not in released]
+            if not s.submit_new_task(task, current_time) and ctx.trace_level >= tr.EVENTS:
+                tr.emit(tr.EVENTS, "****Task: " + task.get_name() + " IS NOT ACCEPTED!****")
+
+
+# Return the earliest release time (at or after the given time) of the tasks that still have to be released.
+# Return None if no task has to be released anymore.
+def get_next_release_time(current_time):
+    tasks_to_release = sc.active_context.tasks_to_release
+    # The tasks of which the release time has passed will never be released
+    while len(tasks_to_release) > 0 and tasks_to_release[0][0] < current_time:
+        heapq.heappop(tasks_to_release)
+    if len(tasks_to_release) == 0:
+        return None
+    return tasks_to_release[0][0]
 
 
 # Simulate the working of the MCU by running cycle after cycle for a given number of time points. The given test script
-# embeds the description (contract + run-time characteristics) of the tasks.
-def simulate(test_script, nr_time_points):
-    global running_task
-    global pseudo_context_switch
-    global has_run_scheduler
-    global performing_clix
-    global clix_counter
+# embeds the description (contract + run-time characteristics) of the tasks. It is either the name of a scenario in
+# "testScript.json", or a list of task data in the same format.
+# If event_driven is True, then the cycles in which nothing of interest happens (no timer expiry, release, instruction
+# boundary, end of a clix section, etc.) are skipped over in one step. The resulting schedule and timeline are exactly
+# the same as when simulating cycle per cycle, only the per-cycle trace output of the skipped cycles is left out.
+# The debug output of the simulation is sent to the trace sink of the context, up to its trace level (see Trace.py).
+# The simulation works on the given simulation context (a new one if none is given), which holds all the state of the
+# simulation and is returned at the end. A context can only be simulated once.
+# If a trace file is given, the timeline data is streamed to that file while simulating (see TraceStream.py) instead of
+# being kept in memory, so that the memory use stays constant for long simulations.
+# The counters of the simulation (scheduler invocations, context switches, idle cycles, etc.) and, if the context
+# profiles the simulation, the time spent per phase are kept in the context (see SimulationContext.get_statistics).
+# If extrapolate is True, the state is compared at the hyperperiod boundaries after the last release, and once it
+# repeats, the rest of the horizon is extrapolated instead of simulated (see SteadyState.py). The counters and the
+# timeline are the same as when simulating every cycle, only the debug output of the extrapolated cycles is left out.
+def simulate(test_script, nr_time_points, event_driven=False, context=None, trace_file=None, extrapolate=False):
+    context = start_simulation(test_script, nr_time_points, event_driven, context, trace_file, extrapolate)
+    return finish_simulation(context)
+
+
+# Start the simulation of the given test script, with the same parameters as simulate, but only initialise the MCU and
+# the scheduler (time point 0). The cycles are simulated by run_until and finish_simulation, so the simulation can be
+# stopped at any time point, e.g. to fork it (see Snapshot.py) or to release an extra task (see release_task).
+# Return the context of the simulation.
+def start_simulation(test_script, nr_time_points, event_driven=False, context=None, trace_file=None,
+                     extrapolate=False):
+    if context is None:
+        context = sc.new_simulation_context()
+    elif context.max_nr_time_points != -1:
+        raise ValueError("The simulation context has already been simulated")
+    sc.activate(context)
+    if trace_file is not None:
+        # Imported here, because TraceStream needs TraceStore (which imports this module through Task) to be loaded
+        import TraceStream as tstream
+        context.trace_store = tstream.new_streaming_trace_store(trace_file)
+    context.event_driven = event_driven
 
     # Initialise the current state of the CPU (with a nr of jobs, etc.)
-    init_MCU(test_script, nr_time_points)
-
-    # Simulate the cycles
-    for time_point in range(MAX_NR_TIME_POINTS):
-        # check if interrupts have to be re-enabled, if performing a clix
-        if performing_clix and clix_counter == 0:
-            s.interrupt_mask = False
-            performing_clix = False
-        elif performing_clix:
-            clix_counter -= 1
-
-        # START NEW CYCLE
-        # Load new secure modules if there are some
-        load_new_task(time_point)
-
-        # If the scheduler has run, then it means a new task has been scheduled and so can start running.
-        if has_run_scheduler:
-            s.interrupt_mask = False
-            has_run_scheduler = False
-            running_task = s.get_current_scheduled()
-
-        # If an interrupt is present, then the scheduler will be run to handle the interrupt.
-        elif i.interrupt_present_flag and not s.interrupt_mask:
-            print("INTERRUPT in cycle = " + str(time_point + 1) + " || "
-                  + i.pending_interrupt.trigger().get_task_of_timer().get_name())
-            s.run_scheduler(time_point, i.pending_interrupt)
-            reset_interrupt_state()
-            running_task = s.get_scheduler_task()
-
-            # PRINT FOR DEBUGGING
-            print("**new_scheduled: ")  ##
-            if s.get_current_scheduled() is not None:  ##
-                print(s.get_current_scheduled().to_string())  ##
-            else:  ##
-                print(None)  ##
-
-        # If no task is currently scheduled and there are waiting jobs and no interrupt has triggered the scheduler,
-        # then a new task should be scheduled.
-        elif MCU_is_idle() and s.has_jobs_waiting(time_point):
-            # Run the scheduler to determine the thread for the next cycle
-            s.run_scheduler(time_point, None)
-            running_task = s.get_scheduler_task()
-            # PRINT FOR DEBUGGING
-            print("**new_scheduled: ")  ##
-            if s.get_current_scheduled() is not None:  ##
-                print(s.get_current_scheduled().to_string())  ##
-            else:  ##
-                print(None)  ##
-
-        # Evaluate the timers for the next time_point. This will generate interrupts at beginning
-        # of the next time point.
-        # For sake of graphical reasons this method is placed here, but could also be placed at the end.
-        tim.run_clock()
-
-        # Log Information about the given time_point (for illustration purposes)
-        log_beginning_of_cycle(time_point)
-
-        # Run the task for one cycle
-        print(time_point)
-        if MCU_is_idle():
-            print("Pass, no tasks in Ready Queue")  ##
+    run_profiled(context, init_MCU, test_script, nr_time_points)
+    if extrapolate:
+        # Imported here, because SteadyState needs Scheduler (which imports this module) to be loaded
+        import SteadyState as ss
+        context.steady_state = ss.new_steady_state_detector(context)
+        context.steady_state.start()
+    return context
+
+
+# Simulate the cycles of the simulation in the given context (by default the active one) up to the given time point
+# (at most up to the end of the simulation). The simulation can be continued later on from there. Return the context.
+def run_until(time_point, context=None):
+    ctx = get_started_context(context)
+    run_profiled(ctx, run_cycles, min(time_point, ctx.max_nr_time_points))
+    return ctx
+
+
+# Simulate the rest of the cycles of the simulation in the given context (by default the active one) and finish its
+# timeline. Return the context.
+def finish_simulation(context=None):
+    ctx = get_started_context(context)
+    run_until(ctx.max_nr_time_points)
+    # FINISH LAST CYCLE
+    run_profiled(ctx, log_beginning_of_cycle, ctx.max_nr_time_points)
+    ctx.trace_store.end_trace(ctx.max_nr_time_points)
+    ctx.trace_sink.flush()
+    ctx.finished = True
+    return ctx
+
+
+# Activate and return the given context (by default the active one), of which the simulation has to be started but not
+# yet finished
+def get_started_context(context=None):
+    if context is not None:
+        sc.activate(context)
+    ctx = sc.active_context
+    if ctx is None or ctx.max_nr_time_points == -1:
+        raise ValueError("The simulation has not been started")
+    if ctx.finished:
+        raise ValueError("The simulation has already finished")
+    return ctx
+
+
+# Call the given function with the given arguments, and add the wall time of the call to the simulation time of the
+# context. The phase profiler only replaces the profiled functions for the duration of the call, so the simulation
+# does not pay for it when profiling is off.
+def run_profiled(context, function, *arguments):
+    phase_profiler = None
+    if context.profile:
+        # Imported here, because PhaseProfiler needs the classes of Task (which imports this module) to be loaded
+        import PhaseProfiler as prof
+        phase_profiler = prof.new_phase_profiler(context)
+        phase_profiler.install()
+    start = time.perf_counter()
+    try:
+        return function(*arguments)
+    finally:
+        context.simulation_time += time.perf_counter() - start
+        if phase_profiler is not None:
+            phase_profiler.uninstall()
+
+
+# Simulate the cycles from the time point at which the simulation in the active context continues, up to the given
+# time point.
+def run_cycles(until):
+    ctx = sc.active_context
+    steady_state = ctx.steady_state
+    time_point = ctx.time_point
+    while time_point < until:
+        # (after an extrapolation up to the given time point, the detection starts over at the time point itself)
+        while steady_state is not None and time_point == steady_state.next_check:
+            time_point = steady_state.check(time_point, until)
+        if time_point >= until:
+            break
+        run_cycle(time_point)
+        time_point += 1
+        if ctx.event_driven:
+            # (the quiet cycles are not skipped beyond the next check of the steady state)
+            next_check = None if steady_state is None else steady_state.next_check
+            time_point += skip_quiet_cycles(time_point, until if next_check is None else min(next_check, until))
+    ctx.time_point = time_point
+
+
+# Release a new task (given by its task data, in the format of the test script) at the time point at which the
+# simulation in the given context (by default the active one) continues. The release time in the task data is ignored.
+# Together with a fork of the simulation (see Snapshot.py), this makes it possible to explore what happens if a task
+# is released at a given time point, without simulating the common prefix again.
+def release_task(task_data, context=None):
+    ctx = get_started_context(context)
+    task = e.new_task(dict(task_data, release_time=ctx.time_point))
+    heapq.heappush(ctx.tasks_to_release, (ctx.time_point, ctx.next_release_number, task))
+    ctx.next_release_number += 1
+    if ctx.steady_state is not None:
+        ctx.steady_state.start(ctx.time_point)
+    return task
+
+
+# Make the current job of the task with the given name (in the simulation in the given context, by default the active
+# one) run the given number of cycles longer than its program says, from the time point at which the simulation
+# continues. This makes it possible to explore what happens if a job overruns at a given time point.
+def overrun_task(name, nr_cycles, context=None):
+    ctx = get_started_context(context)
+    for task in s.get_all_tasks():
+        if task.get_name() == name:
+            task.overrun(nr_cycles)
+            if ctx.steady_state is not None:
+                ctx.steady_state.start(ctx.time_point)
+            return task
+    raise ValueError("Unknown task: " + name)
+
+
+# Simulate one cycle of the MCU (the cycle that starts at the given time point).
+def run_cycle(time_point):
+    ctx = sc.active_context
+
+    # check if interrupts have to be re-enabled, if performing a clix
+    if ctx.performing_clix and ctx.clix_counter == 0:
+        ctx.interrupt_mask = False
+        ctx.performing_clix = False
+    elif ctx.performing_clix:
+        ctx.clix_counter -= 1
+
+    # START NEW CYCLE
+    # Load new secure modules if there are some
+    load_new_task(time_point)
+
+    # If the scheduler has run, then it means a new task has been scheduled and so can start running.
+    if ctx.has_run_scheduler:
+        ctx.interrupt_mask = False
+        ctx.has_run_scheduler = False
+        ctx.running_task = s.get_current_scheduled()
+        if ctx.running_task is not None:
+            ctx.nr_context_switches += 1
+
+    # If an interrupt is present, then the scheduler will be run to handle the interrupt.
+    elif ctx.interrupt_present_flag and not ctx.interrupt_mask:
+        if ctx.trace_level >= tr.EVENTS:
+            tr.emit(tr.EVENTS, "INTERRUPT in cycle = " + str(time_point + 1) + " || "
+                    + ctx.pending_interrupt.trigger().get_task_of_timer().get_name())
+        s.run_scheduler(time_point, ctx.pending_interrupt)
+        reset_interrupt_state()
+        ctx.nr_handled_interrupts += 1
+        ctx.running_task = s.get_scheduler_task()
+        ctx.nr_context_switches += 1
+
+        # PRINT FOR DEBUGGING
+        if ctx.trace_level >= tr.EVENTS:
+            trace_new_scheduled()
+
+    # If no task is currently scheduled and there are waiting jobs and no interrupt has triggered the scheduler,
+    # then a new task should be scheduled.
+    elif MCU_is_idle() and s.has_jobs_waiting(time_point):
+        # Run the scheduler to determine the thread for the next cycle
+        s.run_scheduler(time_point, None)
+        ctx.running_task = s.get_scheduler_task()
+        ctx.nr_context_switches += 1
+        # PRINT FOR DEBUGGING
+        if ctx.trace_level >= tr.EVENTS:
+            trace_new_scheduled()
+
+    # Evaluate the timers for the next time_point. This will generate interrupts at beginning
+    # of the next time point.
+    # For sake of graphical reasons this method is placed here, but could also be placed at the end.
+    tim.run_clock()
+
+    # Log Information about the given time_point (for illustration purposes)
+    log_beginning_of_cycle(time_point)
+
+    # Run the task for one cycle
+    trace_cycles = ctx.trace_level >= tr.CYCLES
+    if trace_cycles:
+        tr.emit(tr.CYCLES, str(time_point))
+    if MCU_is_idle():
+        ctx.nr_idle_cycles += 1
+        if trace_cycles:
+            tr.emit(tr.CYCLES, "Pass, no tasks in Ready Queue")
 
+    else:
+        running_task = ctx.running_task
+        try:
+            running_task.run_for_one_cycle()
+            if trace_cycles:
+                tr.emit(tr.CYCLES, ":Running_task = " + running_task.to_string())
+            if running_task.has_finished_current_task():
+                ctx.pseudo_context_switch = True
+                # PRINT FOR DEBUGGING
+                if ctx.trace_level >= tr.EVENTS:
+                    tr.emit(tr.EVENTS, "*Task is Done: ")
+                    tr.emit(tr.EVENTS, running_task.to_string())
+                if isinstance(running_task, e.SchedulerTask):
+                    # Scheduler has finished running and selecting new job
+                    ctx.has_run_scheduler = True
+                else:
+                    # Remove finished task from scheduler
+                    s.terminate_execution(running_task, time_point)
+                ctx.running_task = None
+        except HardwareViolation:
+            if ctx.trace_level >= tr.EVENTS:
+                tr.emit(tr.EVENTS, "VIOLATION: Running process is terminated.")
+            ctx.nr_hardware_violations += 1
+            # NOTE: maybe a specific violation flag could be an interesting addition
+            running_task.flag_out_of_budget()
+            s.terminate_execution(running_task, time_point)
+            ctx.running_task = None
+
+
+# Trace the task that has been scheduled by the scheduler
+def trace_new_scheduled():
+    tr.emit(tr.EVENTS, "**new_scheduled: ")
+    if s.get_current_scheduled() is not None:
+        tr.emit(tr.EVENTS, s.get_current_scheduled().to_string())
+    else:
+        tr.emit(tr.EVENTS, str(None))
+
+
+# EVENT-DRIVEN SIMULATION
+# Return the number of cycles, starting at the given time point, in which nothing of interest happens. In such a cycle
+# the MCU only decrements counters: no task is released, the scheduler is not invoked, no timer expires, no instruction
+# boundary is crossed, no clix section ends and nothing new has to be logged. The quiet cycles do not go beyond the
+# given time point (by default the end of the simulation).
+def nr_of_quiet_cycles(time_point, until=None):
+    ctx = sc.active_context
+    # Something is still pending from the previous cycle
+    if ctx.has_run_scheduler or ctx.interrupt_present_flag or ctx.pseudo_context_switch:
+        return 0
+
+    if MCU_is_idle():
+        # An idle MCU with waiting jobs will invoke the scheduler, and the end of the previous task still has to be
+        # logged if the MCU has just become idle.
+        if s.has_jobs_waiting(time_point) or ctx.prev_cycle_task is not None:
+            return 0
+        nr_quiet = ctx.max_nr_time_points - time_point
+    else:
+        # A new segment has to be logged when the running task changed
+        if ctx.running_task is not ctx.prev_cycle_task:
+            return 0
+        nr_quiet = ctx.running_task.get_nr_of_cycles_before_next_event()
+
+    # The clix section ends in the cycle where the clix counter has reached zero
+    if ctx.performing_clix:
+        nr_quiet = min(nr_quiet, ctx.clix_counter)
+
+    # The first timer that expires, will generate an interrupt
+    nr_quiet = min(nr_quiet, tim.get_nr_of_cycles_before_next_expiry())
+
+    # The next task release
+    next_release = get_next_release_time(time_point)
+    if next_release is not None:
+        nr_quiet = min(nr_quiet, next_release - time_point)
+
+    return max(0, min(nr_quiet, (ctx.max_nr_time_points if until is None else until) - time_point))
+
+
+# Skip the quiet cycles starting at the given time point (and before the given time point) in one step, by advancing
+# all counters at once. Return the number of cycles that have been skipped.
+def skip_quiet_cycles(time_point, until=None):
+    ctx = sc.active_context
+    nr_quiet = nr_of_quiet_cycles(time_point, until)
+    if nr_quiet > 0:
+        if ctx.performing_clix:
+            ctx.clix_counter -= nr_quiet
+        tim.run_clock_for_cycles(nr_quiet)
+        if not MCU_is_idle():
+            ctx.running_task.run_for_cycles(nr_quiet)
         else:
-            try:
-                running_task.run_for_one_cycle()
-                print(":Running_task = " + running_task.to_string())
-                if running_task.has_finished_current_task():
-                    pseudo_context_switch = True
-                    # PRINT FOR DEBUGGING
-                    print("*Task is Done: ")  ##
-                    print(running_task.to_string())  ##
-                    if isinstance(running_task, e.SchedulerTask):
-                        # Scheduler has finished running and selecting new job
-                        has_run_scheduler = True
-                    else:
-                        # Remove finished task from scheduler
-                        s.terminate_execution(running_task, time_point)
-                    running_task = None
-            except HardwareViolation:
-                print("VIOLATION: Running process is terminated.")
-                # NOTE: maybe a specific violation flag could be an interesting addition
-                running_task.flag_out_of_budget()
-                s.terminate_execution(running_task, time_point)
-                running_task = None
-    # FINISH LAST CYCLE
-    log_beginning_of_cycle(MAX_NR_TIME_POINTS)
+            ctx.nr_idle_cycles += nr_quiet
+    return nr_quiet
 
 
 # This function represents the clix "system call" to the processor. A program can do this call as long as the
 # asked clix length is below the MAX_CLIX_DURATION.
 # NOTE: by adding a VARIABLE_CLIX_DURATION variable,
 def clix_system_call(duration):
-    global clix_counter
-    global performing_clix
+    ctx = sc.active_context
     # If the clix length is too big, then a hardware violation occurs. Same if the program tries to nest clix-sections.
-    if duration > MAX_CLIX_DURATION or performing_clix:
+    if duration > ctx.max_clix_duration or ctx.performing_clix:
         raise HardwareViolation
     # Set the interrupt mask and the duration
-    s.interrupt_mask = True
-    clix_counter = duration
-    performing_clix = True
+    ctx.interrupt_mask = True
+    ctx.clix_counter = duration
+    ctx.performing_clix = True
+    ctx.nr_clix_sections += 1
 
 
 # This system call can be done at any time, it will enable the interrupts
 def enable_interrupts_system_call():
-    global clix_counter
-    global performing_clix
-    s.interrupt_mask = False
-    clix_counter = 0
-    performing_clix = False
+    ctx = sc.active_context
+    ctx.interrupt_mask = False
+    ctx.clix_counter = 0
+    ctx.performing_clix = False
 
 
 # This class represents HardwareViolations
@@ -255,125 +472,137 @@ class HardwareViolation(Exception):
 
 ######################################################################################################
 # Log Information (for illustration purposes): the rest of the file embeds no extra features, only the visualisation
-# code used to generate the timelines
+# code used to generate the timelines. The timeline data is kept in the trace store of the simulation context
+# (see TraceStore.py).
 def log_beginning_of_cycle(time):
-    global info
-    global resources
-    global tasks
-    global start
-    global finish
-    global prev_cycle_task
-    global colors
-    global pseudo_context_switch
-    global interrupts
-    global info_interrupts
+    ctx = sc.active_context
+    trace_store = ctx.trace_store
 
     # log interrupts
-    if i.interrupt_present_flag:
-        interrupts.append(time + 1)  # counters are diminished and will cause an interrupt at beginning of next cycle
-        info_interrupts.append(i.pending_interrupt.trigger().get_task_of_timer().get_name() + "  " + str(i.pending_interrupt.trigger().is_budget_timer()) + "  t=" + str(time + 1))
-        if i.pending_interrupt.trigger().is_budget_timer():
-            color_interrupts.append(0)
-        else:
-            color_interrupts.append(100)
+    if ctx.interrupt_present_flag:
+        trigger = ctx.pending_interrupt.trigger()
+        # counters are diminished and will cause an interrupt at beginning of next cycle
+        trace_store.add_interrupt(time + 1, trigger.get_task_of_timer(), trigger.is_budget_timer())
 
     # Log tasks
-    task = running_task
+    task = ctx.running_task
+    prev_cycle_task = ctx.prev_cycle_task
     if task is None:
         # If the CPU is idle, then note that the previous task has finished
         if prev_cycle_task is not None:
-            finish.append(time)
-            colors.append(generate_color_last_task())
-        prev_cycle_task = None
+            finish_last_segment(ctx, time)
+        ctx.prev_cycle_task = None
 
-    elif len(tasks) == 0 or (task is not prev_cycle_task and not time == MAX_NR_TIME_POINTS) or pseudo_context_switch:
+    elif trace_store.nr_of_segments() == 0 or (task is not prev_cycle_task and not time == ctx.max_nr_time_points) \
+            or ctx.pseudo_context_switch:
         # New task has been scheduled
         if prev_cycle_task is not None:
-            finish.append(time)
-            colors.append(generate_color_last_task())
+            finish_last_segment(ctx, time)
         # Append the new task + the needed parameters for visualisation
-        tasks.append(task)
-        resources.append(task)
-        deadlines.append(task.get_deadline())
-        info.append(task.get_name() + " d=" + str(task.get_deadline()))
-        start.append(time)
-        prev_cycle_task = task
+        trace_store.open_segment(task, time)
+        ctx.prev_cycle_task = task
 
     else:
         # This is the case where the simulation ends now
-        if time == MAX_NR_TIME_POINTS and prev_cycle_task is not None:
-            finish.append(time)
-            colors.append(generate_color_last_task())
+        if time == ctx.max_nr_time_points and prev_cycle_task is not None:
+            finish_last_segment(ctx, time)
         # In this case the current_task is still running and nothing has to be taken up in the picture
         pass
-    pseudo_context_switch = False
+    ctx.pseudo_context_switch = False
+
+
+# Register the finish time and the color of the last segment in the trace
+def finish_last_segment(ctx, time):
+    ctx.trace_store.finish_segment(time)
+    ctx.trace_store.color_segment(generate_color_last_task(ctx))
 
 
-def generate_color_last_task():
-    print(colors)
-    print(deadlines)
-    print(finish)
+def generate_color_last_task(ctx):
+    trace_store = ctx.trace_store
+    if ctx.trace_level >= tr.DUMP:
+        tr.emit(tr.DUMP, str(trace_store.segment_color.tolist()))
+        tr.emit(tr.DUMP, str(trace_store.segment_deadline.tolist()))
+        tr.emit(tr.DUMP, str(trace_store.segment_finish.tolist()))
+    last_task = trace_store.get_last_task()
+    finish = trace_store.segment_finish[-1]
+    deadline = trace_store.segment_deadline[-1]
     # If some task has tried to use more than was expected
-    if tasks[-1].has_ran_out_of_budget():
-        return 0
+    if last_task.has_ran_out_of_budget():
+        return ts.COLOR_OUT_OF_BUDGET
     # This is the good case in which the task has finished on time (with zero budget)
     # Or the task has not finished (the simulation ended before finalisation)
-    elif (tasks[-1].has_finished_current_task() and
-          finish[-1] <= deadlines[-1]) or \
-            (not tasks[-1].has_finished_current_task() and
-             finish[-1] + tasks[-1].get_periodic_budget() <= deadlines[-1]): # for aperiodic has just to be budget
+    elif (last_task.has_finished_current_task() and
+          finish <= deadline) or \
+            (not last_task.has_finished_current_task() and
+             finish + last_task.get_periodic_budget() <= deadline): # for aperiodic has just to be budget
 
-        return 100
+        return ts.COLOR_ON_TIME
     # This is the bad case, where the scheduler has done something wrong and the task is scheduled too late
     else:
-        return 50
-
-
-def add_interrupt_info():
-    global start
-    global finish
-    global info
-    global tasks
-    global resources
-    global colors
-
-    for i in range(len(interrupts)):
-        start.append(interrupts[i] - MAX_NR_TIME_POINTS/1000)
-        finish.append(interrupts[i] + MAX_NR_TIME_POINTS/1000)
-        tasks.append("interrupts")
-        resources.append("interrupts")
-        info.append(info_interrupts[i])
-        colors.append(color_interrupts[i])
-
-
-# Generate the actual timeline
-def make_scheduler_picture():
-
-    print(info)
-    add_interrupt_info()
-    task_names = []
-    print(tasks)
-    for tsk in tasks:
-        if isinstance(tsk, e.PeriodicTask):
-            task_names.append(tsk.get_name() + " p=" + str(tsk.get_period()) + " b=" + str(tsk.get_budget()))
-        elif isinstance(tsk, e.SchedulerTask):
-            task_names.append(tsk.get_name())
-        else:
-            task_names.append(tsk)
+        return ts.COLOR_DEADLINE_MISSED
+
+
+# Return the columns of the timeline (task, start, end, color, info) for all the segments and the interrupts in the
+# given trace store. The interrupts are shown as small bars on a separate "interrupts" row.
+def get_timeline_columns(trace_store):
+    nr_time_points = trace_store.nr_time_points
+    # Only the finished segments are shown
+    nr_segments = len(trace_store.segment_color)
+    task_labels = [trace_store.get_task_label(task_id) for task_id in range(len(trace_store.task_names))]
+
+    task_names = [task_labels[task_id] for task_id in trace_store.segment_task[:nr_segments]]
+    start = trace_store.segment_start[:nr_segments].tolist()
+    finish = trace_store.segment_finish[:nr_segments].tolist()
+    colors = trace_store.segment_color[:nr_segments].tolist()
+    info = [trace_store.get_segment_info(index) for index in range(nr_segments)]
+
+    for index in range(trace_store.nr_of_interrupts()):
+        start.append(trace_store.interrupt_time[index] - nr_time_points/1000)
+        finish.append(trace_store.interrupt_time[index] + nr_time_points/1000)
+        task_names.append("interrupts")
+        info.append(trace_store.get_interrupt_info(index))
+        colors.append(trace_store.get_interrupt_color(index))
+    return task_names, start, finish, colors, info
+
+
+# Generate the actual timeline of the given simulation context (by default the one that was simulated last).
+# Large traces are drawn with the level-of-detail rendering (see TimelineLOD.py), in which the segments are aggregated
+# per bucket of time depending on the zoom. This can be forced on (True) or off (False) with level_of_detail.
+# The visualisation libraries (plotly, pandas) are only imported when a picture is made, so a simulation without
+# pictures (e.g. in the worker processes of a batch) does not pay for loading them.
+def make_scheduler_picture(context=None, level_of_detail=None):
+    import TimelineLOD as lod
+    ctx = sc.active_context if context is None else context
+    trace_store = ctx.trace_store.get_complete_trace()
+    if ctx.trace_level >= tr.DUMP:
+        tr.emit(tr.DUMP, str([trace_store.get_segment_info(index) for index in range(trace_store.nr_of_segments())]))
+    if level_of_detail is None:
+        level_of_detail = trace_store.nr_of_segments() + trace_store.nr_of_interrupts() > lod.AUTOMATIC_THRESHOLD
+    if level_of_detail:
+        lod.make_lod_picture(trace_store)
+    else:
+        make_trace_picture(trace_store)
+
+
+# Generate the timeline of the given trace store (e.g. a trace that was loaded from a file)
+def make_trace_picture(trace_store):
+    import plotly.express as px
+    import plotly
+    import pandas as pd
+    (task_names, start, finish, colors, info) = get_timeline_columns(trace_store)
     task_p = pd.DataFrame(task_names, columns=["task"])
     start_p = pd.DataFrame(start, columns=["start"])
     finish_p = pd.DataFrame(finish, columns=["end"])
-    resources_p = pd.DataFrame(resources, columns=["resource"])
     complete_p = pd.DataFrame(colors, columns=["color"])
     info_p = pd.DataFrame(info, columns=["info"])
 
     # Merge dataframes
-    df = task_p.join(start_p).join(finish_p).join(complete_p).join(resources_p).join(info_p)
+    df = task_p.join(start_p).join(finish_p).join(complete_p).join(info_p)
     # Add necessary column for linear timeline
     df['delta'] = df["end"] - df["start"]
     # Draw Figure
     fig = px.timeline(df, x_start="start", x_end="end", y="task", color="color", title='Scheduler', hover_name='info',
-                      range_x=[0, MAX_NR_TIME_POINTS],
+                      range_x=[0, trace_store.nr_time_points],
                       color_continuous_scale=[(0, "red"), (0.5, "blue"), (1, "green")], range_color=[0, 100])
 
     # Update/change layout
@@ -391,23 +620,3 @@ def make_scheduler_picture():
 
 
 ######################################################################################################################
-
-# VARIABLES for the visualisation.
-prev_cycle_task = None
-tasks = []
-start = []
-finish = []
-resources = []
-colors = []
-info = []
-# for generation of the colors
-deadlines = []
-
-# Timers
-interrupts = []
-info_interrupts = []
-color_interrupts = []
-
-# Shows when threads have switched/the same thread has run but in two different periods
-pseudo_context_switch = False
-
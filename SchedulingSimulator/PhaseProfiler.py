@@ -0,0 +1,75 @@
+import time
+import MCU as mcu
+import Scheduler as s
+import Task as e
+import Timer as tim
+import Trace as tr
+
+########################################################################################################################
+# This file embeds the measurement of the time that is spent per phase of a simulation (loading new tasks, running the
+# scheduler, running the clock, running the tasks, logging, ...), without an external profiler.
+# For the duration of the simulation, the functions of the phases are replaced by wrappers that measure the wall time
+# of every call. When the simulation is not profiled nothing is replaced, so this costs nothing when it is off.
+# The time of a phase includes the time of the (other) phases that are called from it, e.g. the logging that is done by
+# the scheduler is part of both "run_scheduler" and "logging".
+########################################################################################################################
+
+# The profiled functions: (phase, owner of the function (module or class), name of the function)
+PHASES = [("load_new_task", mcu, "load_new_task"),
+          ("run_scheduler", s, "run_scheduler"),
+          ("run_clock", tim, "run_clock"),
+          ("run_for_one_cycle", e.PeriodicTask, "run_for_one_cycle"),
+          ("run_for_one_cycle", e.SchedulerTask, "run_for_one_cycle"),
+          ("skip_quiet_cycles", mcu, "skip_quiet_cycles"),
+          ("logging", mcu, "log_beginning_of_cycle"),
+          ("logging", tr, "emit")]
+
+
+class PhaseProfiler:
+    def __init__(self, context):
+        # The context in which the times are registered (phase_times and phase_calls)
+        self.context = context
+        # The replaced functions: (owner, name, original function)
+        self.originals = []
+        # Number of calls of each phase that are currently running (only the outermost call of a phase is timed)
+        self.depth = dict()
+
+    # Replace the functions of the phases by timed wrappers
+    def install(self):
+        for (phase, owner, name) in PHASES:
+            original = owner.__dict__[name]
+            self.originals.append((owner, name, original))
+            self.context.phase_times.setdefault(phase, 0.0)
+            self.context.phase_calls.setdefault(phase, 0)
+            self.depth.setdefault(phase, 0)
+            setattr(owner, name, self.make_timed(phase, original))
+
+    # Put the original functions back
+    def uninstall(self):
+        for (owner, name, original) in reversed(self.originals):
+            setattr(owner, name, original)
+        self.originals = []
+
+    # Return a wrapper around the given function that registers its time in the given phase
+    def make_timed(self, phase, function):
+        context = self.context
+        depth = self.depth
+        perf_counter = time.perf_counter
+
+        def timed(*arguments):
+            if depth[phase] > 0:
+                return function(*arguments)
+            depth[phase] += 1
+            start = perf_counter()
+            try:
+                return function(*arguments)
+            finally:
+                context.phase_times[phase] += perf_counter() - start
+                context.phase_calls[phase] += 1
+                depth[phase] -= 1
+        return timed
+
+
+# Return a new phase profiler that registers the times in the given context
+def new_phase_profiler(context):
+    return PhaseProfiler(context)
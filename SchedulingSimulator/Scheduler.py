@@ -1,38 +1,44 @@
 import Timer as tim
 import Task
 import MCU as mcu
+import SimulationContext as sc
 # The policy that is used to schedule: This policy can be easily changed to another policy
 import EDF_Policy_Periodic as pol
 
 # FLAGS and FIELDS concerning the scheduling operation
-# Tasks that are ready to be scheduled. Aperiodic tasks should be treated differently
-# by the scheduling policy than periodic tasks. NOTE: Aperiodic tasks are not fully supported yet
-periodic_ready_queue = []
-aperiodic_ready_queue = []
+# The state of the scheduler is part of the simulation context (see SimulationContext.py):
+# - The tasks that are ready to be scheduled. Aperiodic tasks should be treated differently
+#   by the scheduling policy than periodic tasks. NOTE: Aperiodic tasks are not fully supported yet
+#   The periodic ready queue is provided by the policy, so that the policy can choose how to order the tasks.
+# - The current first task, will be scheduled or is already scheduled
+# - The enclaves that are sleeping (sleep())
+# - The interrupt mask flag that is set when running the scheduler or executing a section of bounded atomicity
+# - The scheduler task. This tasks has different aspects compared to normal tasks.
+
+# Constant reflecting the worst-case execution time of the scheduler (default for a simulation context)
+WCET_SCHEDULER = 20
 
-# Current first task, will be scheduled or is already scheduled
-first_task = None
-# Enclaves that are sleeping (sleep())
-sleeping_tasks = []
 
-# Constant reflecting the worst-case execution time of the scheduler
-WCET_SCHEDULER = 20
-# Interrupt mask flag that is set when running the scheduler or executing a section of bounded atomicity
-interrupt_mask = False
-# Variable registering the scheduler task. This tasks has different aspects compared to normal tasks.
-dummy_scheduler_task = None
+# Return a new ready queue for periodic tasks, as provided by the policy
+def new_periodic_ready_queue():
+    return pol.new_periodic_ready_queue()
+
+
+# Return a new state for the acceptance test, as provided by the policy
+def new_admission_state(wcet_scheduler, max_clix_duration):
+    return pol.new_admission_state(wcet_scheduler, max_clix_duration)
 
 
 # Initialize the scheduler task. The max_nr_time_points are used to make the scheduler_task look like a normal task
 # to make visualization easier, but has no real implications for the run of the program.
 def init_scheduler(max_nr_time_points):
-    global dummy_scheduler_task
-    dummy_scheduler_task = Task.SchedulerTask("Scheduler", WCET_SCHEDULER, max_nr_time_points)
+    ctx = sc.active_context
+    ctx.dummy_scheduler_task = Task.SchedulerTask("Scheduler", ctx.wcet_scheduler, max_nr_time_points)
 
 
 # Return the scheduler task
 def get_scheduler_task():
-    return dummy_scheduler_task
+    return sc.active_context.dummy_scheduler_task
 
 
 # Submit a new enclave to this scheduler. If it is already present then an error is produced.
@@ -43,12 +49,17 @@ def submit_new_task(new_task, current_time):
     if new_task in get_all_tasks():
         raise ValueError
     # Using the acceptance test to ensure that the system is still schedulable
-    # This assumes the acceptance test is sufficient. In the current case the acceptance test will accept everything
-    # for illustration purposes. In a real system, this function should be implemented in the scheduler or the
-    # scheduler should use some computed accepting value, received externally from a trusted component.
-    if pol.is_schedulable(new_task, get_all_tasks(), current_time + 1):
-        pol.add_task_to_queue(new_task, periodic_ready_queue, aperiodic_ready_queue)
+    # This assumes the acceptance test is sufficient. The state of the test (of the tasks that are already accepted) is
+    # kept in the simulation context. The test can be switched off in the context, then everything is accepted (for
+    # illustration purposes, e.g. to show the deadline misses of an unschedulable task set). In a real system, this
+    # function should be implemented in the scheduler or the scheduler should use some computed accepting value,
+    # received externally from a trusted component.
+    ctx = sc.active_context
+    if not ctx.admission_test or pol.is_schedulable(new_task, get_all_tasks(), current_time + 1,
+                                                    ctx.admission_state):
+        pol.add_task_to_queue(new_task, ctx.periodic_ready_queue, ctx.aperiodic_ready_queue)
         return True
+    ctx.nr_rejected_tasks += 1
     return False
 
 
@@ -57,13 +68,13 @@ def submit_new_task(new_task, current_time):
 # to determine which task has to be scheduled next. The interrupt mask is used to ensure that the scheduling task will
 # not be interrupted before completion.
 def run_scheduler(current_time, interrupt):
-    global first_task
-    global interrupt_mask
+    ctx = sc.active_context
+    ctx.nr_scheduler_invocations += 1
     # The CPU will set this to false after termination of the scheduler task
-    interrupt_mask = True
+    ctx.interrupt_mask = True
 
     # Start the scheduler enclave
-    dummy_scheduler_task.schedule_task()
+    ctx.dummy_scheduler_task.schedule_task()
 
     # If an interrupt is present, then it should be handled.
     if interrupt is not None:
@@ -78,11 +89,13 @@ def run_scheduler(current_time, interrupt):
         current_budget_timer.remove_timer()
 
     # Deschedule the previously scheduled task
+    first_task = ctx.first_task
     if first_task is not None and first_task.is_scheduled():
         first_task.deschedule_task(current_time)
 
     # Find the task to be scheduled according to the policy, can be the same one.
-    first_task = pol.get_next_scheduled(periodic_ready_queue, aperiodic_ready_queue, current_time)
+    first_task = pol.get_next_scheduled(ctx.periodic_ready_queue, ctx.aperiodic_ready_queue, current_time)
+    ctx.first_task = first_task
 
     # If there is a task that can be scheduled, then schedule it and add a budget timer (this timer will fire right
     # after the end of the budget of the task, to ensure that control goes back to the scheduler).
@@ -102,7 +115,7 @@ def add_budget_timer(current_time, task):
         expected_end = task.get_periodic_budget() + 1
     else:
         # The expected end should account also for the delay by the scheduler.
-        expected_end = task.get_periodic_budget() + WCET_SCHEDULER + 1
+        expected_end = task.get_periodic_budget() + sc.active_context.wcet_scheduler + 1
     # Add a new budget timer to the registered timers.
     timer1 = tim.Timer("budget", budget_timer=True, value=expected_end, task=task)
     tim.add_timer_to_mcu(timer1)
@@ -121,9 +134,8 @@ def add_sleep_timer(current_time, task):
 def handle_interrupt(current_time, interrupt):
     # for the moment only timer interrupts are accepted.
     if interrupt.is_timer_interrupt():
-        for timer in tim.get_timers().copy():
-            if timer.is_finished():
-                handle_timer(timer, current_time)
+        for timer in tim.get_finished_timers():
+            handle_timer(timer, current_time)
     else:
         raise TypeError("Type of interrupt not supported yet")
 
@@ -137,56 +149,82 @@ def handle_timer(timer, current_time):
             terminate_execution(task, current_time)
     else:
         # if it was a sleep timer, then the task should be replaced in the ready queue.
-        sleeping_tasks.remove(task)
-        pol.add_task_to_queue(task, periodic_ready_queue, aperiodic_ready_queue)
+        ctx = sc.active_context
+        ctx.sleeping_tasks.remove(task)
+        pol.add_task_to_queue(task, ctx.periodic_ready_queue, ctx.aperiodic_ready_queue)
     timer.remove_timer()
 
 
 # Terminate the execution of the given task. The task is descheduled, corresponding timers are removed and interrupts
 # are re-enabled.
 def terminate_execution(task, current_time):
+    # Register the outcome of the job, before the task is re-initialised for its next period
+    register_end_of_job(task, current_time)
     task.deschedule_task(current_time)
     tim.get_timer_associated_with_task(task).remove_timer()
     mcu.enable_interrupts_system_call()
 
     if task.is_periodic():
+        ctx = sc.active_context
         add_sleep_timer(current_time, task)
-        periodic_ready_queue.remove(task)
-        sleeping_tasks.append(task)
+        ctx.periodic_ready_queue.remove(task)
+        ctx.sleeping_tasks.append(task)
     else:
         remove_task(task)
 
 
+# Register the outcome of the job of the given task that ends in the cycle starting at the given time.
+def register_end_of_job(task, current_time):
+    ctx = sc.active_context
+    if task.has_ran_out_of_budget() or task.has_finished_current_task():
+        ctx.trace_store.end_job(task, task.has_ran_out_of_budget())
+    if task.has_ran_out_of_budget():
+        ctx.nr_budget_overruns += 1
+    elif task.has_finished_current_task():
+        ctx.nr_finished_jobs += 1
+        # The job ends at the end of the cycle
+        if current_time + 1 > task.get_deadline():
+            ctx.nr_deadline_misses += 1
+
+
 # Getters and Setters #
 
 
 # Return all tasks on this scheduler
 def get_all_tasks():
-    return periodic_ready_queue + aperiodic_ready_queue + sleeping_tasks
+    ctx = sc.active_context
+    return ctx.periodic_ready_queue + ctx.aperiodic_ready_queue + ctx.sleeping_tasks
 
 
 # Remove a task from the scheduler
 def remove_task(task):
-    global sleeping_tasks
-    global periodic_ready_queue
-    global aperiodic_ready_queue
-
-    if task in sleeping_tasks:
-        sleeping_tasks.remove(task)
+    ctx = sc.active_context
+    if task in ctx.sleeping_tasks:
+        ctx.sleeping_tasks.remove(task)
     elif task.is_periodic():
-        periodic_ready_queue.remove(task)
+        ctx.periodic_ready_queue.remove(task)
     else:
-        aperiodic_ready_queue.remove(task)
+        ctx.aperiodic_ready_queue.remove(task)
 
 
 # Return the currently first scheduled task
 def get_current_scheduled():
-    return first_task
+    return sc.active_context.first_task
 
 
 # Return if there are tasks in the ready queue
 def has_jobs_waiting(current_time):
-    return len(aperiodic_ready_queue) > 0 or len(periodic_ready_queue) > 0
+    ctx = sc.active_context
+    return len(ctx.aperiodic_ready_queue) > 0 or len(ctx.periodic_ready_queue) > 0
+
+
+# Move all the times in the state of the scheduler (the tasks and the ready queues) the given number of cycles forward
+# (see SteadyState.py)
+def shift_time(nr_cycles):
+    ctx = sc.active_context
+    for task in get_all_tasks():
+        task.shift_time(nr_cycles)
+    pol.shift_ready_queues(nr_cycles, ctx.periodic_ready_queue, ctx.aperiodic_ready_queue)
 
 
 # Debugging purposes + Illustration purposes #
@@ -194,7 +232,7 @@ def has_jobs_waiting(current_time):
 # Print the state of the scheduler
 def to_string_scheduler():
     s = "Scheduler: \n"
-    for enc in aperiodic_ready_queue:
+    for enc in sc.active_context.aperiodic_ready_queue:
         s += enc.to_string() + "\n"
     return s
 
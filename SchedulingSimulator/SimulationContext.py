@@ -0,0 +1,175 @@
+import MCU as mcu
+import Scheduler as s
+import Trace as tr
+import TraceStore as ts
+
+# This file embeds the state of one simulation. All the state of the MCU, the scheduler, the timers, the interrupts and
+# the visualisation is owned by a SimulationContext object instead of by module globals. This makes it possible to run
+# many simulations after each other in the same process (and to keep their results), or to run them concurrently in
+# different processes.
+# The functions of the other modules always work on the active context. The MCU activates the context of a simulation
+# when it is started (see MCU.simulate).
+
+# The context on which the simulator currently works
+active_context = None
+
+
+class SimulationContext:
+    def __init__(self, max_clix_duration=None, wcet_scheduler=None, trace_level=None, trace_sink=None, profile=False,
+                 admission_test=True):
+        #####
+        # SIMULATION PARAMETERS
+        # -Number of cycles that will be simulated (will be set at the beginning of the simulation)
+        self.max_nr_time_points = -1
+        # -Upper bound on the duration of a clix section (static upper bound)
+        self.max_clix_duration = mcu.MAX_CLIX_DURATION if max_clix_duration is None else max_clix_duration
+        # -Worst-case execution time of the scheduler
+        self.wcet_scheduler = s.WCET_SCHEDULER if wcet_scheduler is None else wcet_scheduler
+        # -Whether new tasks have to pass the acceptance test of the policy (otherwise every task is accepted)
+        self.admission_test = admission_test
+        # -Tasks that will be released at later times (in the given scenario), min-heap of (release time, sequence
+        #  number, task) entries (see MCU.load_new_task)
+        self.tasks_to_release = []
+        # -Sequence number for the next task that is added to the tasks that will be released
+        self.next_release_number = 0
+        # -Whether the quiet cycles are skipped in one step (see MCU.simulate)
+        self.event_driven = False
+        # -Detector of the steady state, None if the simulation is not extrapolated (see SteadyState.py)
+        self.steady_state = None
+        # -Time point at which the simulation continues (see MCU.run_until), and whether it has reached the end
+        self.time_point = 0
+        self.finished = False
+
+        # -Trace level and sink of the debug output (see Trace.py), by default no output is traced
+        self.trace_level = tr.OFF if trace_level is None else trace_level
+        self.trace_sink = tr.StdoutSink() if trace_sink is None else trace_sink
+        # -Whether the time spent per phase of the simulation is measured (see PhaseProfiler.py)
+        self.profile = profile
+
+        #####
+        # MCU STATE
+        # The task that is currently running
+        self.running_task = None
+        # The scheduler is a special task. This boolean denotes if the scheduler has finished its job.
+        self.has_run_scheduler = False
+        # Counter that counts how many cycles are left in the current clix()-section
+        self.clix_counter = 0
+        # Variable registering if currently a clix()-section is performed
+        self.performing_clix = False
+
+        #####
+        # SCHEDULER STATE
+        # Tasks that are ready to be scheduled (the periodic ready queue is provided by the policy)
+        self.periodic_ready_queue = s.new_periodic_ready_queue()
+        self.aperiodic_ready_queue = []
+        # State of the acceptance test: summary of the accepted tasks (provided by the policy)
+        self.admission_state = s.new_admission_state(self.wcet_scheduler, self.max_clix_duration)
+        # Current first task, will be scheduled or is already scheduled
+        self.first_task = None
+        # Enclaves that are sleeping (sleep())
+        self.sleeping_tasks = []
+        # Interrupt mask flag that is set when running the scheduler or executing a section of bounded atomicity
+        self.interrupt_mask = False
+        # The scheduler task
+        self.dummy_scheduler_task = None
+
+        #####
+        # TIMER STATE (see Timer.py)
+        # The number of ticks of the processor clock
+        self.current_tick = 0
+        # Min-heap with (expiry, sequence number, timer) entries of the timers that have not yet expired
+        self.timer_heap = []
+        # The timers that have expired but that are not yet removed (handled), by sequence number
+        self.expired_timers = dict()
+        # The active timers per task (by sequence number)
+        self.timers_of_task = dict()
+        # Sequence number for the next timer that is added
+        self.next_sequence_number = 0
+
+        #####
+        # INTERRUPT STATE
+        # Registering if an interrupt is pending
+        self.interrupt_present_flag = False
+        # Registering the last pending interrupt
+        self.pending_interrupt = None
+
+        #####
+        # STATISTICS
+        # Number of tasks that have not passed the acceptance test
+        self.nr_rejected_tasks = 0
+        # Number of jobs (runs of a periodic task within one period) that have finished
+        self.nr_finished_jobs = 0
+        # Number of jobs that have finished after their deadline
+        self.nr_deadline_misses = 0
+        # Number of jobs that have been terminated because they went over their budget or violated the hardware rules
+        self.nr_budget_overruns = 0
+        # Number of interrupts that have been handled by the scheduler
+        self.nr_handled_interrupts = 0
+        # Number of times the scheduler has been run
+        self.nr_scheduler_invocations = 0
+        # Number of timers that have expired (and thus raised an interrupt)
+        self.nr_timer_interrupts = 0
+        # Number of times the MCU has switched to another task (the scheduler or the task chosen by the scheduler)
+        self.nr_context_switches = 0
+        # Number of hardware violations (e.g. a clix section that is too long or nested)
+        self.nr_hardware_violations = 0
+        # Number of clix sections that have been started
+        self.nr_clix_sections = 0
+        # Number of cycles in which no task was running
+        self.nr_idle_cycles = 0
+        # Number of cycles that have been extrapolated instead of simulated (see SteadyState.py)
+        self.nr_extrapolated_cycles = 0
+        # Wall time of the simulation (in seconds)
+        self.simulation_time = 0
+        # Wall time and number of calls per phase, only if the simulation is profiled (see PhaseProfiler.py)
+        self.phase_times = dict()
+        self.phase_calls = dict()
+
+        #####
+        # VISUALISATION
+        # The timeline data (segments and interrupts, see TraceStore.py)
+        self.trace_store = ts.TraceStore()
+        # The task that ran in the previous cycle
+        self.prev_cycle_task = None
+        # Shows when threads have switched/the same thread has run but in two different periods
+        self.pseudo_context_switch = False
+
+
+# Return a new simulation context. The parameters of the MCU and the scheduler can be changed for this simulation only.
+# If a trace level is given, the debug output is sent to the given trace sink (by default to the standard output).
+# If profile is True, the time spent per phase of the simulation is measured.
+# If admission_test is False, the tasks are accepted without the acceptance test of the policy.
+def new_simulation_context(max_clix_duration=None, wcet_scheduler=None, trace_level=None, trace_sink=None,
+                           profile=False, admission_test=True):
+    return SimulationContext(max_clix_duration, wcet_scheduler, trace_level, trace_sink, profile, admission_test)
+
+
+# Return the counters of the simulation in the given context (and the time per phase, if it was profiled)
+def get_statistics(context):
+    return {"nr_time_points": context.max_nr_time_points,
+            "rejected_tasks": context.nr_rejected_tasks,
+            "finished_jobs": context.nr_finished_jobs,
+            "deadline_misses": context.nr_deadline_misses,
+            "budget_overruns": context.nr_budget_overruns,
+            "hardware_violations": context.nr_hardware_violations,
+            "scheduler_invocations": context.nr_scheduler_invocations,
+            "handled_interrupts": context.nr_handled_interrupts,
+            "timer_interrupts": context.nr_timer_interrupts,
+            "context_switches": context.nr_context_switches,
+            "clix_sections": context.nr_clix_sections,
+            "idle_cycles": context.nr_idle_cycles,
+            "extrapolated_cycles": context.nr_extrapolated_cycles,
+            "simulation_time": context.simulation_time,
+            "phase_times": dict(context.phase_times),
+            "phase_calls": dict(context.phase_calls)}
+
+
+# Make the given context the one on which the simulator works
+def activate(context):
+    global active_context
+    active_context = context
+
+
+# Return the context on which the simulator currently works
+def get_active_context():
+    return active_context
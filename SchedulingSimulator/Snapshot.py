@@ -0,0 +1,87 @@
+import copy
+import io
+import pickle
+import zlib
+import Trace as tr
+import TraceStore as ts
+
+########################################################################################################################
+# This file makes it possible to checkpoint a simulation at a given time point and to continue it later on, or several
+# times with different what-ifs, without simulating the common prefix again. All the state of a simulation (tasks,
+# programs, timers, pending interrupt, clix counter, ready and sleeping queues, counters and the timeline so far) is
+# owned by its simulation context, so a checkpoint is a copy of the context:
+#   - in memory: fork(context) returns an independent copy, which is continued with MCU.run_until/finish_simulation
+#   - in a file: save_snapshot(context, file_name) writes a compressed copy, load_snapshot(file_name) reads it back
+#
+# Example (what if a task overruns at cycle 5000, or an extra task is released there):
+#   context = mcu.start_simulation(test_script, 100000, event_driven=True)
+#   mcu.run_until(5000, context)
+#   overrun = mcu.overrun_task("enc1", 200, fork(context))
+#   mcu.finish_simulation(overrun)
+#   release = fork(context)
+#   mcu.release_task(task_data, release)
+#   mcu.finish_simulation(release)
+#
+# The trace sink is not part of the state: a fork shares it with the original, a loaded snapshot gets the given sink.
+# The timeline of a simulation that is streamed to a file (see TraceStream.py) is not copied, so such a simulation can
+# not be checkpointed.
+########################################################################################################################
+
+FILE_MAGIC = b"SIMSNAPSHOT1\n"
+
+
+# Pickler that leaves the trace sink of the context out of the snapshot
+class SnapshotPickler(pickle.Pickler):
+    def __init__(self, file, trace_sink):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.trace_sink = trace_sink
+
+    def persistent_id(self, obj):
+        return "trace_sink" if obj is self.trace_sink else None
+
+
+# Unpickler that gives the snapshot the given trace sink
+class SnapshotUnpickler(pickle.Unpickler):
+    def __init__(self, file, trace_sink):
+        super().__init__(file)
+        self.trace_sink = trace_sink
+
+    def persistent_load(self, pid):
+        if pid != "trace_sink":
+            raise pickle.UnpicklingError("Unknown object in snapshot: " + str(pid))
+        return self.trace_sink
+
+
+# Return an independent copy of the simulation in the given context, which shares the trace sink with the original
+def fork(context):
+    check_can_be_copied(context)
+    return copy.deepcopy(context, {id(context.trace_sink): context.trace_sink})
+
+
+# Save the simulation in the given context to a compact (compressed) file
+def save_snapshot(context, file_name):
+    check_can_be_copied(context)
+    buffer = io.BytesIO()
+    SnapshotPickler(buffer, context.trace_sink).dump(context)
+    file = open(file_name, "wb")
+    file.write(FILE_MAGIC)
+    file.write(zlib.compress(buffer.getvalue()))
+    file.close()
+
+
+# Return the simulation context saved in the given file. Its debug output is sent to the given trace sink (by default
+# to the standard output).
+def load_snapshot(file_name, trace_sink=None):
+    file = open(file_name, "rb")
+    if file.read(len(FILE_MAGIC)) != FILE_MAGIC:
+        file.close()
+        raise ValueError("Not a snapshot file: " + file_name)
+    data = zlib.decompress(file.read())
+    file.close()
+    return SnapshotUnpickler(io.BytesIO(data), tr.StdoutSink() if trace_sink is None else trace_sink).load()
+
+
+# Raise an error if the simulation in the given context can not be copied
+def check_can_be_copied(context):
+    if type(context.trace_store) is not ts.TraceStore:
+        raise ValueError("The timeline of the simulation is streamed to a file, it can not be checkpointed")
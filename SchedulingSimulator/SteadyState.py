@@ -0,0 +1,179 @@
+import math
+import Scheduler as s
+import SimulationContext as sc
+import Timer as tim
+import Trace as tr
+
+########################################################################################################################
+# This file embeds the detection of the steady state of a simulation. Once all the tasks have been released, a purely
+# periodic system can only be in a finite number of states at the hyperperiod boundaries, so sooner or later the state
+# at a boundary is the same as at an earlier boundary (apart from the absolute time). From then on the simulation
+# repeats itself: every period between the two boundaries gives the same schedule, the same counters and the same
+# trace, only moved forward in time.
+#
+# At every hyperperiod boundary after the last release, a fingerprint of the full state is taken: the tasks in the ready
+# queue (the order in which they were added does not matter to the policy) and the sleeping tasks, the timers (relative
+# to the current tick), the programs (program counter, remaining cycles of the instruction), the clix state, the
+# pending interrupt and the segment of the trace that is still open (all times are relative to the boundary). When a
+# fingerprint was already seen, the repetition is extrapolated over the rest of the horizon: the counters are increased,
+# the trace of the repeated period is appended as many times as it fits, and the state is moved forward in time. Only
+# the remainder of the horizon (less than one repetition) is still simulated.
+########################################################################################################################
+
+# The counters of the simulation context that are extrapolated
+COUNTERS = ["nr_finished_jobs", "nr_deadline_misses", "nr_budget_overruns", "nr_handled_interrupts",
+            "nr_scheduler_invocations", "nr_timer_interrupts", "nr_context_switches", "nr_hardware_violations",
+            "nr_clix_sections", "nr_idle_cycles"]
+# Number of earlier boundaries that a fingerprint is compared with (their part of the trace is kept in memory, see
+# TraceStore.retain)
+MAX_NR_OF_BOUNDARIES = 16
+
+
+class SteadyStateDetector:
+    def __init__(self, context):
+        self.context = context
+        # The hyperperiod of the tasks (known at the first boundary)
+        self.hyperperiod = None
+        # The time point of the next boundary, None if no (more) boundaries have to be checked
+        self.next_check = None
+        # The earlier boundaries by fingerprint: (time point, mark of the trace, counters), and their fingerprints in
+        # the order in which they were seen
+        self.boundaries = dict()
+        self.fingerprints = []
+        # Every task gets an index (in the order in which it was seen), so the fingerprint does not depend on objects
+        self.task_index = dict()
+        self.tasks = []
+
+    # Start checking once all tasks have been released: at the beginning of the cycle after the last release, and not
+    # before the given time point. The boundaries that were seen before are forgotten (e.g. when a task is released
+    # later on, see MCU.release_task).
+    def start(self, time_point=0):
+        release_times = [release_time for (release_time, sequence_number, task) in self.context.tasks_to_release]
+        self.next_check = max([time_point] + [release_time + 1 for release_time in release_times])
+        self.hyperperiod = None
+        self.boundaries.clear()
+        self.fingerprints = []
+        self.context.trace_store.retain(None)
+
+    # Check the boundary at the given time point (before the cycle starting at it is simulated). If the state was seen
+    # before, the simulation is extrapolated, but not beyond the given time point (by default the end of the
+    # simulation). Return the time point at which the simulation continues.
+    def check(self, time_point, until=None):
+        ctx = self.context
+        if self.hyperperiod is None:
+            self.hyperperiod = get_hyperperiod(s.get_all_tasks())
+        fingerprint = self.get_fingerprint(time_point)
+        mark = ctx.trace_store.get_mark()
+        counters = tuple(getattr(ctx, counter) for counter in COUNTERS)
+
+        if fingerprint in self.boundaries:
+            ctx.trace_store.retain(None)
+            self.next_check = None
+            (previous_time_point, previous_mark, previous_counters) = self.boundaries[fingerprint]
+            time_point = self.extrapolate(time_point, previous_time_point, previous_mark, mark, previous_counters,
+                                          counters, until)
+            if until is not None and until < ctx.max_nr_time_points:
+                # The simulation is stopped before the end (see MCU.run_until), the rest of the horizon is extrapolated
+                # once the state repeats again
+                self.start(time_point)
+            return time_point
+
+        self.boundaries[fingerprint] = (time_point, mark, counters)
+        self.fingerprints.append(fingerprint)
+        if len(self.fingerprints) > MAX_NR_OF_BOUNDARIES:
+            del self.boundaries[self.fingerprints.pop(0)]
+        # A repetition is only found at the next boundary, and is only of use if it fits at least once more
+        if time_point + 2 * self.hyperperiod > ctx.max_nr_time_points:
+            ctx.trace_store.retain(None)
+            self.next_check = None
+        else:
+            ctx.trace_store.retain(self.boundaries[self.fingerprints[0]][1])
+            self.next_check = time_point + self.hyperperiod
+        return time_point
+
+    # Extrapolate the repetition of the period between the two boundaries over the rest of the horizon (or up to the
+    # given time point). Return the time point at which the simulation continues.
+    def extrapolate(self, time_point, previous_time_point, previous_mark, mark, previous_counters, counters,
+                    until=None):
+        ctx = self.context
+        period = time_point - previous_time_point
+        nr_repeats = ((ctx.max_nr_time_points if until is None else until) - time_point) // period
+        nr_cycles = nr_repeats * period
+        if ctx.trace_level >= tr.EVENTS:
+            tr.emit(tr.EVENTS, "STEADY STATE: the state in cycle " + str(time_point) + " is the state in cycle "
+                    + str(previous_time_point) + ", " + str(nr_cycles) + " cycles are extrapolated")
+        if nr_repeats == 0:
+            return time_point
+
+        trace_store = ctx.trace_store
+        trace_store.append_records(trace_store.get_records(previous_mark, mark), period, nr_repeats)
+        for (counter, previous_value, value) in zip(COUNTERS, previous_counters, counters):
+            setattr(ctx, counter, value + nr_repeats * (value - previous_value))
+        s.shift_time(nr_cycles)
+        tim.shift_time(nr_cycles)
+        ctx.nr_extrapolated_cycles += nr_cycles
+        return time_point + nr_cycles
+
+    # Return the fingerprint of the state at the given time point: everything that determines the rest of the
+    # simulation, with the times relative to the time point.
+    def get_fingerprint(self, time_point):
+        ctx = self.context
+        index = self.get_task_index
+        tasks = [ctx.dummy_scheduler_task] + list(s.get_all_tasks())
+        for task in tasks:
+            index(task)
+
+        # The segment that is still open in the trace
+        trace_store = ctx.trace_store
+        mark = trace_store.get_mark()
+        open_segment = None
+        if mark[0] > mark[1]:
+            task_id = trace_store.segment_task[-1]
+            deadline = trace_store.segment_deadline[-1]
+            if not trace_store.is_scheduler_task(task_id):
+                deadline -= time_point
+            open_segment = (task_id, time_point - trace_store.segment_start[-1], deadline,
+                            trace_store.open_segment_job_end)
+
+        pending_interrupt = None
+        if ctx.pending_interrupt is not None:
+            timer = ctx.pending_interrupt.trigger()
+            pending_interrupt = timer.get_state(index(timer.get_task_of_timer()))
+
+        return (ctx.current_tick - time_point,
+                index(ctx.running_task), ctx.has_run_scheduler, ctx.clix_counter, ctx.performing_clix,
+                ctx.interrupt_mask, ctx.interrupt_present_flag, pending_interrupt,
+                index(ctx.first_task),
+                tuple(sorted(index(task) for task in ctx.periodic_ready_queue)),
+                tuple(index(task) for task in ctx.aperiodic_ready_queue),
+                tuple(sorted(index(task) for task in ctx.sleeping_tasks)),
+                tuple(timer.get_state(index(timer.get_task_of_timer())) for timer in tim.get_timers()),
+                tuple(timer.get_state(index(timer.get_task_of_timer()))
+                      for (sequence_number, timer) in sorted(ctx.expired_timers.items())),
+                index(ctx.prev_cycle_task), ctx.pseudo_context_switch, mark[0] == 0, open_segment,
+                tuple(task.get_state(time_point) for task in self.tasks))
+
+    # Return the index of the given task (-1 for None)
+    def get_task_index(self, task):
+        if task is None:
+            return -1
+        task_index = self.task_index.get(task)
+        if task_index is None:
+            task_index = len(self.tasks)
+            self.task_index[task] = task_index
+            self.tasks.append(task)
+        return task_index
+
+
+# Return the hyperperiod (least common multiple of the periods) of the given tasks
+def get_hyperperiod(tasks):
+    hyperperiod = 1
+    for task in tasks:
+        if task.is_periodic():
+            hyperperiod = hyperperiod * task.get_period() // math.gcd(hyperperiod, task.get_period())
+    return hyperperiod
+
+
+# Return a new steady state detector for the simulation in the given context (by default the active one)
+def new_steady_state_detector(context=None):
+    return SteadyStateDetector(sc.active_context if context is None else context)
@@ -32,6 +32,18 @@ class Task(metaclass=ABCMeta):
     def run_for_one_cycle(self):
         pass
 
+    # Simulate the task for the given number of cycles at once. This may only be used for cycles in which nothing
+    # happens but the advancing of counters (see get_nr_of_cycles_before_next_event).
+    @abstractmethod
+    def run_for_cycles(self, nr_cycles):
+        pass
+
+    # Return the number of cycles that this task can run before something of interest happens (it finishes, starts a
+    # new instruction, etc.).
+    @abstractmethod
+    def get_nr_of_cycles_before_next_event(self):
+        pass
+
     # Setters #
 
     @abstractmethod
@@ -42,6 +54,18 @@ class Task(metaclass=ABCMeta):
     def deschedule_task(self, current_time):
         pass
 
+    # Move the times of the task (deadlines, periods) the given number of cycles forward (see SteadyState.py)
+    def shift_time(self, nr_cycles):
+        pass
+
+    # Return the state of the task, with the times relative to the given time (see SteadyState.py)
+    def get_state(self, current_time):
+        return self.remainingBudget, self.ranOutOfBudget, self.scheduled, self.process.get_state()
+
+    # Make the current job run the given number of cycles longer than its program says (see MCU.overrun_task)
+    def overrun(self, nr_cycles):
+        self.process.stretch_current_instruction(nr_cycles)
+
     # Getters
     def get_name(self):
         return self.tid
@@ -49,6 +73,10 @@ class Task(metaclass=ABCMeta):
     def get_budget(self):
         return self.original_budget
 
+    # Return the longest duration of the clix sections in the program of the task (0 if it has none)
+    def get_max_clix_duration(self):
+        return self.process.get_max_clix_duration()
+
     def has_ran_out_of_budget(self):
         return self.ranOutOfBudget
 
@@ -95,6 +123,16 @@ class PeriodicTask(Task):
         self.process.run_for_one_cycle()
         self.remainingPeriodicBudget -= 1
 
+    def run_for_cycles(self, nr_cycles):
+        if not self.scheduled:
+            raise ValueError
+
+        self.process.run_for_cycles(nr_cycles)
+        self.remainingPeriodicBudget -= nr_cycles
+
+    def get_nr_of_cycles_before_next_event(self):
+        return self.process.get_nr_of_cycles_before_next_instruction()
+
     def schedule_task(self):
         if self.scheduled:
             raise ValueError
@@ -113,6 +151,15 @@ class PeriodicTask(Task):
         if self.has_finished_current_task() or self.has_ran_out_of_budget():
             self.initialise_periodic_task()
 
+    def shift_time(self, nr_cycles):
+        self.periodicDeadline += nr_cycles
+        self.endOfPreviousPeriod += nr_cycles
+
+    def get_state(self, current_time):
+        return Task.get_state(self, current_time) + (self.periodicDeadline - current_time,
+                                                     self.endOfPreviousPeriod - current_time,
+                                                     self.remainingPeriodicBudget)
+
     # Getters
     def is_periodic(self):
         return True
@@ -166,6 +213,13 @@ class SchedulerTask(Task):
     def run_for_one_cycle(self):
         self.remainingBudget -= 1
 
+    def run_for_cycles(self, nr_cycles):
+        self.remainingBudget -= nr_cycles
+
+    # The scheduler task only finishes when its budget is exhausted
+    def get_nr_of_cycles_before_next_event(self):
+        return self.remainingBudget - 1
+
         # Setters #
 
     def schedule_task(self):
@@ -209,11 +263,9 @@ def new_task(task_data):
 
 # This method makes it possible to also run test scripts where no instruction sequence is given.
 def generate_dummy_program(budget):
-    dummy_program = dict()
     dummy_instruction = dict()
     dummy_instruction["type"] = "calc"
     dummy_instruction["param"] = None
     dummy_instruction["length"] = budget
 
-    dummy_program["0"] = dummy_instruction
-    return dummy_program
+    return [dummy_instruction]
@@ -0,0 +1,166 @@
+import json
+import math
+import random
+
+########################################################################################################################
+# This file makes it possible to generate synthetic (periodic) task sets, instead of writing them by hand in
+# "testScript.json". A task set is generated from a seed, so the same seed always gives the same task sets.
+#
+# - The total utilisation of a task set is split over its tasks with UUniFast (or UUniFast-Discard when the utilisation
+#   of one task is bounded).
+# - The periods are drawn log-uniformly (the usual choice for realistic task sets), uniformly or harmonically (every
+#   period is the smallest period times a power of two, which keeps the hyperperiod small).
+# - The budget of a task is its utilisation times its period. The program of a task takes exactly its budget and
+#   contains clix instructions according to a pattern (see CLIX_PATTERNS).
+#
+# The task sets are returned in the format of the test scripts (the input of Task.new_task), and can be converted to the
+# parameters of the constraint models (see to_constraint_parameters).
+########################################################################################################################
+
+# The distributions of the periods
+PERIOD_DISTRIBUTIONS = ["log_uniform", "uniform", "harmonic"]
+# The patterns of clix instructions in the program of a task:
+#   - "none": the program only computes
+#   - "start": the program starts with a clix instruction (as in the test scripts)
+#   - "end": the program ends with a clix instruction
+#   - "periodic": a clix instruction every clix_interval cycles
+#   - "random": nr_of_clix clix instructions at random positions
+CLIX_PATTERNS = ["none", "start", "end", "periodic", "random"]
+
+
+# Return the utilisations of the given number of tasks, that sum up to the given total utilisation (UUniFast).
+# If a maximum utilisation per task is given, task sets with a task above it are discarded (UUniFast-Discard).
+def uunifast(rng, nr_tasks, total_utilisation, max_task_utilisation=None):
+    while True:
+        utilisations = []
+        remaining = total_utilisation
+        for index in range(1, nr_tasks):
+            next_remaining = remaining * rng.random() ** (1 / (nr_tasks - index))
+            utilisations.append(remaining - next_remaining)
+            remaining = next_remaining
+        utilisations.append(remaining)
+        if max_task_utilisation is None or max(utilisations) <= max_task_utilisation:
+            return utilisations
+
+
+# Return a period drawn from the given distribution, a multiple of the granularity (between the first and the last
+# multiple of the granularity within [min_period, max_period])
+def generate_period(rng, distribution, min_period, max_period, granularity=1):
+    lowest = -(-min_period // granularity) * granularity
+    highest = max(lowest, (max_period // granularity) * granularity)
+    if distribution == "log_uniform":
+        period = math.exp(rng.uniform(math.log(min_period), math.log(max_period + granularity)))
+    elif distribution == "uniform":
+        period = rng.uniform(min_period, max_period + granularity)
+    elif distribution == "harmonic":
+        # The lowest multiple of the granularity, doubled: the periods divide each other
+        return lowest * 2 ** rng.randint(0, int(math.log2(highest / lowest)))
+    else:
+        raise ValueError("Unknown period distribution: " + str(distribution))
+    return min(highest, max(lowest, int(period // granularity) * granularity))
+
+
+# Return a clix duration: the given number, or a number drawn uniformly from the given (min, max) range
+def generate_clix_duration(rng, clix_duration):
+    if isinstance(clix_duration, int):
+        return clix_duration
+    return rng.randint(clix_duration[0], clix_duration[1])
+
+
+# Return a program (instruction sequence) that takes the given budget, with clix instructions according to the given
+# pattern. A clix instruction takes one cycle, its parameter is the duration of the clix section: the section covers
+# the clix instruction and the given number of cycles after it. The clix sections do not overlap (a clix within a clix
+# section is a violation) and end within the budget: a duration is cut off at the next clix instruction or at the end.
+def generate_program(rng, budget, clix_pattern="none", clix_duration=(1, 10), clix_interval=100, nr_of_clix=1):
+    durations = None
+    if clix_pattern == "none":
+        positions = []
+    elif clix_pattern == "start":
+        positions = [0]
+    elif clix_pattern == "end":
+        positions = [budget - 1]
+    elif clix_pattern == "periodic":
+        positions = list(range(0, budget, clix_interval))
+    elif clix_pattern == "random":
+        # The clix sections are placed at random in the budget, with random gaps in between
+        durations = [min(budget - 1, generate_clix_duration(rng, clix_duration)) for index in range(nr_of_clix)]
+        while sum(durations) + len(durations) > budget:
+            durations.pop()
+        gaps = sorted(rng.randint(0, budget - sum(durations) - len(durations)) for index in range(len(durations)))
+        positions = [gap + sum(durations[:index]) + index for (index, gap) in enumerate(gaps)]
+    else:
+        raise ValueError("Unknown clix pattern: " + str(clix_pattern))
+    if durations is None:
+        durations = [generate_clix_duration(rng, clix_duration) for position in positions]
+
+    program = []
+    position = 0
+    for (index, clix_position) in enumerate(positions):
+        if clix_position > position:
+            program.append({"type": "calc", "param": None, "length": clix_position - position})
+        next_position = positions[index + 1] if index + 1 < len(positions) else budget
+        program.append({"type": "clix", "param": min(durations[index], next_position - clix_position - 1),
+                        "length": 1})
+        position = clix_position + 1
+    if position < budget:
+        program.append({"type": "calc", "param": None, "length": budget - position})
+    return program
+
+
+# Return a task set with the given number of tasks and total utilisation, as a list of task data (the format of the
+# test scripts). The parameters of the periods and programs are explained above.
+def generate_task_set(rng, nr_tasks, utilisation, period_distribution="log_uniform", min_period=100,
+                      max_period=10000, period_granularity=1, max_task_utilisation=None, clix_pattern="none",
+                      clix_duration=(1, 10), clix_interval=100, nr_of_clix=1, release_time=-1, pid_prefix="T"):
+    task_set = []
+    for (index, task_utilisation) in enumerate(uunifast(rng, nr_tasks, utilisation, max_task_utilisation)):
+        period = generate_period(rng, period_distribution, min_period, max_period, period_granularity)
+        budget = min(period, max(1, round(task_utilisation * period)))
+        task_set.append({"pid": pid_prefix + str(index + 1), "budget": budget, "period": period,
+                         "release_time": release_time, "periodic": True,
+                         "program": generate_program(rng, budget, clix_pattern, clix_duration, clix_interval,
+                                                     nr_of_clix)})
+    return task_set
+
+
+# Return the given number of task sets, generated from the given seed (see generate_task_set for the parameters).
+# Every task set has its own random generator (derived from the seed and its index), so a task set does not depend on
+# the number of task sets that are generated.
+def generate_task_sets(nr_task_sets, seed=0, **parameters):
+    return [generate_task_set(random.Random(str(seed) + "/" + str(index)), **parameters)
+            for index in range(nr_task_sets)]
+
+
+# Return the hyperperiod (least common multiple of the periods) of the given task set
+def get_hyperperiod(task_set):
+    hyperperiod = 1
+    for task_data in task_set:
+        hyperperiod = hyperperiod * task_data["period"] // math.gcd(hyperperiod, task_data["period"])
+    return hyperperiod
+
+
+# Return the parameters of the given task set in the format of the constraint models: the number of tasks, the
+# observation window (the hyperperiod, of which every period is a divisor), the periods and the clix lengths. In the
+# constraint models the budget of a task is one clix section, so the clix length is the budget of the task.
+def to_constraint_parameters(task_set):
+    return {"nr_tasks": len(task_set),
+            "observation_window": get_hyperperiod(task_set),
+            "periods": [task_data["period"] for task_data in task_set],
+            "clix_lengths": [task_data["budget"] for task_data in task_set]}
+
+
+# Save the task sets as a test script file (a scenario per task set, named with the given prefix and the index), so
+# they can be simulated by name (see MCU.simulate and BatchRunner.make_scenario_runs)
+def save_test_script(task_sets, file_name, name_prefix="generated_"):
+    file = open(file_name, "w")
+    json.dump({name_prefix + str(index): task_set for (index, task_set) in enumerate(task_sets)}, file)
+    file.close()
+
+
+if __name__ == "__main__":
+    # Example: task sets with 5 tasks, 70% utilisation, harmonic periods and a clix section at the start of every job
+    TASK_SETS = generate_task_sets(10, seed=2022, nr_tasks=5, utilisation=0.7, period_distribution="harmonic",
+                                   min_period=100, max_period=1600, clix_pattern="start", clix_duration=(5, 50))
+    for generated_task_set in TASK_SETS:
+        print(to_constraint_parameters(generated_task_set))
+    save_test_script(TASK_SETS, 'generatedTestScript.json')
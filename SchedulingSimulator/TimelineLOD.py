@@ -0,0 +1,278 @@
+import json
+import numpy as np
+import plotly.graph_objects as go
+import TraceStore as ts
+
+########################################################################################################################
+# This file embeds the level-of-detail rendering of the timeline, for traces that are too large to draw segment per
+# segment (see MCU.make_trace_picture).
+#
+# The time range of the trace is divided in buckets of equal width. For every task and every bucket the number of
+# segments, the number of cycles the task has run (occupancy) and the worst color of its segments are aggregated, and
+# the same is done for the interrupts. Each level of the pyramid has buckets that are twice as wide as the level below,
+# from the base level (the finest) up to a level that fits in the width of the picture.
+# The picture contains one bar per non-empty bucket for every level that is small enough (and the segments themselves
+# if there are not too many). A small script in the HTML file shows the level that matches the zoom: the coarsest level
+# of which the buckets are not wider than a pixel. To look at a part of a huge trace in full detail, a picture of only
+# that time range can be made.
+########################################################################################################################
+
+# Number of buckets of the base level of the pyramid (for the whole time range)
+BASE_NR_OF_BUCKETS = 16384
+# Number of pixels of the width of the timeline, the coarsest level has at most half as many buckets
+NR_OF_PIXELS = 2000
+# Maximum number of bars of one level in the picture (finer levels are left out)
+MAX_BARS_PER_LEVEL = 50000
+# Number of segments and interrupts above which MCU.make_scheduler_picture uses the level-of-detail rendering
+AUTOMATIC_THRESHOLD = 20000
+
+# Color of an empty bucket (larger than all the real colors, see TraceStore.py)
+EMPTY_COLOR = 127
+# Colors of the timeline
+COLOR_SCALE = [(0, "red"), (0.5, "blue"), (1, "green")]
+
+
+# One level of the pyramid. The arrays have one row per task (by task id) and one column per bucket.
+class PyramidLevel:
+    def __init__(self, bucket_width, nr_segments, occupancy, worst_color, nr_interrupts, worst_interrupt_color):
+        self.bucket_width = bucket_width
+        self.nr_segments = nr_segments
+        self.occupancy = occupancy
+        self.worst_color = worst_color
+        # The interrupts only have one row
+        self.nr_interrupts = nr_interrupts
+        self.worst_interrupt_color = worst_interrupt_color
+
+    def nr_of_buckets(self):
+        return self.nr_segments.shape[1]
+
+    # Return the number of bars that are needed to draw this level
+    def nr_of_bars(self):
+        return int(np.count_nonzero(self.nr_segments) + np.count_nonzero(self.nr_interrupts))
+
+    # Return the next (coarser) level, of which every bucket covers two buckets of this level
+    def merge(self):
+        nr_segments = pad_even(self.nr_segments, 0)
+        occupancy = pad_even(self.occupancy, 0)
+        worst_color = pad_even(self.worst_color, EMPTY_COLOR)
+        nr_interrupts = pad_even(self.nr_interrupts, 0)
+        worst_interrupt_color = pad_even(self.worst_interrupt_color, EMPTY_COLOR)
+        return PyramidLevel(2 * self.bucket_width,
+                            nr_segments[..., 0::2] + nr_segments[..., 1::2],
+                            occupancy[..., 0::2] + occupancy[..., 1::2],
+                            np.minimum(worst_color[..., 0::2], worst_color[..., 1::2]),
+                            nr_interrupts[0::2] + nr_interrupts[1::2],
+                            np.minimum(worst_interrupt_color[0::2], worst_interrupt_color[1::2]))
+
+
+# The pyramid of a trace over the time range [start, finish)
+class TimelinePyramid:
+    def __init__(self, trace_store, start, finish, levels):
+        self.trace_store = trace_store
+        self.start = start
+        self.finish = finish
+        # From the finest to the coarsest level
+        self.levels = levels
+
+
+# Add an empty bucket at the end of the (last axis of the) given array if it has an odd number of buckets
+def pad_even(values, empty):
+    if values.shape[-1] % 2 == 0:
+        return values
+    padding = np.full(values.shape[:-1] + (1,), empty, dtype=values.dtype)
+    return np.concatenate([values, padding], axis=-1)
+
+
+# Return the (finished) segments of the trace store that overlap with [start, finish), clipped to that range, as the
+# arrays (task ids, starts, finishes, colors, indices in the trace store)
+def get_segments_in_range(trace_store, start, finish):
+    nr_segments = len(trace_store.segment_color)
+    tasks = np.frombuffer(trace_store.segment_task[:nr_segments], dtype=np.int32)
+    starts = np.frombuffer(trace_store.segment_start[:nr_segments], dtype=np.int64)
+    finishes = np.frombuffer(trace_store.segment_finish[:nr_segments], dtype=np.int64)
+    colors = np.frombuffer(trace_store.segment_color[:nr_segments], dtype=np.int8)
+    indices = np.nonzero((finishes > start) & (starts < finish) & (finishes > starts))[0]
+    return (tasks[indices], np.maximum(starts[indices], start), np.minimum(finishes[indices], finish), colors[indices],
+            indices)
+
+
+# Return the interrupts of the trace store in [start, finish), as the arrays (times, budget timer flags, indices)
+def get_interrupts_in_range(trace_store, start, finish):
+    times = np.frombuffer(trace_store.interrupt_time[:], dtype=np.int64)
+    budget_timers = np.frombuffer(trace_store.interrupt_budget_timer[:], dtype=np.int8)
+    indices = np.nonzero((times >= start) & (times < finish))[0]
+    return times[indices], budget_timers[indices], indices
+
+
+# Return the base level of the pyramid for the time range [start, finish), with buckets of the given width
+def make_base_level(trace_store, start, finish, bucket_width):
+    nr_tasks = len(trace_store.task_names)
+    nr_buckets = -(-(finish - start) // bucket_width)
+
+    # Every segment is split over the buckets it covers (the segments do not overlap, so this gives at most one part
+    # per segment and per bucket)
+    (tasks, starts, finishes, colors, indices) = get_segments_in_range(trace_store, start, finish)
+    first_buckets = (starts - start) // bucket_width
+    last_buckets = (finishes - 1 - start) // bucket_width
+    nr_parts = last_buckets - first_buckets + 1
+    segment_of_part = np.repeat(np.arange(len(tasks)), nr_parts)
+    offsets = np.arange(len(segment_of_part)) - np.repeat(np.cumsum(nr_parts) - nr_parts, nr_parts)
+    buckets = first_buckets[segment_of_part] + offsets
+    overlaps = np.minimum(finishes[segment_of_part], start + (buckets + 1) * bucket_width) \
+        - np.maximum(starts[segment_of_part], start + buckets * bucket_width)
+    cells = tasks[segment_of_part].astype(np.int64) * nr_buckets + buckets
+
+    nr_segments = np.bincount(cells, minlength=nr_tasks * nr_buckets).reshape(nr_tasks, nr_buckets)
+    occupancy = np.bincount(cells, weights=overlaps, minlength=nr_tasks * nr_buckets).astype(np.int64)
+    worst_color = np.full(nr_tasks * nr_buckets, EMPTY_COLOR, dtype=np.int8)
+    np.minimum.at(worst_color, cells, colors[segment_of_part])
+
+    (times, budget_timers, indices) = get_interrupts_in_range(trace_store, start, finish)
+    interrupt_buckets = (times - start) // bucket_width
+    nr_interrupts = np.bincount(interrupt_buckets, minlength=nr_buckets)
+    worst_interrupt_color = np.full(nr_buckets, EMPTY_COLOR, dtype=np.int8)
+    worst_interrupt_color[nr_interrupts > 0] = ts.COLOR_SLEEP_TIMER
+    worst_interrupt_color[np.bincount(interrupt_buckets, weights=budget_timers, minlength=nr_buckets) > 0] = \
+        ts.COLOR_BUDGET_TIMER
+
+    return PyramidLevel(bucket_width, nr_segments, occupancy.reshape(nr_tasks, nr_buckets),
+                        worst_color.reshape(nr_tasks, nr_buckets), nr_interrupts, worst_interrupt_color)
+
+
+# Return the pyramid of the given trace store over the time range [start, finish) (by default the whole trace)
+def build_pyramid(trace_store, start=None, finish=None):
+    start = 0 if start is None else start
+    finish = trace_store.nr_time_points if finish is None else finish
+    if finish <= start:
+        raise ValueError("The time range of the timeline is empty")
+    bucket_width = max(1, -(-(finish - start) // BASE_NR_OF_BUCKETS))
+    levels = [make_base_level(trace_store, start, finish, bucket_width)]
+    while levels[-1].nr_of_buckets() > NR_OF_PIXELS // 2:
+        levels.append(levels[-1].merge())
+    return TimelinePyramid(trace_store, start, finish, levels)
+
+
+# Return the bars (segments and interrupts) of the given level of the pyramid
+def make_level_bars(pyramid, level, task_labels, visible):
+    (tasks, buckets) = np.nonzero(level.nr_segments)
+    bases = pyramid.start + buckets * level.bucket_width
+    widths = np.minimum(bases + level.bucket_width, pyramid.finish) - bases
+    segment_bar = go.Bar(orientation="h", base=bases, x=widths, y=task_labels[tasks],
+                         marker=dict(color=level.worst_color[tasks, buckets], colorscale=COLOR_SCALE, cmin=0, cmax=100),
+                         customdata=np.stack([level.nr_segments[tasks, buckets],
+                                              100 * level.occupancy[tasks, buckets] / widths], axis=-1),
+                         hovertemplate="%{y}<br>%{base} - %{customdata[0]} segments, busy %{customdata[1]:.1f}%"
+                                       "<extra></extra>",
+                         visible=visible, showlegend=False)
+
+    buckets = np.nonzero(level.nr_interrupts)[0]
+    bases = pyramid.start + buckets * level.bucket_width
+    widths = np.minimum(bases + level.bucket_width, pyramid.finish) - bases
+    interrupt_bar = go.Bar(orientation="h", base=bases, x=widths, y=["interrupts"] * len(buckets),
+                           marker=dict(color=level.worst_interrupt_color[buckets], colorscale=COLOR_SCALE, cmin=0,
+                                       cmax=100),
+                           customdata=level.nr_interrupts[buckets],
+                           hovertemplate="interrupts<br>%{base} - %{customdata} interrupts<extra></extra>",
+                           visible=visible, showlegend=False)
+    return [segment_bar, interrupt_bar]
+
+
+# Return the bars of the segments and interrupts themselves (the finest level of detail)
+def make_segment_bars(pyramid, task_labels, visible):
+    trace_store = pyramid.trace_store
+    (tasks, starts, finishes, colors, indices) = get_segments_in_range(trace_store, pyramid.start, pyramid.finish)
+    segment_bar = go.Bar(orientation="h", base=starts, x=finishes - starts, y=task_labels[tasks],
+                         marker=dict(color=colors, colorscale=COLOR_SCALE, cmin=0, cmax=100),
+                         hovertext=[trace_store.get_segment_info(index) for index in indices], hoverinfo="text",
+                         visible=visible, showlegend=False)
+
+    (times, budget_timers, indices) = get_interrupts_in_range(trace_store, pyramid.start, pyramid.finish)
+    width = trace_store.nr_time_points / 1000
+    interrupt_bar = go.Bar(orientation="h", base=times - width, x=np.full(len(times), 2 * width),
+                           y=["interrupts"] * len(times),
+                           marker=dict(color=[trace_store.get_interrupt_color(index) for index in indices],
+                                       colorscale=COLOR_SCALE, cmin=0, cmax=100),
+                           hovertext=[trace_store.get_interrupt_info(index) for index in indices], hoverinfo="text",
+                           visible=visible, showlegend=False)
+    return [segment_bar, interrupt_bar]
+
+
+# Return the index of the level (in the given list of bucket widths, 0 for the segments themselves) that is shown when
+# the given time range is visible: the coarsest level of which the buckets are not wider than a pixel, or the finest
+# level if all the buckets are wider than a pixel.
+def choose_level(bucket_widths, visible_range):
+    cycles_per_pixel = visible_range / NR_OF_PIXELS
+    chosen = 0
+    for (index, bucket_width) in enumerate(bucket_widths):
+        if bucket_width <= cycles_per_pixel:
+            chosen = index
+    return chosen
+
+
+# The script in the HTML file that shows the level that matches the zoom (the same choice as choose_level)
+ZOOM_SCRIPT = """
+var plot = document.getElementById('{plot_id}');
+var bucketWidths = %s;
+function showLevel(range) {
+    var cyclesPerPixel = (range[1] - range[0]) / %d;
+    var chosen = 0;
+    for (var index = 0; index < bucketWidths.length; index++) {
+        if (bucketWidths[index] <= cyclesPerPixel) { chosen = index; }
+    }
+    var visible = [];
+    for (var index = 0; index < bucketWidths.length; index++) { visible.push(index == chosen, index == chosen); }
+    Plotly.restyle(plot, {visible: visible});
+}
+plot.on('plotly_relayout', function(event) {
+    if (event['xaxis.range[0]'] !== undefined) {
+        showLevel([event['xaxis.range[0]'], event['xaxis.range[1]']]);
+    } else if (event['xaxis.range'] !== undefined) {
+        showLevel(event['xaxis.range']);
+    } else if (event['xaxis.autorange']) {
+        showLevel([%d, %d]);
+    }
+});
+"""
+
+
+# Generate the level-of-detail timeline of the given trace store over the time range [start, finish) (by default the
+# whole trace) and save it to a HTML file
+def make_lod_picture(trace_store, start=None, finish=None, file_name='Scheduler_overview.html', auto_open=True):
+    pyramid = build_pyramid(trace_store, start, finish)
+    task_labels = np.array([trace_store.get_task_label(task_id) for task_id in range(len(trace_store.task_names))]
+                           + ["interrupts"], dtype=object)
+
+    # The levels that are drawn, from the finest to the coarsest: the segments themselves (width 0) if there are not
+    # too many of them, the levels with not too many bars and in any case the coarsest level
+    nr_of_segment_bars = len(get_segments_in_range(trace_store, pyramid.start, pyramid.finish)[0]) \
+        + len(get_interrupts_in_range(trace_store, pyramid.start, pyramid.finish)[0])
+    drawn_levels = [None] if nr_of_segment_bars <= MAX_BARS_PER_LEVEL else []
+    drawn_levels += [level for level in pyramid.levels[:-1] if level.nr_of_bars() <= MAX_BARS_PER_LEVEL]
+    drawn_levels.append(pyramid.levels[-1])
+    bucket_widths = [0 if level is None else level.bucket_width for level in drawn_levels]
+    shown = choose_level(bucket_widths, pyramid.finish - pyramid.start)
+
+    fig = go.Figure()
+    for (index, level) in enumerate(drawn_levels):
+        if level is None:
+            bars = make_segment_bars(pyramid, task_labels, index == shown)
+        else:
+            bars = make_level_bars(pyramid, level, task_labels, index == shown)
+        for bar in bars:
+            fig.add_trace(bar)
+
+    # Update/change layout (same as MCU.make_trace_picture)
+    fig.update_yaxes(autorange='reversed', categoryorder='array', categoryarray=list(task_labels))
+    fig.update_xaxes(type='linear', range=[pyramid.start, pyramid.finish])
+    fig.update_layout(
+        title='Scheduler',
+        title_font_size=42,
+        font_size=25,
+        title_font_family='Arial',
+        barmode='overlay',
+    )
+
+    # Save Graph and export to HTML
+    fig.write_html(file_name, post_script=ZOOM_SCRIPT % (json.dumps(bucket_widths), NR_OF_PIXELS, pyramid.start,
+                                                         pyramid.finish), auto_open=auto_open)
+    return fig
@@ -1,8 +1,13 @@
+import heapq
 import Interrupt as i
+import SimulationContext as sc
 
 # FLAGS and FIELDS concerning Timers
-# A list of the currently active timers
-timer_list = []
+# The timers are not decremented one by one each cycle. Instead, the clock counts the number of ticks since the start
+# and each timer registers the absolute tick at which it expires. The active timers are kept in a min-heap on their
+# expiry, so that ticking the clock is O(1) and finding the timers that expire is O(log n).
+# The state of the timers (current tick, timer heap, expired timers, timers per task) is part of the simulation context
+# (see SimulationContext.py).
 
 
 # A class of timers. Each timer has a name, a boolean indicating if it is a budget_timer
@@ -12,15 +17,22 @@ class Timer:
     def __init__(self, name, budget_timer, value, task):
         self.name = name
         self.budget_timer = budget_timer
-        self.counter = value
+        # The remaining lifetime, until the timer is added to the processor (then the expiry is fixed)
+        self.initial_value = value
+        # The tick at which the timer expires and the sequence number, both are set when adding the timer
+        self.expiry = None
+        self.sequence_number = None
+        # Is true if the timer has been removed from the processor
+        self.removed = False
         # Task can be None
         self.task = task
 
-    # Decrement the counter of the given timer
-    def decrement_counter(self):
-        self.counter = self.counter - 1
-        if self.is_finished():
-            self.generate_interrupt()
+    # Return the remaining lifetime of the timer
+    @property
+    def counter(self):
+        if self.expiry is None:
+            return self.initial_value
+        return self.expiry - sc.active_context.current_tick
 
     # Return if the timer has finished, if the counter has reached zero.
     def is_finished(self):
@@ -28,17 +40,22 @@ class Timer:
 
     # Interrupt the CPU by setting the interrupt flag to true and adding a new interrupt.
     def generate_interrupt(self):
-        i.interrupt_present_flag = True
-        i.pending_interrupt = i.new_interrupt(is_timer_interrupt=True, triggered_by=self)
+        ctx = sc.active_context
+        ctx.interrupt_present_flag = True
+        ctx.pending_interrupt = i.new_interrupt(is_timer_interrupt=True, triggered_by=self)
 
     # Remove the timer from the CPU
     def remove_timer(self):
-        global timer_list
-        try:
-            timer_list.remove(self)
         # It can be that the timer was already removed, in that case do nothing
-        except ValueError:
-            pass
+        if self.removed or self.expiry is None:
+            return
+        ctx = sc.active_context
+        self.removed = True
+        ctx.expired_timers.pop(self.sequence_number, None)
+        task_timers = ctx.timers_of_task[self.task]
+        del task_timers[self.sequence_number]
+        if len(task_timers) == 0:
+            del ctx.timers_of_task[self.task]
 
     # Return the task where this timer is associated to
     def get_task_of_timer(self):
@@ -48,36 +65,105 @@ class Timer:
     def is_budget_timer(self):
         return self.budget_timer
 
+    # Return the state of the timer, with the task given by the given index (see SteadyState.py)
+    def get_state(self, task_index):
+        return self.name, self.budget_timer, self.counter, self.removed, task_index
+
 
 # Run the processor clock for one cycle. This means that all timers will be decremented with one tick.
+# As long as expired timers are not removed, they keep interrupting the CPU. The interrupt is triggered by the expired
+# timer that was added last.
 def run_clock():
-    for timer in timer_list:
-        timer.decrement_counter()
+    ctx = sc.active_context
+    ctx.current_tick += 1
+    collect_expired_timers()
+    if len(ctx.expired_timers) > 0:
+        ctx.expired_timers[max(ctx.expired_timers)].generate_interrupt()
+
+
+# Run the processor clock for the given number of cycles at once. This may only be used if no timer expires during
+# these cycles (see get_nr_of_cycles_before_next_expiry).
+def run_clock_for_cycles(nr_cycles):
+    sc.active_context.current_tick += nr_cycles
+
+
+# Move the timers that have reached their expiry from the heap to the expired timers.
+def collect_expired_timers():
+    ctx = sc.active_context
+    timer_heap = ctx.timer_heap
+    while len(timer_heap) > 0 and timer_heap[0][0] <= ctx.current_tick:
+        (expiry, sequence_number, timer) = heapq.heappop(timer_heap)
+        if not timer.removed:
+            ctx.expired_timers[sequence_number] = timer
+            ctx.nr_timer_interrupts += 1
+
+
+# Return the number of cycles that the clock can run before some timer expires (and generates an interrupt).
+def get_nr_of_cycles_before_next_expiry():
+    ctx = sc.active_context
+    timer_heap = ctx.timer_heap
+    if len(ctx.expired_timers) > 0:
+        return 0
+    # Drop the removed timers from the top of the heap
+    while len(timer_heap) > 0 and timer_heap[0][2].removed:
+        heapq.heappop(timer_heap)
+    if len(timer_heap) == 0:
+        return float("inf")
+    return max(0, timer_heap[0][0] - ctx.current_tick - 1)
 
 
 # Return the timer that is associated with the given task. If no timer exists for this task then return None.
 def get_timer_associated_with_task(task):
-    for timer in timer_list:
-        if timer.get_task_of_timer() == task:
-            return timer
-    return None
+    task_timers = sc.active_context.timers_of_task.get(task)
+    if task_timers is None:
+        return None
+    return next(iter(task_timers.values()))
 
 
 # Equivalent to get_timer_associated_with_task but then to return timer of type 'budget_timer' if one can be found.
 def get_budget_timer_associated_with_task(task):
-    for timer in timer_list:
-        if timer.get_task_of_timer() == task and timer.is_budget_timer():
+    task_timers = sc.active_context.timers_of_task.get(task)
+    if task_timers is None:
+        return None
+    for timer in task_timers.values():
+        if timer.is_budget_timer():
             return timer
     return None
 
 
 # Add a timer to the processor
 def add_timer_to_mcu(timer):
-    timer_list.append(timer)
-
-
-# Return all the timers that are currently active.
+    ctx = sc.active_context
+    timer.expiry = ctx.current_tick + timer.initial_value
+    timer.sequence_number = ctx.next_sequence_number
+    ctx.next_sequence_number += 1
+    heapq.heappush(ctx.timer_heap, (timer.expiry, timer.sequence_number, timer))
+    ctx.timers_of_task.setdefault(timer.task, dict())[timer.sequence_number] = timer
+
+
+# Move the clock and all the timers the given number of cycles forward (see SteadyState.py). The remaining lifetime of
+# every timer stays the same.
+def shift_time(nr_cycles):
+    ctx = sc.active_context
+    ctx.current_tick += nr_cycles
+    # (adding the same number to every key keeps the heap ordered)
+    ctx.timer_heap[:] = [(expiry + nr_cycles, sequence_number, timer)
+                         for (expiry, sequence_number, timer) in ctx.timer_heap]
+    timers = {id(timer): timer for (expiry, sequence_number, timer) in ctx.timer_heap}
+    timers.update((id(timer), timer) for timer in ctx.expired_timers.values())
+    for timer in timers.values():
+        timer.expiry += nr_cycles
+
+
+# Return all the timers that are currently active (in the order in which they were added).
 def get_timers():
-    return timer_list
+    active_timers = [timer for task_timers in sc.active_context.timers_of_task.values()
+                     for timer in task_timers.values()]
+    return sorted(active_timers, key=lambda timer: timer.sequence_number)
 
 
+# Return the timers that have finished but are not removed yet (in the order in which they were added).
+def get_finished_timers():
+    collect_expired_timers()
+    expired_timers = sc.active_context.expired_timers
+    return [expired_timers[sequence_number] for sequence_number in sorted(expired_timers)]
@@ -0,0 +1,97 @@
+import sys
+import SimulationContext as sc
+
+########################################################################################################################
+# This file embeds the tracing of the simulator (the debug output). Every trace message has a level and is sent to the
+# trace sink of the simulation context if the trace level of the context is at least that level.
+# To make disabled tracing (nearly) free, the callers check the level before building the message:
+#
+#     if ctx.trace_level >= tr.EVENTS:
+#         tr.emit(tr.EVENTS, "INTERRUPT in cycle = " + str(time_point + 1))
+#
+# So when tracing is off, no strings are formatted and no sink is called.
+########################################################################################################################
+
+# TRACE LEVELS
+# No tracing at all
+OFF = 0
+# Scheduling events: interrupts, newly scheduled tasks, finished tasks, violations, tasks that are not accepted
+EVENTS = 1
+# Every instruction that is fetched by a process
+INSTRUCTIONS = 2
+# Every cycle: the time point and the running task
+CYCLES = 3
+# Dumps of the complete visualisation data (can be very large)
+DUMP = 4
+
+
+# A sink that drops all messages (to measure the cost of formatting the messages only)
+class NullSink:
+    def emit(self, level, message):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+# A sink that prints all messages to the standard output (the original behaviour of the simulator)
+class StdoutSink:
+    def emit(self, level, message):
+        print(message)
+
+    def flush(self):
+        sys.stdout.flush()
+
+    def close(self):
+        pass
+
+
+# A sink that keeps all messages in memory, as (level, message) records
+class MemorySink:
+    def __init__(self):
+        self.records = []
+
+    def emit(self, level, message):
+        self.records.append((level, message))
+
+    # Return the messages (optionally only those of the given level)
+    def get_messages(self, level=None):
+        return [message for (record_level, message) in self.records if level is None or record_level == level]
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+# A sink that writes the messages to a file. The messages are buffered and written in blocks of buffer_size messages.
+class BufferedFileSink:
+    def __init__(self, file_name, buffer_size=10000):
+        self.file = open(file_name, "w")
+        self.buffer_size = buffer_size
+        self.buffer = []
+
+    def emit(self, level, message):
+        self.buffer.append(message)
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if len(self.buffer) > 0:
+            self.file.write("\n".join(self.buffer) + "\n")
+            self.buffer = []
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+# Send the message with the given level to the trace sink of the active simulation context.
+# The caller is expected to have checked the trace level already (see above).
+def emit(level, message):
+    sc.active_context.trace_sink.emit(level, message)
@@ -0,0 +1,246 @@
+import json
+import sys
+import numpy as np
+import TraceStore as ts
+import TraceStream as tstream
+
+########################################################################################################################
+# This file embeds the analysis of the timeline data of a simulation after it has run. The columns of the trace (see
+# TraceStore.py) are taken as NumPy arrays, and all metrics are computed with a few passes over these arrays, so even a
+# trace with millions of segments is analysed in seconds.
+#
+# A job is identified in the trace by its task and its deadline (every segment records the deadline of the job that
+# runs in it). For every job the job table holds its release (deadline - period), the start of its first segment, the
+# finish of its last segment (its completion), the number of cycles it has run, the number of times it was preempted
+# (another job ran before it was resumed, the runs of the scheduler in between do not count) and its outcome, which is
+# registered with its last segment (see TraceStore.end_job): finished, stopped because it went over its budget, or
+# pending (not ended at the end of the simulation, TraceStore.JOB_NOT_ENDED).
+# From the job table, the metrics per task (response times, lateness, deadline misses, preemptions, utilisation) are
+# computed, with percentiles and histograms of the distributions.
+#
+# Usage (from this directory), for a trace that was saved or streamed to a file:
+#     python TraceAnalytics.py trace.trs
+########################################################################################################################
+
+# The percentiles of the response times and the lateness that are computed by default
+DEFAULT_PERCENTILES = [50, 90, 99]
+# The default number of bins of the histograms
+DEFAULT_NR_OF_BINS = 20
+
+
+# The jobs of a trace, one entry per job in every array. The jobs are ordered by task id and deadline.
+class JobTable:
+    def __init__(self, trace_store, tasks, releases, deadlines, starts, completions, execution_times, nr_segments,
+                 preemptions, outcomes):
+        self.trace_store = trace_store
+        self.tasks = tasks
+        self.releases = releases
+        self.deadlines = deadlines
+        self.starts = starts
+        self.completions = completions
+        self.execution_times = execution_times
+        self.nr_segments = nr_segments
+        self.preemptions = preemptions
+        self.outcomes = outcomes
+
+    def nr_of_jobs(self):
+        return len(self.tasks)
+
+    # Return the response time (from release to completion) of every job
+    def get_response_times(self):
+        return self.completions - self.releases
+
+    # Return the lateness (completion - deadline, negative if the job finished before its deadline) of every job
+    def get_lateness(self):
+        return self.completions - self.deadlines
+
+
+# Return the finished segments of the given trace store as the arrays (task ids, starts, finishes, colors, deadlines,
+# job ends)
+def get_segment_columns(trace_store):
+    nr_segments = len(trace_store.segment_color)
+    return (np.frombuffer(trace_store.segment_task[:nr_segments], dtype=np.int32),
+            np.frombuffer(trace_store.segment_start[:nr_segments], dtype=np.int64),
+            np.frombuffer(trace_store.segment_finish[:nr_segments], dtype=np.int64),
+            np.frombuffer(trace_store.segment_color[:nr_segments], dtype=np.int8),
+            np.frombuffer(trace_store.segment_deadline[:nr_segments], dtype=np.int64),
+            np.frombuffer(trace_store.segment_job_end[:nr_segments], dtype=np.int8))
+
+
+# Return the job table of the given trace store
+def get_job_table(trace_store):
+    (tasks, starts, finishes, colors, deadlines, job_ends) = get_segment_columns(trace_store)
+    kinds = np.frombuffer(trace_store.task_kinds, dtype=np.int8)
+    periods = np.frombuffer(trace_store.task_periods, dtype=np.int64)
+    is_job = kinds[tasks] != ts.SCHEDULER_TASK
+
+    # The segments of the jobs, grouped per job (by task and deadline) and in the order of time within a job
+    indices = np.nonzero(is_job)[0]
+    order = np.lexsort((indices, deadlines[indices], tasks[indices]))
+    segments = indices[order]
+    segment_tasks = tasks[segments]
+    segment_deadlines = deadlines[segments]
+    is_first = np.ones(len(segments), dtype=bool)
+    is_first[1:] = (segment_tasks[1:] != segment_tasks[:-1]) | (segment_deadlines[1:] != segment_deadlines[:-1])
+    firsts = np.nonzero(is_first)[0]
+    lasts = np.append(firsts[1:], len(segments)) - 1
+    job_of_segment = np.cumsum(is_first) - 1
+    nr_jobs = len(firsts)
+    if nr_jobs == 0:
+        # No job has run (yet) in the trace
+        (empty_times, empty_counts) = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+        return JobTable(trace_store, np.zeros(0, dtype=np.int32), empty_times, empty_times, empty_times, empty_times,
+                        empty_times, empty_counts, empty_counts, np.zeros(0, dtype=np.int8))
+
+    job_tasks = segment_tasks[firsts]
+    job_deadlines = segment_deadlines[firsts]
+    durations = finishes[segments] - starts[segments]
+    execution_times = np.add.reduceat(durations, firsts)
+
+    # A job is preempted when another job runs between two of its segments: count the runs of consecutive segments of
+    # the same job (in the order of time)
+    jobs_in_time = np.empty(len(segments), dtype=np.int64)
+    jobs_in_time[order] = job_of_segment
+    is_run = np.ones(len(segments), dtype=bool)
+    is_run[1:] = jobs_in_time[1:] != jobs_in_time[:-1]
+    nr_runs = np.bincount(jobs_in_time[is_run], minlength=nr_jobs)
+
+    last_segments = segments[lasts]
+    outcomes = job_ends[last_segments]
+
+    return JobTable(trace_store, job_tasks, job_deadlines - periods[job_tasks], job_deadlines,
+                    starts[segments[firsts]], finishes[last_segments], execution_times, lasts - firsts + 1,
+                    nr_runs - 1, outcomes)
+
+
+# Return the given percentiles of the values per group (linear interpolation, as numpy.percentile), as an array with
+# one row per group (NaN for a group without values). Return also the number of values, mean and maximum per group.
+def get_statistics_per_group(groups, values, nr_groups, percentiles):
+    order = np.lexsort((values, groups))
+    sorted_values = values[order].astype(np.float64)
+    counts = np.bincount(groups, minlength=nr_groups)
+    offsets = np.cumsum(counts) - counts
+    has_values = counts > 0
+    (first, count) = (offsets[has_values], counts[has_values])
+
+    result = np.full((nr_groups, len(percentiles)), np.nan)
+    for (column, percentile) in enumerate(percentiles):
+        positions = (count - 1) * (percentile / 100)
+        lower = np.floor(positions).astype(np.int64)
+        upper = np.minimum(lower + 1, count - 1)
+        fraction = positions - lower
+        result[has_values, column] = sorted_values[first + lower] * (1 - fraction) \
+            + sorted_values[first + upper] * fraction
+    means = np.full(nr_groups, np.nan)
+    means[has_values] = np.bincount(groups, weights=values, minlength=nr_groups)[has_values] / count
+    maxima = np.full(nr_groups, np.nan)
+    maxima[has_values] = sorted_values[first + count - 1]
+    return counts, means, maxima, result
+
+
+# Return a dict with the mean, maximum and percentiles of one group (None if the group has no values)
+def make_distribution(index, counts, means, maxima, values_at_percentiles, percentiles):
+    if counts[index] == 0:
+        return None
+    distribution = {"mean": float(means[index]), "max": float(maxima[index])}
+    for (column, percentile) in enumerate(percentiles):
+        distribution["p" + str(percentile)] = float(values_at_percentiles[index, column])
+    return distribution
+
+
+# Return the metrics of the trace per task (by name), together with the utilisation of the scheduler and the number of
+# idle cycles. The response times and the lateness are those of the finished jobs. A finished job misses its deadline
+# if it completes after it.
+def get_task_metrics(trace_store, job_table=None, percentiles=None):
+    job_table = get_job_table(trace_store) if job_table is None else job_table
+    percentiles = DEFAULT_PERCENTILES if percentiles is None else percentiles
+    nr_tasks = len(trace_store.task_names)
+    nr_time_points = trace_store.nr_time_points
+
+    (tasks, starts, finishes, colors, deadlines, job_ends) = get_segment_columns(trace_store)
+    busy_cycles = np.bincount(tasks, weights=finishes - starts, minlength=nr_tasks).astype(np.int64)
+    outcomes = job_table.outcomes
+    jobs = np.bincount(job_table.tasks, minlength=nr_tasks)
+    preemptions = np.bincount(job_table.tasks, weights=job_table.preemptions, minlength=nr_tasks).astype(np.int64)
+    outcome_counts = {outcome: np.bincount(job_table.tasks[outcomes == outcome], minlength=nr_tasks)
+                      for outcome in [ts.JOB_FINISHED, ts.JOB_OUT_OF_BUDGET, ts.JOB_NOT_ENDED]}
+
+    finished = outcomes == ts.JOB_FINISHED
+    finished_tasks = job_table.tasks[finished]
+    lateness = job_table.get_lateness()[finished]
+    deadline_misses = np.bincount(finished_tasks[lateness > 0], minlength=nr_tasks)
+    response_times = get_statistics_per_group(finished_tasks, job_table.get_response_times()[finished], nr_tasks,
+                                              percentiles)
+    lateness = get_statistics_per_group(finished_tasks, lateness, nr_tasks, percentiles)
+
+    metrics = {"nr_time_points": nr_time_points, "tasks": dict(), "scheduler_utilisation": 0.0,
+               "idle_cycles": nr_time_points - int(busy_cycles.sum())}
+    for task_id in range(nr_tasks):
+        utilisation = busy_cycles[task_id] / nr_time_points if nr_time_points > 0 else 0.0
+        if trace_store.is_scheduler_task(task_id):
+            metrics["scheduler_utilisation"] += utilisation
+            continue
+        metrics["tasks"][trace_store.task_names[task_id]] = {
+            "period": trace_store.task_periods[task_id],
+            "budget": trace_store.task_budgets[task_id],
+            "jobs": int(jobs[task_id]),
+            "finished_jobs": int(outcome_counts[ts.JOB_FINISHED][task_id]),
+            "deadline_misses": int(deadline_misses[task_id]),
+            "budget_overruns": int(outcome_counts[ts.JOB_OUT_OF_BUDGET][task_id]),
+            "pending_jobs": int(outcome_counts[ts.JOB_NOT_ENDED][task_id]),
+            "preemptions": int(preemptions[task_id]),
+            "busy_cycles": int(busy_cycles[task_id]),
+            "utilisation": float(utilisation),
+            "response_time": make_distribution(task_id, *response_times, percentiles),
+            "lateness": make_distribution(task_id, *lateness, percentiles)}
+    return metrics
+
+
+# Return the histograms of the response times of the finished jobs per task (by name), with the same bins for all the
+# tasks: (the number of jobs per bin for each task, the edges of the bins)
+def get_response_time_histograms(trace_store, job_table=None, nr_bins=DEFAULT_NR_OF_BINS):
+    job_table = get_job_table(trace_store) if job_table is None else job_table
+    finished = job_table.outcomes == ts.JOB_FINISHED
+    return get_histograms(trace_store, job_table.tasks[finished], job_table.get_response_times()[finished], nr_bins)
+
+
+# Return the histograms of the lateness of the finished jobs per task (by name), as get_response_time_histograms
+def get_lateness_histograms(trace_store, job_table=None, nr_bins=DEFAULT_NR_OF_BINS):
+    job_table = get_job_table(trace_store) if job_table is None else job_table
+    finished = job_table.outcomes == ts.JOB_FINISHED
+    return get_histograms(trace_store, job_table.tasks[finished], job_table.get_lateness()[finished], nr_bins)
+
+
+# Return the histograms of the values per task (by name), with the same bins for all the tasks
+def get_histograms(trace_store, tasks, values, nr_bins):
+    nr_tasks = len(trace_store.task_names)
+    if len(values) == 0:
+        return dict(), []
+    edges = np.histogram_bin_edges(values, bins=nr_bins)
+    # (the last bin includes its right edge, as numpy.histogram)
+    bins = np.clip(np.searchsorted(edges, values, side="right") - 1, 0, nr_bins - 1)
+    counts = np.bincount(tasks.astype(np.int64) * nr_bins + bins, minlength=nr_tasks * nr_bins)
+    counts = counts.reshape(nr_tasks, nr_bins)
+    histograms = {trace_store.task_names[task_id]: counts[task_id].tolist() for task_id in np.unique(tasks)}
+    return histograms, edges.tolist()
+
+
+# Return the trace store in the given file: a saved trace (see TraceStore.save) or a streamed trace (see TraceStream.py)
+def load_trace(file_name):
+    file = open(file_name, "rb")
+    magic = file.read(len(ts.FILE_MAGIC))
+    file.close()
+    if magic == ts.FILE_MAGIC:
+        return ts.load_trace_store(file_name)
+    trace_file = tstream.read_trace_file(file_name)
+    trace_store = trace_file.to_trace_store()
+    trace_file.close()
+    return trace_store
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python TraceAnalytics.py <trace file>")
+        sys.exit(1)
+    loaded_trace = load_trace(sys.argv[1])
+    print(json.dumps(get_task_metrics(loaded_trace), indent=2))
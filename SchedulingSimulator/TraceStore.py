@@ -0,0 +1,260 @@
+import json
+import sys
+from array import array
+import Task as e
+
+########################################################################################################################
+# This file embeds the storage of the timeline data of a simulation (the trace). Instead of parallel lists of Python
+# objects, the trace is kept in typed arrays (columns), one entry per segment (a part of the timeline in which one task
+# runs) or per interrupt. Tasks are stored as integer ids into a task table that holds their name and parameters, so a
+# segment only costs a few bytes. The labels that are shown in the timeline are only formatted when they are asked for.
+# A trace can be saved to and loaded from a compact binary file.
+########################################################################################################################
+
+# Kinds of tasks in the task table
+PERIODIC_TASK = 0
+SCHEDULER_TASK = 1
+
+# Colors of the segments in the timeline
+# The task went over its budget
+COLOR_OUT_OF_BUDGET = 0
+# The task has not finished (or will not finish) before its deadline
+COLOR_DEADLINE_MISSED = 50
+# The task has finished (or can still finish) before its deadline
+COLOR_ON_TIME = 100
+# How the job of the task of a segment ended with the segment
+JOB_NOT_ENDED = 0
+JOB_FINISHED = 1
+JOB_OUT_OF_BUDGET = 2
+# Colors of the interrupts
+COLOR_BUDGET_TIMER = 0
+COLOR_SLEEP_TIMER = 100
+
+# Identification of the binary trace file format
+FILE_MAGIC = b"TRACESTORE2\n"
+
+# The columns of the segments that are filled when a segment is opened and when it is finished, and of the interrupts
+OPENED_SEGMENT_COLUMNS = ["segment_task", "segment_start", "segment_deadline"]
+FINISHED_SEGMENT_COLUMNS = ["segment_finish", "segment_color", "segment_job_end"]
+INTERRUPT_COLUMNS = ["interrupt_time", "interrupt_task", "interrupt_budget_timer"]
+
+# The columns of the trace, with their type codes (in the order in which they are saved)
+COLUMNS = [("task_kinds", "b"), ("task_periods", "q"), ("task_budgets", "q"),
+           ("segment_task", "i"), ("segment_start", "q"), ("segment_finish", "q"), ("segment_color", "b"),
+           ("segment_deadline", "q"), ("segment_job_end", "b"),
+           ("interrupt_time", "q"), ("interrupt_task", "i"), ("interrupt_budget_timer", "b")]
+
+
+class TraceStore:
+    def __init__(self):
+        # The number of cycles that were simulated
+        self.nr_time_points = -1
+
+        # TASK TABLE (by task id)
+        # Name of the task (every name is stored only once)
+        self.task_names = []
+        # Kind of the task, period and (original) budget. For the scheduler task the period is -1.
+        self.task_kinds = array("b")
+        self.task_periods = array("q")
+        self.task_budgets = array("q")
+        # The task objects and their ids (only while simulating, these are not saved)
+        self.task_objects = []
+        self.task_ids = dict()
+
+        # SEGMENTS
+        # The task that runs in the segment, its start and finish time, its color and the deadline of the task at the
+        # start of the segment. The last segment has no finish time and color yet as long as it is not finished.
+        # How the job of the task ended with the segment (see end_job) is registered together with the color.
+        self.segment_task = array("i")
+        self.segment_start = array("q")
+        self.segment_finish = array("q")
+        self.segment_color = array("b")
+        self.segment_deadline = array("q")
+        self.segment_job_end = array("b")
+        # How the job of the segment that is still open has ended so far
+        self.open_segment_job_end = JOB_NOT_ENDED
+
+        # INTERRUPTS
+        # The time of the interrupt, the task of the timer that triggered it and whether that is a budget timer
+        self.interrupt_time = array("q")
+        self.interrupt_task = array("i")
+        self.interrupt_budget_timer = array("b")
+
+    # Return the id of the given task, the task is added to the task table if needed
+    def get_task_id(self, task):
+        task_id = self.task_ids.get(task)
+        if task_id is None:
+            task_id = len(self.task_names)
+            self.task_ids[task] = task_id
+            self.task_objects.append(task)
+            self.task_names.append(sys.intern(task.get_name()))
+            if isinstance(task, e.SchedulerTask):
+                self.task_kinds.append(SCHEDULER_TASK)
+                self.task_periods.append(-1)
+            else:
+                self.task_kinds.append(PERIODIC_TASK)
+                self.task_periods.append(task.get_period())
+            self.task_budgets.append(task.get_budget())
+        return task_id
+
+    # Start a new segment in which the given task runs
+    def open_segment(self, task, start):
+        self.segment_task.append(self.get_task_id(task))
+        self.segment_start.append(start)
+        self.segment_deadline.append(task.get_deadline())
+        self.open_segment_job_end = JOB_NOT_ENDED
+
+    # Register the finish time of the last segment
+    def finish_segment(self, finish):
+        self.segment_finish.append(finish)
+
+    # Register the color of the last (finished) segment
+    def color_segment(self, color):
+        self.segment_color.append(color)
+        self.segment_job_end.append(self.open_segment_job_end)
+
+    # Register that the job of the given task has ended (it has finished, or it went over its budget). The scheduler
+    # ends a job in the last cycle in which it runs, so its segment is still open. (The task may be scheduled again
+    # for its next job before the segment is finished, so this can not be seen from the task when the segment is
+    # finished.)
+    def end_job(self, task, out_of_budget):
+        if self.nr_of_segments() > self.nr_of_finished_segments() and self.task_ids.get(task) == self.segment_task[-1]:
+            self.open_segment_job_end = JOB_OUT_OF_BUDGET if out_of_budget else JOB_FINISHED
+
+    # Add an interrupt that was triggered by a timer of the given task
+    def add_interrupt(self, time, task, is_budget_timer):
+        self.interrupt_time.append(time)
+        self.interrupt_task.append(self.get_task_id(task))
+        self.interrupt_budget_timer.append(is_budget_timer)
+
+    # Register the number of cycles that were simulated, at the end of the simulation
+    def end_trace(self, nr_time_points):
+        self.nr_time_points = nr_time_points
+
+    # REPEATING A PART OF THE TRACE (see SteadyState.py)
+    # A mark is the length of the trace at some moment: (number of segments, number of finished segments, number of
+    # interrupts). The records that were added between two marks can be appended again, moved forward in time.
+
+    def get_mark(self):
+        return self.nr_of_segments(), self.nr_of_finished_segments(), self.nr_of_interrupts()
+
+    # Keep the records from the given mark on available for get_records (None to release them). The records of a trace
+    # that is kept in memory are always available.
+    def retain(self, mark):
+        pass
+
+    # Return the records that were added between the two marks, as a dict from column name to values
+    def get_records(self, begin_mark, end_mark):
+        first_index = self.get_first_index_in_memory()
+        records = dict()
+        for (columns, mark_index) in [(OPENED_SEGMENT_COLUMNS, 0), (FINISHED_SEGMENT_COLUMNS, 1),
+                                      (INTERRUPT_COLUMNS, 2)]:
+            begin = begin_mark[mark_index] - first_index[mark_index]
+            end = end_mark[mark_index] - first_index[mark_index]
+            for column in columns:
+                records[column] = getattr(self, column)[begin:end]
+        return records
+
+    # Append the given records (see get_records) the given number of times, the first time moved forward in time by
+    # first_repeat times the given period, and every next time by one more period. The deadline of the scheduler task
+    # does not change.
+    def append_records(self, records, period, nr_repeats, first_repeat=1):
+        shifts = range(first_repeat * period, (first_repeat + nr_repeats) * period, period)
+        deadline_shifts = [0 if self.is_scheduler_task(task_id) else 1 for task_id in records["segment_task"]]
+        self.segment_task.extend(records["segment_task"] * nr_repeats)
+        self.segment_start.extend(array("q", [start + shift for shift in shifts for start in records["segment_start"]]))
+        self.segment_deadline.extend(array("q", [deadline + shift * deadline_shift for shift in shifts for
+                                                 (deadline, deadline_shift) in zip(records["segment_deadline"],
+                                                                                   deadline_shifts)]))
+        self.segment_finish.extend(array("q", [finish + shift for shift in shifts
+                                               for finish in records["segment_finish"]]))
+        self.segment_color.extend(records["segment_color"] * nr_repeats)
+        self.segment_job_end.extend(records["segment_job_end"] * nr_repeats)
+        self.interrupt_time.extend(array("q", [time + shift for shift in shifts for time in records["interrupt_time"]]))
+        self.interrupt_task.extend(records["interrupt_task"] * nr_repeats)
+        self.interrupt_budget_timer.extend(records["interrupt_budget_timer"] * nr_repeats)
+
+    # Getters #
+
+    def nr_of_segments(self):
+        return len(self.segment_task)
+
+    def nr_of_finished_segments(self):
+        return len(self.segment_color)
+
+    def nr_of_interrupts(self):
+        return len(self.interrupt_time)
+
+    # Return the index of the first segment and interrupt that are kept in memory (as a mark, see get_mark)
+    def get_first_index_in_memory(self):
+        return 0, 0, 0
+
+    # Return the task object of the last segment (only available while simulating)
+    def get_last_task(self):
+        return self.task_objects[self.segment_task[-1]]
+
+    # Return the trace store with the complete trace (see TraceStream.py for a trace that is not kept in memory)
+    def get_complete_trace(self):
+        return self
+
+    # Return whether the task with the given id is the scheduler task
+    def is_scheduler_task(self, task_id):
+        return self.task_kinds[task_id] == SCHEDULER_TASK
+
+    # Return the name of the task in the timeline: for periodic tasks also the period and the budget are shown
+    def get_task_label(self, task_id):
+        if self.is_scheduler_task(task_id):
+            return self.task_names[task_id]
+        return self.task_names[task_id] + " p=" + str(self.task_periods[task_id]) \
+            + " b=" + str(self.task_budgets[task_id])
+
+    # Return the information that is shown for the segment with the given index
+    def get_segment_info(self, index):
+        return self.task_names[self.segment_task[index]] + " d=" + str(self.segment_deadline[index])
+
+    # Return the information that is shown for the interrupt with the given index
+    def get_interrupt_info(self, index):
+        return self.task_names[self.interrupt_task[index]] + "  " + str(bool(self.interrupt_budget_timer[index])) \
+            + "  t=" + str(self.interrupt_time[index])
+
+    # Return the color of the interrupt with the given index
+    def get_interrupt_color(self, index):
+        return COLOR_BUDGET_TIMER if self.interrupt_budget_timer[index] else COLOR_SLEEP_TIMER
+
+    # Save the trace to a binary file: a header (JSON) with the task names and the lengths of the columns, followed by
+    # the raw data of the columns.
+    def save(self, file_name):
+        header = {"nr_time_points": self.nr_time_points,
+                  "byteorder": sys.byteorder,
+                  "task_names": self.task_names,
+                  "lengths": [len(getattr(self, column)) for (column, type_code) in COLUMNS]}
+        header_bytes = json.dumps(header).encode("utf-8")
+        file = open(file_name, "wb")
+        file.write(FILE_MAGIC)
+        file.write(len(header_bytes).to_bytes(8, "little"))
+        file.write(header_bytes)
+        for (column, type_code) in COLUMNS:
+            getattr(self, column).tofile(file)
+        file.close()
+
+
+# Load a trace that was saved with TraceStore.save. The task objects are not available in a loaded trace.
+def load_trace_store(file_name):
+    file = open(file_name, "rb")
+    if file.read(len(FILE_MAGIC)) != FILE_MAGIC:
+        file.close()
+        raise ValueError("Not a trace file: " + file_name)
+    header_length = int.from_bytes(file.read(8), "little")
+    header = json.loads(file.read(header_length).decode("utf-8"))
+
+    store = TraceStore()
+    store.nr_time_points = header["nr_time_points"]
+    store.task_names = [sys.intern(name) for name in header["task_names"]]
+    for ((column, type_code), length) in zip(COLUMNS, header["lengths"]):
+        values = array(type_code)
+        values.fromfile(file, length)
+        if header["byteorder"] != sys.byteorder:
+            values.byteswap()
+        setattr(store, column, values)
+    file.close()
+    return store
@@ -0,0 +1,263 @@
+import json
+import mmap
+import struct
+import sys
+from array import array
+import TraceStore as ts
+
+########################################################################################################################
+# This file makes it possible to stream the trace of a simulation to disk while simulating, so that the memory use
+# does not grow with the number of simulated cycles.
+#
+# The trace file is append-only and consists of chunks. Every chunk has a header (kind, number of records, length of
+# the payload) followed by the payload:
+#   - TASKS chunk: JSON list of the tasks that were added to the task table (name, kind, period, budget)
+#   - SEGMENTS chunk: the segment columns, each stored as one contiguous block of raw values
+#   - INTERRUPTS chunk: the interrupt columns, each stored as one contiguous block of raw values
+#   - END chunk: the number of simulated cycles (only present when the simulation has finished)
+# A chunk is only written when it is complete, and its length is known from the header. A reader can thus memory-map
+# the file at any time (also while the simulation is still running) and ignore a last chunk that is not yet complete.
+# The columns of a chunk can be used directly from the memory-mapped file, without copying them.
+########################################################################################################################
+
+# Identification of the streamed trace file format (16 bytes)
+FILE_MAGIC = b"TRACESTREAM2\n\x00\x00\x00"
+
+# Kinds of chunks
+TASKS_CHUNK = 1
+SEGMENTS_CHUNK = 2
+INTERRUPTS_CHUNK = 3
+END_CHUNK = 4
+
+# Header of a chunk: kind, number of records, length of the payload in bytes
+CHUNK_HEADER = struct.Struct("<IIQ")
+
+# The columns of the segments and interrupts in a chunk, with their type codes (the 8-byte columns come first)
+SEGMENT_COLUMNS = [("segment_start", "q"), ("segment_finish", "q"), ("segment_deadline", "q"),
+                   ("segment_task", "i"), ("segment_color", "b"), ("segment_job_end", "b")]
+INTERRUPT_COLUMNS = [("interrupt_time", "q"), ("interrupt_task", "i"), ("interrupt_budget_timer", "b")]
+
+# Default number of segments (or interrupts) that are kept in memory before they are written as a chunk
+DEFAULT_CHUNK_SIZE = 65536
+
+
+# A trace store that writes the finished segments and the interrupts to a trace file in chunks, and only keeps the
+# records that are not yet written in memory.
+class StreamingTraceStore(ts.TraceStore):
+    def __init__(self, file_name, chunk_size=DEFAULT_CHUNK_SIZE):
+        ts.TraceStore.__init__(self)
+        self.file_name = file_name
+        self.chunk_size = chunk_size
+        # Number of segments and interrupts that have already been written to the file
+        self.nr_written_segments = 0
+        self.nr_written_interrupts = 0
+        # The records from this mark on are not written yet, because they may still be repeated (see retain)
+        self.retained_mark = None
+        self.file = open(file_name, "wb")
+        self.file.write(FILE_MAGIC)
+        self.file.flush()
+
+    def get_task_id(self, task):
+        nr_tasks = len(self.task_names)
+        task_id = ts.TraceStore.get_task_id(self, task)
+        # A new task is written immediately, so that the chunks that follow can refer to it
+        if task_id == nr_tasks:
+            write_chunk(self.file, TASKS_CHUNK, 1, json.dumps([{"name": self.task_names[task_id],
+                                                               "kind": self.task_kinds[task_id],
+                                                               "period": self.task_periods[task_id],
+                                                               "budget": self.task_budgets[task_id]}]).encode("utf-8"))
+            self.file.flush()
+        return task_id
+
+    def color_segment(self, color):
+        ts.TraceStore.color_segment(self, color)
+        if len(self.segment_color) >= self.chunk_size:
+            self.write_segments()
+
+    def add_interrupt(self, time, task, is_budget_timer):
+        ts.TraceStore.add_interrupt(self, time, task, is_budget_timer)
+        if len(self.interrupt_time) >= self.chunk_size:
+            self.write_interrupts()
+
+    def nr_of_segments(self):
+        return self.nr_written_segments + len(self.segment_task)
+
+    def nr_of_finished_segments(self):
+        return self.nr_written_segments + len(self.segment_color)
+
+    def nr_of_interrupts(self):
+        return self.nr_written_interrupts + len(self.interrupt_time)
+
+    def get_first_index_in_memory(self):
+        return self.nr_written_segments, self.nr_written_segments, self.nr_written_interrupts
+
+    def retain(self, mark):
+        self.retained_mark = mark
+
+    # The records are appended in batches, that are written as soon as they fill a chunk
+    def append_records(self, records, period, nr_repeats, first_repeat=1):
+        nr_records = max(1, len(records["segment_finish"]), len(records["interrupt_time"]))
+        batch_size = max(1, self.chunk_size // nr_records)
+        for repeat in range(first_repeat, first_repeat + nr_repeats, batch_size):
+            ts.TraceStore.append_records(self, records, period, min(batch_size, first_repeat + nr_repeats - repeat),
+                                         repeat)
+            if len(self.segment_color) >= self.chunk_size:
+                self.write_segments()
+            if len(self.interrupt_time) >= self.chunk_size:
+                self.write_interrupts()
+
+    # Write the finished segments that are still in memory to the file (except the retained ones)
+    def write_segments(self):
+        nr_finished = len(self.segment_color)
+        if self.retained_mark is not None:
+            nr_finished = min(nr_finished, self.retained_mark[1] - self.nr_written_segments)
+        if nr_finished <= 0:
+            return
+        columns = []
+        for (column, type_code) in SEGMENT_COLUMNS:
+            values = getattr(self, column)
+            columns.append(values[:nr_finished])
+            # Only the unfinished segment (if any) is kept in memory
+            setattr(self, column, values[nr_finished:])
+        write_chunk(self.file, SEGMENTS_CHUNK, nr_finished, b"".join(values.tobytes() for values in columns))
+        self.file.flush()
+        self.nr_written_segments += nr_finished
+
+    # Write the interrupts that are still in memory to the file (except the retained ones)
+    def write_interrupts(self):
+        nr_interrupts = len(self.interrupt_time)
+        if self.retained_mark is not None:
+            nr_interrupts = min(nr_interrupts, self.retained_mark[2] - self.nr_written_interrupts)
+        if nr_interrupts <= 0:
+            return
+        payload = b"".join(getattr(self, column)[:nr_interrupts].tobytes() for (column, type_code) in INTERRUPT_COLUMNS)
+        write_chunk(self.file, INTERRUPTS_CHUNK, nr_interrupts, payload)
+        self.file.flush()
+        self.nr_written_interrupts += nr_interrupts
+        for (column, type_code) in INTERRUPT_COLUMNS:
+            setattr(self, column, getattr(self, column)[nr_interrupts:])
+
+    # Write all the records that are still in memory and mark the end of the trace
+    def end_trace(self, nr_time_points):
+        ts.TraceStore.end_trace(self, nr_time_points)
+        self.retained_mark = None
+        self.write_segments()
+        self.write_interrupts()
+        write_chunk(self.file, END_CHUNK, 1, struct.pack("<q", nr_time_points))
+        self.file.close()
+
+    # Return the complete trace, as it is read back from the file
+    def get_complete_trace(self):
+        trace_file = read_trace_file(self.file_name)
+        trace_store = trace_file.to_trace_store()
+        trace_file.close()
+        return trace_store
+
+
+# Write a chunk to the given file. The payload is padded to a multiple of 8 bytes.
+def write_chunk(file, kind, nr_records, payload):
+    padding = (-len(payload)) % 8
+    file.write(CHUNK_HEADER.pack(kind, nr_records, len(payload) + padding))
+    file.write(payload)
+    file.write(b"\x00" * padding)
+
+
+# A streamed trace file that is opened for reading. The file is memory-mapped, and the chunks that are complete at the
+# moment of opening are indexed. The columns of the chunks are views on the memory-mapped file.
+class TraceFile:
+    def __init__(self, file_name):
+        self.file = open(file_name, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:len(FILE_MAGIC)] != FILE_MAGIC:
+            self.close()
+            raise ValueError("Not a streamed trace file: " + file_name)
+        # The number of simulated cycles, None if the simulation has not finished (yet)
+        self.nr_time_points = None
+        # The task table
+        self.task_names = []
+        self.task_kinds = array("b")
+        self.task_periods = array("q")
+        self.task_budgets = array("q")
+        # (number of records, offset of the payload) of the segment and interrupt chunks
+        self.segment_chunks = []
+        self.interrupt_chunks = []
+
+        offset = len(FILE_MAGIC)
+        while offset + CHUNK_HEADER.size <= len(self.data):
+            (kind, nr_records, length) = CHUNK_HEADER.unpack_from(self.data, offset)
+            payload_offset = offset + CHUNK_HEADER.size
+            if payload_offset + length > len(self.data):
+                # The last chunk is still being written
+                break
+            if kind == TASKS_CHUNK:
+                for task in json.loads(bytes(self.data[payload_offset:payload_offset + length]).rstrip(b"\x00")):
+                    self.task_names.append(sys.intern(task["name"]))
+                    self.task_kinds.append(task["kind"])
+                    self.task_periods.append(task["period"])
+                    self.task_budgets.append(task["budget"])
+            elif kind == SEGMENTS_CHUNK:
+                self.segment_chunks.append((nr_records, payload_offset))
+            elif kind == INTERRUPTS_CHUNK:
+                self.interrupt_chunks.append((nr_records, payload_offset))
+            elif kind == END_CHUNK:
+                self.nr_time_points = struct.unpack_from("<q", self.data, payload_offset)[0]
+            offset = payload_offset + length
+
+    # Return whether the simulation that wrote the file has finished
+    def is_complete(self):
+        return self.nr_time_points is not None
+
+    def nr_of_segments(self):
+        return sum(nr_records for (nr_records, offset) in self.segment_chunks)
+
+    def nr_of_interrupts(self):
+        return sum(nr_records for (nr_records, offset) in self.interrupt_chunks)
+
+    # Yield the segment chunks, as a dict from column name to a view on the values in the memory-mapped file
+    def iterate_segment_chunks(self):
+        for (nr_records, offset) in self.segment_chunks:
+            yield self.get_columns(SEGMENT_COLUMNS, nr_records, offset)
+
+    # Yield the interrupt chunks, as a dict from column name to a view on the values in the memory-mapped file
+    def iterate_interrupt_chunks(self):
+        for (nr_records, offset) in self.interrupt_chunks:
+            yield self.get_columns(INTERRUPT_COLUMNS, nr_records, offset)
+
+    def get_columns(self, column_types, nr_records, offset):
+        columns = dict()
+        view = memoryview(self.data)
+        for (column, type_code) in column_types:
+            length = nr_records * array(type_code).itemsize
+            columns[column] = view[offset:offset + length].cast(type_code)
+            offset += length
+        return columns
+
+    # Return a (in-memory) trace store with all the records in the file
+    def to_trace_store(self):
+        store = ts.TraceStore()
+        store.nr_time_points = -1 if self.nr_time_points is None else self.nr_time_points
+        store.task_names = list(self.task_names)
+        store.task_kinds = array("b", self.task_kinds)
+        store.task_periods = array("q", self.task_periods)
+        store.task_budgets = array("q", self.task_budgets)
+        for chunk in self.iterate_segment_chunks():
+            for (column, type_code) in SEGMENT_COLUMNS:
+                getattr(store, column).frombytes(chunk[column].cast("B"))
+        for chunk in self.iterate_interrupt_chunks():
+            for (column, type_code) in INTERRUPT_COLUMNS:
+                getattr(store, column).frombytes(chunk[column].cast("B"))
+        return store
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+
+# Return a new trace store that streams the trace to the given file
+def new_streaming_trace_store(file_name, chunk_size=DEFAULT_CHUNK_SIZE):
+    return StreamingTraceStore(file_name, chunk_size)
+
+
+# Open a streamed trace file for reading (this is possible while the simulation is still writing it)
+def read_trace_file(file_name):
+    return TraceFile(file_name)
@@ -1,13 +1,24 @@
 # Import MCU.
 import MCU as mcu
+import SimulationContext as sc
+import Trace as tr
 
 # Important parameters for the simulation:
 # - Name of the test-script to use (see "testScript.json" for possible test-scripts)
 TASK_SCENARIO = 'simple_periodic_jobs_with_clix'
 # - Number of cycles that will be simulated
 MAX_NR_TIME_POINTS = 1500
+# - Skip over the cycles in which nothing happens (same schedule, but without the per-cycle debug output)
+EVENT_DRIVEN = False
+# - How much debug output is printed (see Trace.py: OFF, EVENTS, INSTRUCTIONS, CYCLES or DUMP)
+TRACE_LEVEL = tr.CYCLES
+# - Whether the tasks have to pass the acceptance test of the scheduler. Most test-scripts illustrate the effect of clix
+#   sections on a given schedule (also when the task set is not schedulable), so they are accepted as they are.
+ADMISSION_TEST = False
 
-# Run the simulation
-mcu.simulate(TASK_SCENARIO, MAX_NR_TIME_POINTS)
+# Run the simulation (the returned simulation context holds the state and the results of the simulation)
+context = mcu.simulate(TASK_SCENARIO, MAX_NR_TIME_POINTS, event_driven=EVENT_DRIVEN,
+                       context=sc.new_simulation_context(trace_level=TRACE_LEVEL,
+                                                         admission_test=ADMISSION_TEST))
 # Make a picture of the simulated data
-mcu.make_scheduler_picture()
+mcu.make_scheduler_picture(context)